@@ -0,0 +1,188 @@
+"""Load benchmark comparing the threaded and asyncio HTTP server modes.
+
+Starts server.py once per mode, parks a number of idle keep-alive
+connections on it (like open dashboards between polls), then drives
+concurrent clients against a few cheap routes and reports throughput,
+latency percentiles, failures and the server's thread count. With
+--ssh-host each mode is also run against /api/status for that host, which
+spawns an ssh probe per request (COLLECT_INTERVAL=0 keeps it uncached).
+
+    python bench_http.py --idle 300 --clients 16 --seconds 10
+    python bench_http.py --clients 32 --ssh-host gpu-node-01
+"""
+
+import argparse
+import http.client
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent
+PATHS = ["/api/servers", "/", "/app.js"]
+SSH_PATH = "/api/status?host={host}"
+
+
+def wait_ready(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def thread_count(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("Threads:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def open_idle(port, count):
+    sockets = []
+    for _ in range(count):
+        try:
+            sockets.append(socket.create_connection(("127.0.0.1", port), timeout=2))
+        except OSError:
+            break
+    return sockets
+
+
+def client_loop(port, paths, stop_at, latencies, failures, lock):
+    conn = None
+    index = 0
+    while time.time() < stop_at:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            ok = response.status == 200
+            if response.will_close:
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            ok = False
+            if conn is not None:
+                conn.close()
+            conn = None
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                failures[0] += 1
+    if conn is not None:
+        conn.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_mode(mode, args, paths):
+    env = dict(os.environ)
+    env.update(
+        {
+            "PORT": str(args.port),
+            "HTTP_SERVER": mode,
+            "HTTP_KEEPALIVE_TIMEOUT": str(args.seconds + 30),
+            "COLLECT_INTERVAL": "0",
+        }
+    )
+    proc = subprocess.Popen(
+        [sys.executable, str(BASE_DIR / "server.py")],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        if not wait_ready(args.port):
+            return {"mode": mode, "error": "server did not start"}
+        idle = open_idle(args.port, args.idle)
+        time.sleep(0.5)
+        latencies = []
+        failures = [0]
+        lock = threading.Lock()
+        stop_at = time.time() + args.seconds
+        clients = [
+            threading.Thread(
+                target=client_loop,
+                args=(args.port, paths, stop_at, latencies, failures, lock),
+            )
+            for _ in range(args.clients)
+        ]
+        for thread in clients:
+            thread.start()
+        time.sleep(args.seconds / 2)
+        threads = thread_count(proc.pid)
+        for thread in clients:
+            thread.join()
+        for sock in idle:
+            sock.close()
+        return {
+            "mode": mode,
+            "idle": len(idle),
+            "requests": len(latencies),
+            "failures": failures[0],
+            "rps": len(latencies) / args.seconds,
+            "p50": percentile(latencies, 0.5) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "threads": threads,
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--idle", type=int, default=200, help="idle keep-alive connections")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent active clients")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--modes", default="threaded,asyncio")
+    parser.add_argument("--ssh-host", help="also benchmark /api/status for this ssh host")
+    args = parser.parse_args()
+
+    mixes = [("static", PATHS)]
+    if args.ssh_host:
+        mixes.append(("ssh", [SSH_PATH.format(host=args.ssh_host)]))
+    print(f"{'mode':<10} {'routes':<7} {'idle':>5} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'fail':>6} {'threads':>8}")
+    for mode in [item.strip() for item in args.modes.split(",") if item.strip()]:
+        for mix, paths in mixes:
+            result = run_mode(mode, args, paths)
+            if "error" in result:
+                print(f"{mode:<10} {mix:<7} {result['error']}")
+                continue
+            threads = result["threads"] if result["threads"] is not None else "--"
+            print(
+                f"{mode:<10} {mix:<7} {result['idle']:>5} {result['rps']:>9.1f} "
+                f"{result['p50']:>8.2f} {result['p99']:>8.2f} {result['failures']:>6} "
+                f"{threads:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
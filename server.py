@@ -1,16 +1,36 @@
+import argparse
+import asyncio
+import bisect
 import csv
+import fnmatch
+import email.utils
+import gzip
+import hashlib
+import http.client
+import io
 import json
+import math
 import mimetypes
 import os
 import pathlib
+import posixpath
+import queue
+import re
+import selectors
+import socket
 import subprocess
 import shutil
 import sys
 import tempfile
+import threading
+import time
+import urllib.request
 import uuid
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as futures_wait
 from http import HTTPStatus
-from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.server import BaseHTTPRequestHandler, HTTPServer
 from urllib.parse import parse_qs, urlparse
 
 BASE_DIR = pathlib.Path(__file__).resolve().parent
@@ -28,20 +48,134 @@ SSH_FILE_TIMEOUT = int(os.environ.get("SSH_FILE_TIMEOUT", "45"))
 SSH_COMMAND_TIMEOUT = int(os.environ.get("SSH_COMMAND_TIMEOUT", "45"))
 SSH_COMMAND_OUTPUT_LIMIT = int(os.environ.get("SSH_COMMAND_OUTPUT_LIMIT", "20000"))
 SSH_COMMAND_COMPLETION_LIMIT = int(os.environ.get("SSH_COMMAND_COMPLETION_LIMIT", "200"))
-GPU_QUERY = (
-    "nvidia-smi --query-gpu=index,name,temperature.gpu,"
-    "utilization.gpu,memory.used,memory.total "
-    "--format=csv,noheader,nounits"
+SSH_COMPLETION_FILE_TTL = int(os.environ.get("SSH_COMPLETION_FILE_TTL", "30"))
+SSH_COMPLETION_COMMAND_TTL = int(os.environ.get("SSH_COMPLETION_COMMAND_TTL", "3600"))
+SSH_COMPLETION_INDEX_LIMIT = int(os.environ.get("SSH_COMPLETION_INDEX_LIMIT", "50000"))
+SSH_COMPLETION_CACHE_KEYS = int(os.environ.get("SSH_COMPLETION_CACHE_KEYS", "256"))
+SSH_LS_TTL = int(os.environ.get("SSH_LS_TTL", "30"))
+SSH_LS_PAGE = int(os.environ.get("SSH_LS_PAGE", "200"))
+SSH_LS_LIMIT = int(os.environ.get("SSH_LS_LIMIT", "20000"))
+SSH_TAIL_BYTES = int(os.environ.get("SSH_TAIL_BYTES", "65536"))
+SSH_TAIL_MAX_SECONDS = int(os.environ.get("SSH_TAIL_MAX_SECONDS", "3600"))
+SSH_BROADCAST_PARALLEL = int(os.environ.get("SSH_BROADCAST_PARALLEL", "16"))
+SSH_BROADCAST_MAX_PARALLEL = int(os.environ.get("SSH_BROADCAST_MAX_PARALLEL", "64"))
+SSH_PROCESS_CACHE_TTL = int(os.environ.get("SSH_PROCESS_CACHE_TTL", "10"))
+SSH_PROBE_STREAM = os.environ.get("SSH_PROBE_STREAM", "0").strip() not in ("", "0")
+SSH_PROBE_KEYFRAME = int(os.environ.get("SSH_PROBE_KEYFRAME", "30"))
+SSH_PROBE_CACHE = os.environ.get("SSH_PROBE_CACHE", "1").strip() not in ("", "0")
+SSH_PROBE_CACHE_RETRY = int(os.environ.get("SSH_PROBE_CACHE_RETRY", "3600"))
+COLLECT_INTERVAL = int(os.environ.get("COLLECT_INTERVAL", "0"))
+COLLECT_PARALLEL = int(os.environ.get("COLLECT_PARALLEL", "16"))
+FLEET_MAX_AGE = int(os.environ.get("FLEET_MAX_AGE", "30"))
+USAGE_RETENTION_DAYS = int(os.environ.get("USAGE_RETENTION_DAYS", "30"))
+# Longest stretch between two samples still charged in full; by default it
+# follows the collector so a slow sampling interval isn't under-counted.
+USAGE_MAX_GAP = int(os.environ.get("USAGE_MAX_GAP", str(max(300, 3 * COLLECT_INTERVAL))))
+PERCENTILE_HOURS = int(os.environ.get("PERCENTILE_HOURS", "48"))
+PERCENTILE_DAYS = int(os.environ.get("PERCENTILE_DAYS", "30"))
+SNAPSHOT_PATH = os.path.expanduser(
+    os.environ.get("SNAPSHOT_PATH", "~/.cache/gpu_monitor/snapshot.json.gz")
 )
+SNAPSHOT_INTERVAL = int(os.environ.get("SNAPSHOT_INTERVAL", "60"))
+WASTE_WINDOW = int(os.environ.get("WASTE_WINDOW", str(6 * 3600)))
+WASTE_IDLE_UTIL = int(os.environ.get("WASTE_IDLE_UTIL", "0"))
+ALERT_RULES_PATH = os.environ.get("ALERT_RULES", "")
+ALERT_WEBHOOK = os.environ.get("ALERT_WEBHOOK", "")
+ALERT_COMMAND = os.environ.get("ALERT_COMMAND", "")
+ALERT_HISTORY_LIMIT = int(os.environ.get("ALERT_HISTORY_LIMIT", "200"))
+ALERT_POLL_SPACING = float(os.environ.get("ALERT_POLL_SPACING", "10"))
+ALERT_STALE_SECONDS = float(os.environ.get("ALERT_STALE_SECONDS", "3600"))
+SSH_SHELL_IDLE_TIMEOUT = int(os.environ.get("SSH_SHELL_IDLE_TIMEOUT", "600"))
+SSH_SHELL_BUFFER_TAIL = 4096
+GPU_FIELD_SETS = {
+    "core": (
+        ("index", "index", "int"),
+        ("name", "name", "str"),
+        ("temp", "temperature.gpu", "int"),
+        ("util", "utilization.gpu", "int"),
+        ("mem_used", "memory.used", "int"),
+        ("mem_total", "memory.total", "int"),
+    ),
+    "power": (
+        ("power_draw", "power.draw", "float"),
+        ("power_limit", "power.limit", "float"),
+    ),
+    "clocks": (
+        ("clock_sm", "clocks.sm", "int"),
+        ("clock_mem", "clocks.mem", "int"),
+    ),
+    "fan": (("fan", "fan.speed", "int"),),
+    "ecc": (
+        ("ecc_corrected", "ecc.errors.corrected.volatile.total", "int"),
+        ("ecc_uncorrected", "ecc.errors.uncorrected.volatile.total", "int"),
+    ),
+    "pcie": (
+        ("pcie_gen", "pcie.link.gen.current", "int"),
+        ("pcie_width", "pcie.link.width.current", "int"),
+    ),
+    "mig": (("mig_mode", "mig.mode.current", "str"),),
+    "persistence": (("persistence", "persistence_mode", "bool"),),
+    "driver": (("driver", "driver_version", "str"),),
+}
+# utilization.gpu reads [N/A] on MIG-partitioned GPUs, so it is optional.
+GPU_REQUIRED_FIELDS = ("index", "mem_used", "mem_total")
+GPU_FREE_MEM = int(os.environ.get("GPU_FREE_MEM", "512"))
+
+
+def _parse_field_sets(text):
+    names = []
+    for name in (text or "").split(","):
+        name = name.strip().lower()
+        if not name or name == "core" or name in names:
+            continue
+        if name not in GPU_FIELD_SETS:
+            print(f"unknown GPU field set: {name}", file=sys.stderr)
+            continue
+        names.append(name)
+    return names
+
+
+GPU_FIELDS = _parse_field_sets(os.environ.get("GPU_FIELDS", "power,clocks,fan"))
+GPU_SLOW_FIELDS = _parse_field_sets(
+    os.environ.get("GPU_SLOW_FIELDS", "ecc,pcie,mig,persistence,driver")
+)
+GPU_SLOW_INTERVAL = int(os.environ.get("GPU_SLOW_INTERVAL", "600"))
 GPU_PROCESS_SCRIPT = r"""
 import csv
 import json
 import os
+import re
 import subprocess
 import sys
 
+try:
+    import pwd
+except ImportError:
+    pwd = None
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+JOB_BOUNDARY = (
+    "init",
+    "systemd",
+    "sshd",
+    "slurmstepd",
+    "tmux: server",
+    "screen",
+    "SCREEN",
+    "containerd-shim",
+    "docker-containerd",
+)
+CMDLINE_LIMIT = 512
+
+
+GPU_LINE = re.compile(r"^GPU (\d+): .*\(UUID: ([^)\s]+)\)")
+MIG_LINE = re.compile(r"^\s+MIG (\S+)\s+Device\s+(\d+): \(UUID: ([^)\s]+)\)")
+MIG_DEVICE_ROW = re.compile(r"^\|\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+\|")
+MIG_PROCESS_ROW = re.compile(r"^\|\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+\S+\s")
 
-def run(cmd):
+
+def run(cmd, required=True):
     process = subprocess.run(
         cmd,
         shell=True,
@@ -50,30 +184,157 @@ def run(cmd):
         universal_newlines=True,
     )
     if process.returncode != 0:
-        sys.stderr.write(process.stderr or process.stdout)
-        sys.exit(process.returncode)
+        if not required:
+            return ""
+        raise RuntimeError(process.stderr or process.stdout)
     return process.stdout.strip()
 
 
+def read_text(path):
+    try:
+        with open(path, "rb") as handle:
+            return handle.read().decode("utf-8", "replace")
+    except Exception:
+        return ""
+
+
+def read_stat(pid):
+    text = read_text("/proc/{}/stat".format(pid))
+    if not text or ")" not in text:
+        return None
+    name = text[text.find("(") + 1 : text.rfind(")")]
+    rest = text[text.rfind(")") + 2 :].split()
+    if len(rest) < 22:
+        return None
+    return {
+        "name": name,
+        "ppid": int(rest[1]),
+        "cpu_ticks": int(rest[11]) + int(rest[12]),
+        "start_ticks": int(rest[19]),
+        "rss_kb": int(rest[21]) * PAGE_SIZE // 1024,
+    }
+
+
+def read_uid(pid):
+    for line in read_text("/proc/{}/status".format(pid)).splitlines():
+        if line.startswith("Uid:"):
+            parts = line.split()
+            if len(parts) > 1 and parts[1].isdigit():
+                return int(parts[1])
+    return None
+
+
+USERS = {}
+
+
+def user_name(uid):
+    if uid is None:
+        return ""
+    if uid not in USERS:
+        name = str(uid)
+        if pwd is not None:
+            try:
+                name = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                pass
+        USERS[uid] = name
+    return USERS[uid]
+
+
+def read_cmdline(pid):
+    raw = read_text("/proc/{}/cmdline".format(pid))
+    text = " ".join(part for part in raw.split("\0") if part)
+    if len(text) > CMDLINE_LIMIT:
+        text = text[:CMDLINE_LIMIT] + "..."
+    return text
+
+
+def read_slurm(pid):
+    text = read_text("/proc/{}/cgroup".format(pid))
+    job = re.search(r"job_(\d+)", text)
+    step = re.search(r"step_(\w+)", text)
+    return (job.group(1) if job else ""), (step.group(1) if step else "")
+
+
+def find_job(pid, stat):
+    job_pid = pid
+    job_name = stat["name"]
+    current = stat
+    seen = set()
+    while current and current["ppid"] > 1 and current["ppid"] not in seen:
+        seen.add(current["ppid"])
+        parent = read_stat(current["ppid"])
+        if parent is None or parent["name"] in JOB_BOUNDARY:
+            break
+        job_pid = current["ppid"]
+        job_name = parent["name"]
+        current = parent
+    slurm_job, slurm_step = read_slurm(pid)
+    return {
+        "pid": job_pid,
+        "name": job_name,
+        "cmdline": read_cmdline(job_pid) if job_pid != pid else "",
+        "slurm_job": slurm_job,
+        "slurm_step": slurm_step,
+    }
+
+
 def parse_gpu_map(text):
+    # "nvidia-smi -L": GPU and MIG device UUIDs -> (GPU index, MIG device).
     mapping = {}
-    for row in csv.reader(text.splitlines()):
-        if len(row) < 2:
+    profiles = {}
+    index = None
+    for line in text.splitlines():
+        match = GPU_LINE.match(line)
+        if match:
+            index = int(match.group(1))
+            mapping[match.group(2)] = (index, None)
             continue
-        index, uuid = [item.strip() for item in row[:2]]
-        mapping[uuid] = index
-    return mapping
+        match = MIG_LINE.match(line)
+        if match and index is not None:
+            device = int(match.group(2))
+            mapping[match.group(3)] = (index, device)
+            profiles[(index, device)] = match.group(1)
+    return mapping, profiles
+
 
+def parse_mig_table(text):
+    # Plain "nvidia-smi": (GPU, GI, CI) -> MIG device and (GPU, pid) -> (GI, CI).
+    devices = {}
+    owners = {}
+    section = None
+    for line in text.splitlines():
+        if "MIG devices" in line:
+            section = "devices"
+        elif "Processes" in line:
+            section = "processes"
+        elif section == "devices":
+            match = MIG_DEVICE_ROW.match(line)
+            if match:
+                gpu, gi, ci, device = [int(value) for value in match.groups()]
+                devices[(gpu, gi, ci)] = device
+        elif section == "processes":
+            match = MIG_PROCESS_ROW.match(line)
+            if match:
+                gpu, gi, ci, pid = [int(value) for value in match.groups()]
+                owners[(gpu, pid)] = (gi, ci)
+    return devices, owners
 
-def parse_processes(text, mapping):
+
+def parse_processes(text, mapping, profiles, mig_table):
     processes = []
     if not text:
         return processes
+    details = {}
     for row in csv.reader(text.splitlines()):
         if len(row) < 4:
             continue
         uuid, pid, name, mem = [item.strip() for item in row[:4]]
-        gpu_index = mapping.get(uuid, "")
+        gpu_index, mig_device = mapping.get(uuid, (None, None))
+        if mig_device is None and gpu_index is not None and pid.isdigit():
+            owner = mig_table[1].get((gpu_index, int(pid)))
+            if owner:
+                mig_device = mig_table[0].get((gpu_index,) + owner)
         cwd = ""
         cwd_error = ""
         if pid.isdigit():
@@ -87,38 +348,288 @@ def parse_processes(text, mapping):
                 mem_used = int(float(mem))
             except ValueError:
                 mem_used = None
-        processes.append(
-            {
-                "gpu_index": int(gpu_index) if gpu_index.isdigit() else None,
-                "pid": int(pid) if pid.isdigit() else None,
-                "name": name,
-                "mem_used": mem_used,
-                "cwd": cwd,
-                "cwd_error": cwd_error,
-            }
-        )
+        item = {
+            "gpu_index": gpu_index,
+            "pid": int(pid) if pid.isdigit() else None,
+            "name": name,
+            "mem_used": mem_used,
+            "cwd": cwd,
+            "cwd_error": cwd_error,
+        }
+        if mig_device is not None:
+            item["mig_device"] = mig_device
+            item["mig_profile"] = profiles.get((gpu_index, mig_device))
+        if item["pid"] is not None:
+            if item["pid"] not in details:
+                details[item["pid"]] = sample_process(item["pid"])
+            item.update(details[item["pid"]])
+        processes.append(item)
     return processes
 
 
-try:
-    gpu_text = run(
-        "nvidia-smi --query-gpu=index,uuid --format=csv,noheader,nounits"
-    )
+def sample_process(pid):
+    stat = read_stat(pid)
+    if stat is None:
+        return {}
+    uid = read_uid(pid)
+    return {
+        "uid": uid,
+        "user": user_name(uid),
+        "cmdline": read_cmdline(pid),
+        "ppid": stat["ppid"],
+        "rss_kb": stat["rss_kb"],
+        "cpu_ticks": stat["cpu_ticks"],
+        "start_ticks": stat["start_ticks"],
+        "start_time": BOOT_TIME + stat["start_ticks"] // CLK_TCK if BOOT_TIME else None,
+        "job": find_job(pid, stat),
+    }
+
+
+def read_boot_time():
+    for line in read_text("/proc/stat").splitlines():
+        if line.startswith("btime"):
+            return int(line.split()[1])
+    return None
+
+
+def read_uptime():
+    text = read_text("/proc/uptime").split()
+    return float(text[0]) if text else None
+
+
+BOOT_TIME = read_boot_time()
+
+
+
+def collect(query=None):
+    gpu_text = run("nvidia-smi -L")
     proc_text = run(
         "nvidia-smi --query-compute-apps=gpu_uuid,pid,process_name,used_memory "
         "--format=csv,noheader,nounits"
     )
-except Exception as exc:
-    sys.stderr.write(str(exc))
-    sys.exit(1)
+    if proc_text.strip().lower().startswith("no running processes"):
+        proc_text = ""
+    mapping, profiles = parse_gpu_map(gpu_text)
+    mig_text = run("nvidia-smi", required=False) if profiles else ""
+    mig_table = parse_mig_table(mig_text) if profiles else ({}, {})
+    data = {
+        "processes": parse_processes(proc_text, mapping, profiles, mig_table),
+        "clk_tck": CLK_TCK,
+        "uptime": read_uptime(),
+        "boot_time": BOOT_TIME,
+    }
+    if query:
+        data["gpus"] = [row for row in csv.reader(run(query).splitlines())]
+        data["mig"] = [gpu_text, mig_text] if profiles else None
+    return data
+
+
+def process_key(item):
+    return "{}:{}:{}".format(item.get("pid"), item.get("gpu_index"), item.get("mig_device"))
 
-if proc_text.strip().lower().startswith("no running processes"):
-    proc_text = ""
 
-mapping = parse_gpu_map(gpu_text)
-processes = parse_processes(proc_text, mapping)
-print(json.dumps(processes))
+def diff(old, new):
+    # Only what changed since the previous frame: scalar fields, GPU rows by
+    # position, and per-process fields keyed by pid/GPU/slice, with the
+    # names of fields a process no longer reports under "unset".
+    frame = {}
+    for key in ("clk_tck", "uptime", "boot_time", "mig"):
+        if new.get(key) != old.get(key):
+            frame[key] = new.get(key)
+    old_rows = old.get("gpus") or []
+    new_rows = new.get("gpus") or []
+    if len(old_rows) != len(new_rows):
+        frame["gpus"] = new_rows
+    else:
+        rows = dict(
+            (str(position), row)
+            for position, row in enumerate(new_rows)
+            if row != old_rows[position]
+        )
+        if rows:
+            frame["gpu_rows"] = rows
+    upsert = {}
+    unset = {}
+    for key, item in new["processes"].items():
+        previous = old["processes"].get(key)
+        if previous is None:
+            upsert[key] = item
+            continue
+        fields = dict((name, value) for name, value in item.items() if previous.get(name) != value)
+        if fields:
+            upsert[key] = fields
+        gone = [name for name in previous if name not in item]
+        if gone:
+            unset[key] = gone
+    if upsert:
+        frame["upsert"] = upsert
+    if unset:
+        frame["unset"] = unset
+    removed = [key for key in old["processes"] if key not in new["processes"]]
+    if removed:
+        frame["remove"] = removed
+    return frame
+
+
+def stream(source):
+    # One JSON request per line in, one frame per line out: a full keyframe
+    # on the first request, when asked, and every "keyframe" requests;
+    # deltas against the previous frame otherwise.
+    seq = 0
+    last = None
+    since_full = 0
+    for line in iter(source.readline, b""):
+        try:
+            request = json.loads(line.decode("utf-8") or "{}")
+        except ValueError:
+            request = {}
+        try:
+            data = collect(request.get("query"))
+        except Exception as exc:
+            sys.stdout.write(json.dumps({"type": "error", "error": str(exc)}) + "\n")
+            sys.stdout.flush()
+            continue
+        data["processes"] = dict((process_key(item), item) for item in data["processes"])
+        seq += 1
+        if last is None or request.get("full") or since_full >= request.get("keyframe", 30):
+            frame = dict(data, type="full", seq=seq)
+            since_full = 0
+        else:
+            frame = diff(last, data)
+            frame.update(type="delta", seq=seq, base=seq - 1)
+            since_full += 1
+        last = data
+        sys.stdout.write(json.dumps(frame) + "\n")
+        sys.stdout.flush()
+
+
+if globals().get("STREAM") is not None:
+    stream(STREAM)
+else:
+    try:
+        print(json.dumps(collect()))
+    except Exception as exc:
+        sys.stderr.write(str(exc))
+        sys.exit(1)
+"""
+
+# Follows one file from a byte offset and prints JSON lines: "opened" when a
+# file is (re)opened, "chunk" with new text and the offset after it, "reset"
+# on rotation or truncation, "missing" while the path is gone, and "ping"
+# every 15 s so a dead reader is noticed. Chunks never split a UTF-8
+# sequence, so offsets always fall on character boundaries.
+TAIL_SCRIPT = r"""
+import json
+import os
+import sys
+import time
+
+path = os.path.expanduser(sys.argv[1])
+start = int(sys.argv[2])
+resume_file = sys.argv[3]
+
+
+def emit(frame):
+    sys.stdout.write(json.dumps(frame) + "\n")
+    sys.stdout.flush()
+
+
+def file_id(st):
+    return "%d:%d" % (st.st_dev, st.st_ino)
+
+
+def safe_end(data):
+    data = bytearray(data)
+    for back in range(1, min(4, len(data)) + 1):
+        byte = data[-back]
+        if byte & 0xC0 == 0x80:
+            continue
+        if byte < 0x80:
+            return len(data)
+        need = 2 if byte & 0xE0 == 0xC0 else 3 if byte & 0xF0 == 0xE0 else 4
+        return len(data) if back >= need else len(data) - back
+    return len(data)
+
+
+handle = None
+ident = None
+pos = 0
+first = True
+missing = False
+last_emit = time.time()
+while True:
+    if handle is None:
+        try:
+            handle = open(path, "rb")
+        except (IOError, OSError) as exc:
+            if not missing:
+                emit({"event": "missing", "error": str(exc)})
+                missing = True
+                last_emit = time.time()
+        if handle is not None:
+            missing = False
+            st = os.fstat(handle.fileno())
+            ident = file_id(st)
+            reason = None
+            if not first:
+                pos, reason = 0, "rotated"
+            elif resume_file and resume_file != ident:
+                pos, reason = 0, "rotated"
+            elif start < 0:
+                pos = max(0, st.st_size + start)
+            elif start > st.st_size:
+                pos, reason = 0, "truncated"
+            else:
+                pos = start
+            first = False
+            handle.seek(pos)
+            if reason:
+                emit({"event": "reset", "reason": reason, "file": ident, "offset": pos})
+            emit({"event": "opened", "file": ident, "offset": pos, "size": st.st_size})
+            last_emit = time.time()
+    data = handle.read(65536) if handle is not None else b""
+    end = safe_end(data) if data else 0
+    if end:
+        pos += end
+        if end < len(data):
+            handle.seek(pos)
+        emit({"event": "chunk", "file": ident, "offset": pos,
+              "text": data[:end].decode("utf-8", "replace")})
+        last_emit = time.time()
+        continue
+    if handle is not None:
+        if end < len(data):
+            handle.seek(pos)
+        if os.fstat(handle.fileno()).st_size < pos:
+            pos = 0
+            handle.seek(0)
+            emit({"event": "reset", "reason": "truncated", "file": ident, "offset": 0})
+            last_emit = time.time()
+            continue
+        try:
+            current = file_id(os.stat(path))
+        except OSError:
+            current = None
+        if current is not None and current != ident:
+            handle.close()
+            handle = None
+            continue
+    if time.time() - last_emit >= 15:
+        emit({"event": "ping"})
+        last_emit = time.time()
+    time.sleep(0.5)
 """
+# JSON escaping can grow one 64 KiB chunk from TAIL_SCRIPT up to sixfold.
+TAIL_FRAME_LIMIT = 6 * 65536 + 4096
+HTTP_SERVER_MODE = os.environ.get("HTTP_SERVER", "threaded").strip().lower()
+HTTP_WORKERS = int(os.environ.get("HTTP_WORKERS", "32"))
+HTTP_QUEUE = int(os.environ.get("HTTP_QUEUE", "64"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.environ.get("HTTP_KEEPALIVE_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", "30"))
+HTTP_ROUTE_WAIT = float(os.environ.get("HTTP_ROUTE_WAIT", "10"))
+STATIC_CHECK_INTERVAL = float(os.environ.get("STATIC_CHECK_INTERVAL", "1"))
+STATIC_GZIP_MIN_SIZE = 512
+COLUMNAR_MIME = "application/vnd.gpu-monitor.columnar+json"
 SCHEDULED_TASK_NAME = "GPU Monitor"
 
 
@@ -492,7 +1003,82 @@ def _trim_output(text, limit):
     return text[:limit] + "\n... (truncated)"
 
 
+def _ssh_text(data):
+    # What text=True gives, without failing on a host's stray non-UTF-8 bytes.
+    text = (data or b"").decode("utf-8", "replace")
+    return text.replace("\r\n", "\n").replace("\r", "\n")
+
+
+def run_ssh_steps(steps):
+    """Drive an ssh step generator with blocking subprocesses.
+
+    A step generator yields (argv, stdin bytes or None, timeout) for each
+    ssh call it needs, is sent back a CompletedProcess with text output (or
+    has subprocess.TimeoutExpired thrown in), and returns its result. The
+    asyncio server drives the same generators with run_ssh_steps_async.
+    """
+    reply = error = None
+    while True:
+        try:
+            cmd, data, timeout = steps.throw(error) if error else steps.send(reply)
+        except StopIteration as stop:
+            return stop.value
+        reply = error = None
+        try:
+            result = subprocess.run(
+                cmd,
+                input=data,
+                stdin=None if data is not None else subprocess.DEVNULL,
+                capture_output=True,
+                timeout=timeout,
+                check=False,
+            )
+        except subprocess.TimeoutExpired as exc:
+            error = exc
+            continue
+        reply = subprocess.CompletedProcess(
+            cmd, result.returncode, _ssh_text(result.stdout), _ssh_text(result.stderr)
+        )
+
+
+async def run_ssh_steps_async(steps):
+    """run_ssh_steps on the event loop: the ssh child costs no thread."""
+    reply = error = None
+    while True:
+        try:
+            cmd, data, timeout = steps.throw(error) if error else steps.send(reply)
+        except StopIteration as stop:
+            return stop.value
+        reply = error = None
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=subprocess.PIPE if data is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(data), timeout)
+        except asyncio.TimeoutError:
+            error = subprocess.TimeoutExpired(cmd, timeout)
+            continue
+        finally:
+            # Also reached when the request is cancelled mid-call.
+            if proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+                await proc.wait()
+        reply = subprocess.CompletedProcess(
+            cmd, proc.returncode, _ssh_text(stdout), _ssh_text(stderr)
+        )
+
+
 def _run_ssh_command(host, command, cwd=None):
+    return run_ssh_steps(_command_steps(host, command, cwd))
+
+
+def _command_steps(host, command, cwd=None):
     marker = f"__GPU_MONITOR_PWD__{uuid.uuid4().hex}__"
     prefix = f"cd {_quote_sh(cwd)} && " if cwd else ""
     trailer = f'code=$?; printf "\\n{marker}%s|%s\\n" "$code" "$PWD"'
@@ -500,13 +1086,7 @@ def _run_ssh_command(host, command, cwd=None):
     cmd = _ssh_base_cmd(host)
     cmd.extend([host, "bash", "-lc", _quote_sh(full_command)])
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=SSH_COMMAND_TIMEOUT,
-            check=False,
-        )
+        result = yield cmd, None, SSH_COMMAND_TIMEOUT
     except subprocess.TimeoutExpired:
         return {
             "ok": False,
@@ -534,35 +1114,296 @@ def _run_ssh_command(host, command, cwd=None):
                 if len(parts) > 1:
                     cwd_value = parts[1].strip()
 
+    return _command_result(
+        exit_code, stdout_raw, stderr_raw, cwd_value or cwd or "", _ssh_error_text(result)
+    )
+
+
+def _command_result(exit_code, stdout_raw, stderr_raw, cwd, error_text=""):
     stdout = _trim_output(stdout_raw.strip(), SSH_COMMAND_OUTPUT_LIMIT)
     stderr = _trim_output(stderr_raw.strip(), SSH_COMMAND_OUTPUT_LIMIT)
     if exit_code != 0:
-        error_text = _ssh_error_text(result) or f"command exited with {exit_code}"
         return {
             "ok": False,
-            "error": error_text,
+            "error": error_text or f"command exited with {exit_code}",
             "exit_code": exit_code,
             "stdout": stdout,
             "stderr": stderr,
-            "cwd": cwd_value or cwd or "",
+            "cwd": cwd,
         }
     return {
         "ok": True,
         "exit_code": exit_code,
         "stdout": stdout,
         "stderr": stderr,
-        "cwd": cwd_value or cwd or "",
+        "cwd": cwd,
     }
 
 
-def _run_ssh_completion(host, prefix, cwd=None, mode="file"):
+class ShellSession:
+    """One long-lived `bash -l` per (browser session, host).
+
+    Commands are written to the shell's stdin followed by a trailer that
+    prints a per-command marker on stdout (with exit code and $PWD) and on
+    stderr, so output can be framed without reconnecting.
+    """
+
+    def __init__(self, session_id, host):
+        self.session_id = session_id
+        self.host = host
+        self.cwd = ""
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self._cond = threading.Condition()
+        self._buffers = {"stdout": bytearray(), "stderr": bytearray()}
+        self._closed = False
+        self._proc = None
+
+    @property
+    def alive(self):
+        return self._proc is not None and not self._closed
+
+    def start(self):
+        cmd = _ssh_base_cmd(self.host)
+        cmd.extend([self.host, "bash", "-l"])
+        proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        with self._cond:
+            # A restart after close() must not inherit the old shell's
+            # state or leftover output.
+            self._proc = proc
+            self._closed = False
+            for buffer in self._buffers.values():
+                buffer.clear()
+        for name, stream in (("stdout", proc.stdout), ("stderr", proc.stderr)):
+            thread = threading.Thread(
+                target=self._pump, args=(proc, name, stream), daemon=True
+            )
+            thread.start()
+
+    def _pump(self, proc, name, stream):
+        limit = SSH_COMMAND_OUTPUT_LIMIT + 1
+        while True:
+            try:
+                chunk = stream.read1(65536)
+            except (OSError, ValueError):
+                chunk = b""
+            if not chunk:
+                break
+            with self._cond:
+                if self._proc is not proc:
+                    break
+                buffer = self._buffers[name]
+                buffer.extend(chunk)
+                # Keep the head for display and the tail for marker detection.
+                if limit > 1 and len(buffer) > limit + 2 * SSH_SHELL_BUFFER_TAIL:
+                    del buffer[limit:-SSH_SHELL_BUFFER_TAIL]
+                self._cond.notify_all()
+        if name == "stdout":
+            with self._cond:
+                if self._proc is proc:
+                    self._closed = True
+                self._cond.notify_all()
+
+    def _take(self, name, marker):
+        buffer = self._buffers[name]
+        pos = buffer.find(marker)
+        if pos < 0:
+            return None
+        end = buffer.find(b"\n", pos)
+        if end < 0:
+            return None
+        body = bytes(buffer[:pos])
+        trailer = bytes(buffer[pos + len(marker) : end])
+        del buffer[: end + 1]
+        return body, trailer
+
+    def run(self, command, timeout):
+        self.last_used = time.monotonic()
+        marker_text = f"__GPU_MONITOR_SHELL__{uuid.uuid4().hex}__"
+        script = (
+            f"{{ {command}\n}} </dev/null\n"
+            f'printf "\\n{marker_text}%s|%s\\n" "$?" "$PWD"\n'
+            f'printf "\\n{marker_text}\\n" >&2\n'
+        )
+        try:
+            self._proc.stdin.write(script.encode("utf-8"))
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError):
+            with self._cond:
+                self._closed = True
+
+        marker = marker_text.encode("utf-8")
+        deadline = time.monotonic() + timeout
+        out = err = None
+        with self._cond:
+            while True:
+                if out is None:
+                    out = self._take("stdout", marker)
+                if err is None:
+                    err = self._take("stderr", marker)
+                if (out is not None and err is not None) or self._closed:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            if out is None and self._closed:
+                stdout_raw = bytes(self._buffers["stdout"])
+                stderr_raw = bytes(self._buffers["stderr"])
+                self._buffers["stdout"].clear()
+                self._buffers["stderr"].clear()
+            else:
+                stdout_raw = out[0] if out else b""
+                stderr_raw = err[0] if err else b""
+        self.last_used = time.monotonic()
+
+        stdout_text = stdout_raw.decode("utf-8", errors="replace")
+        stderr_text = stderr_raw.decode("utf-8", errors="replace")
+        if out is None:
+            if not self._closed:
+                self.close()
+                return {
+                    "ok": False,
+                    "error": "ssh timed out",
+                    "exit_code": None,
+                    "stdout": _trim_output(stdout_text.strip(), SSH_COMMAND_OUTPUT_LIMIT),
+                    "stderr": _trim_output(stderr_text.strip(), SSH_COMMAND_OUTPUT_LIMIT),
+                    "cwd": self.cwd,
+                }
+            exit_code = self._wait_exit()
+            error_text = stderr_text.strip() or "shell session ended"
+            return _command_result(
+                -1 if exit_code is None else exit_code,
+                stdout_text,
+                stderr_text,
+                self.cwd,
+                error_text,
+            )
+
+        exit_code = -1
+        parts = out[1].decode("utf-8", errors="replace").split("|", 1)
+        if parts and parts[0].isdigit():
+            exit_code = int(parts[0])
+        if len(parts) > 1 and parts[1].strip():
+            self.cwd = parts[1].strip()
+        error_text = stderr_text.strip() or stdout_text.strip()
+        return _command_result(exit_code, stdout_text, stderr_text, self.cwd, error_text)
+
+    def _wait_exit(self):
+        try:
+            return self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        proc = self._proc
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except Exception:
+            pass
+        if proc.poll() is None:
+            proc.kill()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+SHELL_SESSIONS = {}
+SHELL_SESSIONS_LOCK = threading.Lock()
+
+
+def _reap_shell_sessions(force_session_id=None):
+    now = time.monotonic()
+    expired = []
+    with SHELL_SESSIONS_LOCK:
+        for key, session in list(SHELL_SESSIONS.items()):
+            if force_session_id is not None:
+                if key[0] != force_session_id:
+                    continue
+            elif session.alive and now - session.last_used < SSH_SHELL_IDLE_TIMEOUT:
+                continue
+            if not session.lock.acquire(blocking=False):
+                continue
+            del SHELL_SESSIONS[key]
+            expired.append(session)
+    for session in expired:
+        try:
+            session.close()
+        finally:
+            session.lock.release()
+    return len(expired)
+
+
+def _shell_reaper_loop(interval=30):
+    while True:
+        time.sleep(interval)
+        _reap_shell_sessions()
+        _reap_probe_streams()
+
+
+def _forget_shell_session(key, session):
+    # Only drop the entry if it still is this session: a newer one may have
+    # been stored under the same key meanwhile.
+    with SHELL_SESSIONS_LOCK:
+        if SHELL_SESSIONS.get(key) is session:
+            del SHELL_SESSIONS[key]
+    session.close()
+
+
+def _run_in_shell_session(key, session, command, cwd):
+    if not session.alive:
+        try:
+            session.start()
+        except OSError as exc:
+            _forget_shell_session(key, session)
+            return _command_result(-1, "", "", cwd or "", str(exc))
+        session.cwd = ""
+        # Absorb login banners and profile output before the first command.
+        ready = session.run("true", SSH_CONNECT_TIMEOUT + SSH_COMMAND_TIMEOUT)
+        if not session.alive:
+            _forget_shell_session(key, session)
+            return ready
+    if cwd and cwd != session.cwd:
+        command = f"cd {_quote_sh(cwd)} && {command}"
+    result = session.run(command, SSH_COMMAND_TIMEOUT)
+    if not session.alive:
+        _forget_shell_session(key, session)
+    return result
+
+
+def _run_shell_command(session_id, host, command, cwd=None):
+    _reap_shell_sessions()
+    key = (session_id, host)
+    while True:
+        with SHELL_SESSIONS_LOCK:
+            session = SHELL_SESSIONS.get(key)
+            if session is None:
+                session = SHELL_SESSIONS[key] = ShellSession(session_id, host)
+        with session.lock:
+            with SHELL_SESSIONS_LOCK:
+                current = SHELL_SESSIONS.get(key) is session
+            # The reaper may have closed and dropped the session between the
+            # lookup and taking its lock; start over with a fresh one.
+            if current:
+                result = _run_in_shell_session(key, session, command, cwd)
+                break
+    result["session"] = session_id
+    return result
+
+
+def _fetch_ssh_completion(host, complete_cmd, limit):
     cmd = _ssh_base_cmd(host)
-    quoted_prefix = _quote_sh(prefix or "")
-    cd_prefix = f"cd {_quote_sh(cwd)} && " if cwd else ""
-    if mode == "command":
-        complete_cmd = f"{cd_prefix}compgen -c -- {quoted_prefix}"
-    else:
-        complete_cmd = f"{cd_prefix}compgen -f -- {quoted_prefix}"
     cmd.extend([host, "bash", "-lc", _quote_sh(complete_cmd)])
     try:
         result = subprocess.run(
@@ -573,126 +1414,460 @@ def _run_ssh_completion(host, prefix, cwd=None, mode="file"):
             check=False,
         )
     except subprocess.TimeoutExpired:
-        return [], "ssh timed out"
+        return [], "ssh timed out", False
     if result.returncode != 0:
         error_text = _ssh_error_text(result)
         if not error_text:
             error_text = f"ssh exited with {result.returncode}"
-        return [], error_text
+        return [], error_text, False
     matches = []
     seen = set()
+    truncated = False
     for line in result.stdout.splitlines():
         item = line.strip()
         if not item or item in seen:
             continue
+        if len(matches) >= limit:
+            truncated = True
+            break
         seen.add(item)
         matches.append(item)
-        if len(matches) >= SSH_COMMAND_COMPLETION_LIMIT:
+    return matches, "", truncated
+
+
+COMPLETION_CACHE = OrderedDict()
+COMPLETION_CACHE_LOCK = threading.Lock()
+COMPLETION_REFRESHING = set()
+
+
+def _prefix_matches(items, prefix, limit):
+    matches = []
+    position = bisect.bisect_left(items, prefix)
+    while position < len(items) and len(matches) < limit:
+        item = items[position]
+        if not item.startswith(prefix):
             break
-    return matches, ""
+        matches.append(item)
+        position += 1
+    return matches
 
 
-def _run_ssh(host):
-    cmd = _ssh_base_cmd(host)
-    cmd.extend([host, GPU_QUERY])
+def _load_completion_index(key, host, complete_cmd):
+    items, error_text, truncated = _fetch_ssh_completion(
+        host, complete_cmd, SSH_COMPLETION_INDEX_LIMIT
+    )
+    if error_text:
+        return None, error_text
+    entry = {
+        "items": sorted(items),
+        "complete": not truncated,
+        "loaded_at": time.monotonic(),
+    }
+    with COMPLETION_CACHE_LOCK:
+        # Least recently used indexes go first once the key limit is hit.
+        COMPLETION_CACHE[key] = entry
+        COMPLETION_CACHE.move_to_end(key)
+        while len(COMPLETION_CACHE) > max(SSH_COMPLETION_CACHE_KEYS, 1):
+            COMPLETION_CACHE.popitem(last=False)
+    return entry, ""
+
+
+def _refresh_completion_index(key, host, complete_cmd):
     try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30,
-            check=False,
-        )
-    except subprocess.TimeoutExpired:
-        return {"host": host, "ok": False, "error": "ssh timed out", "gpus": []}
+        _load_completion_index(key, host, complete_cmd)
+    finally:
+        with COMPLETION_CACHE_LOCK:
+            COMPLETION_REFRESHING.discard(key)
 
-    if result.returncode != 0:
-        error_text = _ssh_error_text(result)
-        if not error_text:
-            error_text = f"ssh exited with {result.returncode}"
-        return {"host": host, "ok": False, "error": error_text, "gpus": []}
 
-    output = result.stdout.strip()
-    if not output:
-        return {"host": host, "ok": False, "error": "no data from nvidia-smi", "gpus": []}
+def _invalidate_completion_files(host):
+    with COMPLETION_CACHE_LOCK:
+        for key in [key for key in COMPLETION_CACHE if key[:2] == ("file", host)]:
+            del COMPLETION_CACHE[key]
 
-    gpus = []
-    reader = csv.reader(output.splitlines())
-    for row in reader:
-        row = [item.strip() for item in row]
-        if len(row) < 6:
-            continue
-        try:
-            index = int(row[0])
-            name = row[1]
-            temp = int(float(row[2]))
-            util = int(float(row[3]))
-            mem_used = int(float(row[4]))
-            mem_total = int(float(row[5]))
-        except ValueError:
-            continue
-        gpus.append(
-            {
-                "index": index,
-                "name": name,
-                "temp": temp,
-                "util": util,
-                "mem_used": mem_used,
-                "mem_total": mem_total,
-            }
-        )
 
-    if not gpus:
-        return {
-            "host": host,
-            "ok": False,
-            "error": "unable to parse nvidia-smi output",
-            "gpus": [],
-        }
+def _run_ssh_completion(host, prefix, cwd=None, mode="file"):
+    prefix = prefix or ""
+    cd_prefix = f"cd {_quote_sh(cwd)} && " if cwd else ""
+    now = time.monotonic()
+    if mode == "command":
+        # The command list barely changes: serve it from the index and
+        # refresh stale entries in the background.
+        key = ("command", host)
+        complete_cmd = "compgen -c"
+        with COMPLETION_CACHE_LOCK:
+            entry = COMPLETION_CACHE.get(key)
+            if entry is not None:
+                COMPLETION_CACHE.move_to_end(key)
+            stale = entry is not None and now - entry["loaded_at"] > SSH_COMPLETION_COMMAND_TTL
+            if stale and key not in COMPLETION_REFRESHING:
+                COMPLETION_REFRESHING.add(key)
+                threading.Thread(
+                    target=_refresh_completion_index,
+                    args=(key, host, complete_cmd),
+                    daemon=True,
+                ).start()
+        fallback_cmd = f"compgen -c -- {_quote_sh(prefix)}"
+    else:
+        # Index the whole directory once; longer prefixes are answered locally.
+        dir_part = prefix[: prefix.rfind("/") + 1]
+        base = prefix[len(dir_part) :]
+        listing_prefix = dir_part + ("." if base.startswith(".") else "")
+        key_cwd = "" if dir_part.startswith(("/", "~")) else (cwd or "")
+        key = ("file", host, key_cwd, listing_prefix)
+        complete_cmd = f"{cd_prefix}compgen -f -- {_quote_sh(listing_prefix)}"
+        with COMPLETION_CACHE_LOCK:
+            entry = COMPLETION_CACHE.get(key)
+            if entry is not None and now - entry["loaded_at"] > SSH_COMPLETION_FILE_TTL:
+                del COMPLETION_CACHE[key]
+                entry = None
+            elif entry is not None:
+                COMPLETION_CACHE.move_to_end(key)
+        fallback_cmd = f"{cd_prefix}compgen -f -- {_quote_sh(prefix)}"
 
-    util_avg = round(sum(gpu["util"] for gpu in gpus) / len(gpus))
-    mem_used_total = sum(gpu["mem_used"] for gpu in gpus)
-    mem_total_total = sum(gpu["mem_total"] for gpu in gpus)
-    mem_pct = round((mem_used_total / mem_total_total) * 100) if mem_total_total else 0
+    if entry is None:
+        entry, error_text = _load_completion_index(key, host, complete_cmd)
+        if error_text:
+            return [], error_text
+    if entry["complete"]:
+        return _prefix_matches(entry["items"], prefix, SSH_COMMAND_COMPLETION_LIMIT), ""
+    matches, error_text, _ = _fetch_ssh_completion(
+        host, fallback_cmd, SSH_COMMAND_COMPLETION_LIMIT
+    )
+    return matches, error_text
 
-    return {
-        "host": host,
-        "ok": True,
-        "summary": {
-            "count": len(gpus),
-            "util_avg": util_avg,
-            "mem_used": mem_used_total,
-            "mem_total": mem_total_total,
-            "mem_pct": mem_pct,
-        },
-        "gpus": gpus,
-    }
 
+NVSMI_MISSING = {
+    "",
+    "n/a",
+    "[n/a]",
+    "not supported",
+    "[not supported]",
+    "[unknown error]",
+    "[insufficient permissions]",
+    "[gpu is lost]",
+}
 
-def _run_ssh_processes(host):
-    cmd = _ssh_base_cmd(host)
-    remote_cmd = (
-        "command -v python3 >/dev/null 2>&1 && exec python3 - || exec python -"
-    )
-    cmd.extend(
-        [
-            host,
-            "sh",
-            "-c",
-            _quote_sh(remote_cmd),
-        ]
-    )
+
+def _nvsmi_int(text):
     try:
-        result = subprocess.run(
-            cmd,
-            input=GPU_PROCESS_SCRIPT,
-            capture_output=True,
-            text=True,
-            timeout=30,
-            check=False,
+        return int(float(text))
+    except ValueError:
+        return None
+
+
+def _nvsmi_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _nvsmi_bool(text):
+    return text.lower() in ("enabled", "yes", "on", "1")
+
+
+FIELD_CONVERTERS = {
+    "int": _nvsmi_int,
+    "float": _nvsmi_float,
+    "bool": _nvsmi_bool,
+    "str": str,
+}
+GPU_QUERIES = {}
+
+
+def gpu_query(field_sets=()):
+    # Compiled once per combination of field sets: the nvidia-smi command
+    # and the (field, converter) list its CSV columns map onto, in order.
+    key = tuple(field_sets)
+    compiled = GPU_QUERIES.get(key)
+    if compiled is None:
+        fields = []
+        for name in ("core",) + key:
+            fields.extend(GPU_FIELD_SETS[name])
+        command = (
+            "nvidia-smi --query-gpu="
+            + ",".join(query for _, query, _ in fields)
+            + " --format=csv,noheader,nounits"
+        )
+        converters = [(field, FIELD_CONVERTERS[kind]) for field, _, kind in fields]
+        compiled = GPU_QUERIES[key] = (command, converters)
+    return compiled
+
+
+def parse_gpu_rows(rows, converters):
+    gpus = []
+    for row in rows:
+        if len(row) != len(converters):
+            continue
+        gpu = {}
+        for (field, convert), value in zip(converters, row):
+            value = value.strip()
+            gpu[field] = None if value.lower() in NVSMI_MISSING else convert(value)
+        if any(gpu[field] is None for field in GPU_REQUIRED_FIELDS):
+            continue
+        gpus.append(gpu)
+    return gpus
+
+
+GPU_SLOW_CACHE = {}
+MIG_HOSTS = {}
+MIG_MARKER = "__GPU_MONITOR_MIG__"
+MIG_GPU_LINE = re.compile(r"^GPU (\d+): ")
+MIG_LIST_LINE = re.compile(r"^\s+MIG (\S+)\s+Device\s+(\d+): \(UUID: ([^)\s]+)\)")
+MIG_MEMORY_ROW = re.compile(
+    r"^\|\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+\|\s+(\d+)MiB\s*/\s*(\d+)MiB"
+)
+
+
+def _status_command(query, mig=True):
+    # MIG slices only show up in "nvidia-smi -L" and the plain table, so
+    # they ride along in the same SSH call, and only on partitioned hosts.
+    if not mig:
+        return query
+    return (
+        f"{query}; rc=$?; L=$(nvidia-smi -L 2>/dev/null); "
+        f"case \"$L\" in *'MIG '*) printf '%s\\n%s\\n%s\\n' {MIG_MARKER} \"$L\" {MIG_MARKER}; "
+        "nvidia-smi 2>/dev/null;; esac; exit $rc"
+    )
+
+
+def parse_mig_devices(listing, table):
+    devices = {}
+    index = None
+    for line in listing.splitlines():
+        match = MIG_GPU_LINE.match(line)
+        if match:
+            index = int(match.group(1))
+            continue
+        match = MIG_LIST_LINE.match(line)
+        if match and index is not None:
+            devices.setdefault(index, []).append(
+                {
+                    "device": int(match.group(2)),
+                    "profile": match.group(1),
+                    "uuid": match.group(3),
+                    "gi": None,
+                    "ci": None,
+                    "mem_used": None,
+                    "mem_total": None,
+                }
+            )
+    in_section = False
+    for line in table.splitlines():
+        if "MIG devices" in line:
+            in_section = True
+        elif "Processes" in line:
+            break
+        elif in_section:
+            match = MIG_MEMORY_ROW.match(line)
+            if not match:
+                continue
+            gpu, gi, ci, device, used, total = [int(value) for value in match.groups()]
+            for slot in devices.get(gpu, []):
+                if slot["device"] == device:
+                    slot.update(gi=gi, ci=ci, mem_used=used, mem_total=total)
+    return devices
+
+
+def gpu_units(gpu):
+    return gpu.get("mig_devices") or [gpu]
+
+
+def _is_free(unit):
+    return unit.get("mem_used") is not None and unit["mem_used"] < GPU_FREE_MEM
+
+
+def _gpu_query_plan(host):
+    # Slow-changing field sets ride along with the regular query only every
+    # GPU_SLOW_INTERVAL seconds; in between their last values are merged in.
+    # A set named in both settings is treated as slow.
+    fast_sets = [name for name in GPU_FIELDS if name not in GPU_SLOW_FIELDS]
+    slow_sets = GPU_SLOW_FIELDS
+    slow_cached = GPU_SLOW_CACHE.get(host)
+    refresh_slow = bool(slow_sets) and (
+        slow_cached is None or time.time() - slow_cached[0] >= GPU_SLOW_INTERVAL
+    )
+    query, converters = gpu_query(fast_sets + slow_sets if refresh_slow else fast_sets)
+    # Hosts without MIG slices skip the "nvidia-smi -L" check until
+    # GPU_SLOW_INTERVAL has passed or a GPU reports MIG mode enabled.
+    mig_checked = MIG_HOSTS.get(host)
+    check_mig = (
+        mig_checked is None
+        or mig_checked[1]
+        or time.time() - mig_checked[0] >= GPU_SLOW_INTERVAL
+    )
+    return {
+        "query": query,
+        "converters": converters,
+        "slow_sets": slow_sets if refresh_slow else [],
+        "slow_cached": None if refresh_slow else slow_cached,
+        "mig": check_mig,
+    }
+
+
+def _status_result(host, rows, plan, mig=None):
+    gpus = parse_gpu_rows(rows, plan["converters"])
+    if mig:
+        mig_devices = parse_mig_devices(*mig)
+        for gpu in gpus:
+            if mig_devices.get(gpu["index"]):
+                gpu["mig_devices"] = mig_devices[gpu["index"]]
+    if plan["slow_sets"] and gpus:
+        slow_fields = [
+            field for name in plan["slow_sets"] for field, _, _ in GPU_FIELD_SETS[name]
+        ]
+        GPU_SLOW_CACHE[host] = (
+            time.time(),
+            {gpu["index"]: {field: gpu[field] for field in slow_fields} for gpu in gpus},
         )
+    elif plan["slow_cached"]:
+        for gpu in gpus:
+            gpu.update(plan["slow_cached"][1].get(gpu["index"], {}))
+    if gpus and plan["mig"]:
+        MIG_HOSTS[host] = (time.time(), bool(mig))
+    elif not mig and any(gpu.get("mig_mode") == "Enabled" for gpu in gpus):
+        MIG_HOSTS.pop(host, None)
+
+    if not gpus:
+        return {
+            "host": host,
+            "ok": False,
+            "error": "unable to parse nvidia-smi output",
+            "gpus": [],
+        }
+
+    utils = [gpu["util"] for gpu in gpus if gpu["util"] is not None]
+    util_avg = round(sum(utils) / len(utils)) if utils else None
+    units = [unit for gpu in gpus for unit in gpu_units(gpu)]
+    mem_used_total = sum(gpu["mem_used"] for gpu in gpus)
+    mem_total_total = sum(gpu["mem_total"] for gpu in gpus)
+    mem_pct = round((mem_used_total / mem_total_total) * 100) if mem_total_total else 0
+
+    return {
+        "host": host,
+        "ok": True,
+        "summary": {
+            "count": len(gpus),
+            "util_avg": util_avg,
+            "mem_used": mem_used_total,
+            "mem_total": mem_total_total,
+            "mem_pct": mem_pct,
+            "units": len(units),
+            "free": sum(1 for unit in units if _is_free(unit)),
+        },
+        "gpus": gpus,
+    }
+
+
+def _run_ssh(host):
+    return run_ssh_steps(_status_steps(host))
+
+
+def _status_steps(host):
+    plan = _gpu_query_plan(host)
+    cmd = _ssh_base_cmd(host)
+    cmd.extend([host, "sh", "-c", _quote_sh(_status_command(plan["query"], plan["mig"]))])
+    try:
+        result = yield cmd, None, 30
+    except subprocess.TimeoutExpired:
+        return {"host": host, "ok": False, "error": "ssh timed out", "gpus": []}
+
+    if result.returncode != 0:
+        error_text = _ssh_error_text(result)
+        if not error_text:
+            error_text = f"ssh exited with {result.returncode}"
+        return {"host": host, "ok": False, "error": error_text, "gpus": []}
+
+    output = result.stdout.strip()
+    if not output:
+        return {"host": host, "ok": False, "error": "no data from nvidia-smi", "gpus": []}
+
+    output, _, mig_text = output.partition(MIG_MARKER)
+    mig = None
+    if mig_text:
+        listing, _, table = mig_text.partition(MIG_MARKER)
+        mig = (listing, table)
+    return _status_result(host, csv.reader(output.splitlines()), plan, mig)
+
+
+PROBE_SCRIPT_ID = hashlib.sha256(GPU_PROCESS_SCRIPT.encode("utf-8")).hexdigest()[:16]
+PROBE_SCRIPT_SIZE = len(GPU_PROCESS_SCRIPT.encode("utf-8"))
+# Exit status the cached-probe commands use for "not installed / cannot install".
+PROBE_CACHE_MISS = 97
+PROBE_CACHE_PREFIX = (
+    'd="${XDG_CACHE_HOME:-$HOME/.cache}/gpu_monitor"; '
+    f'f="$d/gpu_probe_{PROBE_SCRIPT_ID}.py"; '
+    "py=$(command -v python3 || command -v python); "
+)
+# The file name carries the script hash, so a size check is enough to catch
+# a truncated install; running it with -m lets Python reuse cached bytecode.
+PROBE_CACHE_RUN = (
+    f'if [ -n "$py" ] && [ "$(wc -c 2>/dev/null < "$f")" -eq {PROBE_SCRIPT_SIZE} ] 2>/dev/null; then '
+    f'PYTHONPATH="$d" exec "$py" -m gpu_probe_{PROBE_SCRIPT_ID}; fi; '
+)
+PROBE_CACHE_COMMANDS = {
+    "run": PROBE_CACHE_PREFIX + PROBE_CACHE_RUN + f"exit {PROBE_CACHE_MISS}",
+    "install": (
+        PROBE_CACHE_PREFIX
+        + PROBE_CACHE_RUN
+        + '[ -n "$py" ] && (umask 077; mkdir -p "$d") 2>/dev/null '
+        + '&& cat > "$f.$$" && mv -f "$f.$$" "$f" && '
+        + PROBE_CACHE_RUN
+        + f'rm -f "$f.$$"; exit {PROBE_CACHE_MISS}'
+    ),
+    "stdin": "command -v python3 >/dev/null 2>&1 && exec python3 - || exec python -",
+}
+PROBE_CACHE_STATE = {}
+PROBE_CACHE_LOCK = threading.Lock()
+
+
+def _probe_mode(host):
+    if not SSH_PROBE_CACHE:
+        return "stdin"
+    with PROBE_CACHE_LOCK:
+        state = PROBE_CACHE_STATE.get(host)
+    if state == "installed":
+        return "run"
+    if state is None or time.time() - state >= SSH_PROBE_CACHE_RETRY:
+        return "install"
+    return "stdin"
+
+
+def _probe_step(host, mode):
+    cmd = _ssh_base_cmd(host)
+    cmd.extend([host, "sh", "-c", _quote_sh(PROBE_CACHE_COMMANDS[mode])])
+    # Bytes, not text, so the installed file matches PROBE_SCRIPT_SIZE
+    # regardless of the local platform's newline translation.
+    return cmd, b"" if mode == "run" else GPU_PROCESS_SCRIPT.encode("utf-8"), 30
+
+
+def _run_ssh_processes(host):
+    return run_ssh_steps(_process_steps(host))
+
+
+def _process_steps(host):
+    # The probe is installed once per host under a hash-named file and then
+    # run by path; a miss (wiped cache, read-only home, no writable $HOME)
+    # falls back to piping the script over stdin, and installing is retried
+    # after SSH_PROBE_CACHE_RETRY seconds.
+    mode = _probe_mode(host)
+    try:
+        result = yield _probe_step(host, mode)
+        if mode != "stdin" and result.returncode == PROBE_CACHE_MISS:
+            if mode == "run":
+                mode = "install"
+                result = yield _probe_step(host, mode)
+            if result.returncode == PROBE_CACHE_MISS:
+                with PROBE_CACHE_LOCK:
+                    PROBE_CACHE_STATE[host] = time.time()
+                mode = "stdin"
+                result = yield _probe_step(host, mode)
     except subprocess.TimeoutExpired:
         return {"host": host, "ok": False, "error": "ssh timed out", "processes": []}
+    if mode != "stdin" and result.returncode == 0:
+        with PROBE_CACHE_LOCK:
+            PROBE_CACHE_STATE[host] = "installed"
 
     if result.returncode != 0:
         error_text = _ssh_error_text(result)
@@ -705,8 +1880,10 @@ def _run_ssh_processes(host):
         return {"host": host, "ok": True, "processes": []}
 
     try:
-        processes = json.loads(output)
+        data = json.loads(output)
     except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict) or not isinstance(data.get("processes"), list):
         return {
             "host": host,
             "ok": False,
@@ -714,9 +1891,47 @@ def _run_ssh_processes(host):
             "processes": [],
         }
 
+    processes = data["processes"]
+    _apply_cpu_deltas(host, processes, data.get("clk_tck"), data.get("uptime"))
     return {"host": host, "ok": True, "processes": processes}
 
 
+PROCESS_CPU_SAMPLES = {}
+PROCESS_SNAPSHOTS = {}
+PROCESS_STATE_LOCK = threading.Lock()
+
+
+def _apply_cpu_deltas(host, processes, clk_tck, uptime):
+    # CPU% comes from the tick delta since this host's previous sample, so
+    # the probe never has to sleep; a process seen for the first time gets
+    # its lifetime average instead.
+    if not clk_tck or uptime is None:
+        for item in processes:
+            item.pop("cpu_ticks", None)
+            item["cpu_pct"] = None
+        return
+    with PROCESS_STATE_LOCK:
+        previous = PROCESS_CPU_SAMPLES.get(host, {})
+        current = {}
+        for item in processes:
+            ticks = item.pop("cpu_ticks", None)
+            start_ticks = item.get("start_ticks")
+            if ticks is None or start_ticks is None:
+                item["cpu_pct"] = None
+                continue
+            key = (item.get("pid"), start_ticks)
+            current[key] = (ticks, uptime)
+            last = previous.get(key)
+            if last and uptime > last[1]:
+                elapsed = uptime - last[1]
+                used = (ticks - last[0]) / clk_tck
+            else:
+                elapsed = uptime - start_ticks / clk_tck
+                used = ticks / clk_tck
+            item["cpu_pct"] = round(used / elapsed * 100, 1) if elapsed > 0 else None
+        PROCESS_CPU_SAMPLES[host] = current
+
+
 def _remote_file_size(host, remote_path):
     cmd = _ssh_base_cmd(host)
     quoted = _quote_sh(remote_path)
@@ -749,12 +1964,283 @@ def _remote_file_size(host, remote_path):
         return None, "invalid file size"
 
 
-def _upload_via_ssh(host, remote_path, source, length):
+def _tail_command(host, path, offset, resume_file=""):
+    remote_cmd = " ".join(
+        _quote_sh(arg) for arg in ("-", path, str(offset), resume_file)
+    )
+    remote_cmd = (
+        f"command -v python3 >/dev/null 2>&1 && exec python3 {remote_cmd} "
+        f"|| exec python {remote_cmd}"
+    )
+    cmd = _ssh_base_cmd(host)
+    cmd.extend([host, "sh", "-c", _quote_sh(remote_cmd)])
+    return cmd
+
+
+def _open_tail(host, path, offset, resume_file=""):
+    proc = subprocess.Popen(
+        _tail_command(host, path, offset, resume_file),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        proc.stdin.write(TAIL_SCRIPT.encode("utf-8"))
+        proc.stdin.close()
+    except OSError:
+        pass
+    return proc
+
+
+def _tail_frame(line):
+    """SSE bytes for one JSON line from TAIL_SCRIPT, or None to skip it."""
+    try:
+        frame = json.loads(line)
+    except ValueError:
+        return None
+    event = frame.pop("event", "")
+    if event == "ping":
+        return b": ping\n\n"
+    event_id = ""
+    if "offset" in frame:
+        event_id = f"id: {frame.get('file') or ''}@{frame['offset']}\n"
+    return f"event: {event}\n{event_id}data: {json.dumps(frame)}\n\n".encode("utf-8")
+
+
+def _tail_failed_frame(stderr, returncode):
+    error_text = stderr.decode("utf-8", "replace").strip()
+    error_text = error_text or f"ssh exited with {returncode}"
+    return f"event: failed\ndata: {json.dumps({'error': error_text})}\n\n".encode("utf-8")
+
+
+def _parse_tail_resume(query, last_event_id):
+    # Event ids are "<file id>@<offset>", so EventSource's automatic
+    # reconnect (Last-Event-ID) resumes where the client left off, and a
+    # different file id on resume means the log was rotated meanwhile.
+    resume = (query.get("resume") or [last_event_id or ""])[0]
+    resume_file, _, offset_text = resume.rpartition("@")
+    try:
+        offset = int((query.get("offset") or [offset_text])[0])
+    except ValueError:
+        offset = -SSH_TAIL_BYTES
+        resume_file = ""
+    return offset, resume_file
+
+
+LISTING_CACHE = {}
+LISTING_CACHE_LOCK = threading.Lock()
+LISTING_CACHE_ENTRIES = 256
+LISTING_TYPES = {"d": "dir", "f": "file", "l": "link"}
+
+
+def _fetch_listing(host, path):
+    # Each entry is printed as type, link target type, size, mtime and name,
+    # NUL-terminated so any file name survives; the resolved directory comes
+    # first on its own line. GNU find does it in one pass; elsewhere (BSD,
+    # busybox) a POSIX glob loop asks stat for size and mtime per entry.
+    limit = SSH_LS_LIMIT + 1
+    remote_cmd = (
+        f"p={_quote_sh(path)}; "
+        'case "$p" in ""|"~") p="$HOME" ;; "~/"*) p="$HOME/${p#"~/"}" ;; esac; '
+        'cd -- "$p" && pwd -P || exit 1; '
+        "if find . -maxdepth 0 -printf '' 2>/dev/null && head -z -n 1 </dev/null 2>/dev/null; "
+        "then find . -mindepth 1 -maxdepth 1 -printf '%y\\t%Y\\t%s\\t%T@\\t%f\\0' 2>/dev/null "
+        f"| head -z -n {limit}; "
+        "else n=0; for f in * .[!.]* ..?*; do "
+        '[ -e "$f" ] || [ -L "$f" ] || continue; '
+        f'n=$((n + 1)); [ "$n" -gt {limit} ] && break; '
+        'if [ -d "$f" ]; then t=d; elif [ -f "$f" ]; then t=f; '
+        'elif [ -e "$f" ]; then t=o; else t=N; fi; '
+        'k=$t; [ -L "$f" ] && k=l; '
+        "m=$(stat -c '%s %Y' -- \"$f\" 2>/dev/null || stat -f '%z %m' -- \"$f\" 2>/dev/null); "
+        "printf '%s\\t%s\\t%s\\t%s\\t%s\\0' \"$k\" \"$t\" \"${m% *}\" \"${m#* }\" \"$f\"; "
+        "done; fi"
+    )
+    cmd = _ssh_base_cmd(host)
+    cmd.extend([host, "sh", "-c", _quote_sh(remote_cmd)])
+    try:
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            timeout=SSH_FILE_TIMEOUT,
+            check=False,
+        )
+    except subprocess.TimeoutExpired:
+        return None, "ssh timed out"
+    if result.returncode != 0:
+        error_text = (result.stderr or b"").decode("utf-8", "replace").strip()
+        return None, error_text or f"ssh exited with {result.returncode}"
+
+    resolved, _, body = result.stdout.partition(b"\n")
+    entries = []
+    for record in body.split(b"\0"):
+        parts = record.decode("utf-8", "replace").split("\t", 4)
+        if len(parts) != 5:
+            continue
+        kind, target, size, mtime, name = parts
+        is_link = kind == "l"
+        entry_type = LISTING_TYPES.get(target if is_link else kind, "other")
+        if is_link and target == "N":
+            entry_type = "link"
+        try:
+            entry_size = int(size)
+            entry_mtime = int(float(mtime))
+        except ValueError:
+            entry_size = entry_mtime = None
+        entries.append(
+            {
+                "name": name,
+                "type": entry_type,
+                "link": is_link,
+                "size": entry_size,
+                "mtime": entry_mtime,
+            }
+        )
+    truncated = len(entries) > SSH_LS_LIMIT
+    entries = entries[:SSH_LS_LIMIT]
+    entries.sort(key=_listing_order)
+    return {
+        "path": resolved.decode("utf-8", "replace"),
+        "entries": entries,
+        "order": [_listing_order(entry) for entry in entries],
+        "truncated": truncated,
+        "loaded_at": time.monotonic(),
+    }, ""
+
+
+def _listing_order(entry):
+    return (entry["type"] != "dir", entry["name"])
+
+
+def _listing_cursor(entry):
+    return f"{int(entry['type'] != 'dir')}/{entry['name']}"
+
+
+def list_remote_dir(host, path, cursor="", refresh=False):
+    # The whole directory is listed once and cached per (host, path); pages
+    # are slices of that cached listing, so paging never re-runs find. A
+    # cursor names the last entry already sent, not a position, so a page
+    # after a refresh picks up after that name even if entries came or went.
+    key = (host, path)
+    with LISTING_CACHE_LOCK:
+        entry = LISTING_CACHE.get(key)
+    if (
+        refresh
+        or entry is None
+        or time.monotonic() - entry["loaded_at"] > SSH_LS_TTL
+    ):
+        entry, error_text = _fetch_listing(host, path)
+        if error_text:
+            return {"ok": False, "host": host, "path": path, "error": error_text}
+        with LISTING_CACHE_LOCK:
+            LISTING_CACHE[key] = entry
+            while len(LISTING_CACHE) > LISTING_CACHE_ENTRIES:
+                oldest = min(LISTING_CACHE, key=lambda item: LISTING_CACHE[item]["loaded_at"])
+                del LISTING_CACHE[oldest]
+    entries = entry["entries"]
+    start = 0
+    if cursor:
+        is_file, _, name = cursor.partition("/")
+        start = bisect.bisect_right(entry["order"], (is_file == "1", name))
+    page = entries[start:start + max(SSH_LS_PAGE, 1)]
+    remaining = len(entries) - start - len(page)
+    return {
+        "ok": True,
+        "host": host,
+        "path": entry["path"],
+        "entries": page,
+        "total": len(entries),
+        "remaining": remaining,
+        "next": _listing_cursor(page[-1]) if remaining > 0 else None,
+        "truncated": entry["truncated"],
+        "age": round(time.monotonic() - entry["loaded_at"], 1),
+    }
+
+
+def _invalidate_listings(host, remote_path=None):
+    # Uploads drop only the target's directory (plus any ~-relative keys,
+    # which cannot be matched without resolving them); commands drop the host.
+    parent = posixpath.dirname(remote_path) if remote_path else None
+    with LISTING_CACHE_LOCK:
+        for key in list(LISTING_CACHE):
+            if key[0] != host:
+                continue
+            if (
+                parent is None
+                or key[1] == parent
+                or LISTING_CACHE[key]["path"] == parent
+                or not key[1].startswith("/")
+            ):
+                del LISTING_CACHE[key]
+
+
+def _upload_command(host, remote_path):
     cmd = _ssh_base_cmd(host)
     quoted = _quote_sh(remote_path)
     cmd.extend([host, "sh", "-c", _quote_sh(f"cat > {quoted}")])
+    return cmd
+
+
+def _upload_result(returncode, stdout, stderr, remaining, error_text):
+    if remaining > 0 and not error_text:
+        error_text = "upload interrupted"
+    if returncode != 0 and not error_text:
+        error_text = (stderr or stdout or b"").decode("utf-8", errors="ignore").strip()
+        if not error_text:
+            error_text = f"ssh exited with {returncode}"
+
+    if error_text:
+        return {"ok": False, "error": error_text}
+    return {"ok": True}
+
+
+def _upload_target(query, headers):
+    """(host, remote path, length, error) for an /api/upload request."""
+    host = (query.get("host") or [None])[0]
+    remote_path = (query.get("path") or [None])[0]
+    filename = (query.get("name") or [None])[0]
+    if not host or not remote_path:
+        return host, remote_path, 0, "missing host or path"
+    if remote_path.endswith("/"):
+        if not filename:
+            return host, remote_path, 0, "missing filename"
+        remote_path = remote_path + filename
+    length_header = headers.get("Content-Length")
+    if length_header is None:
+        return host, remote_path, 0, "missing content length"
+    try:
+        length = int(length_header or 0)
+    except ValueError:
+        return host, remote_path, 0, "invalid content length"
+    if length < 0:
+        return host, remote_path, 0, "invalid content length"
+    return host, remote_path, length, ""
+
+
+def _fanout_target(query, headers):
+    """(hosts, remote path, length, error) for an /api/upload-many request."""
+    hosts = [host for item in query.get("hosts") or [] for host in item.split(",") if host.strip()]
+    hosts = list(dict.fromkeys(hosts + resolve_hosts(group=(query.get("group") or [""])[0])))
+    remote_path = (query.get("path") or [None])[0]
+    filename = (query.get("name") or [None])[0]
+    if not hosts or not remote_path:
+        return hosts, remote_path, 0, "missing hosts or path"
+    if remote_path.endswith("/"):
+        if not filename:
+            return hosts, remote_path, 0, "missing filename"
+        remote_path = remote_path + filename
+    try:
+        length = int(headers.get("Content-Length") or "")
+    except ValueError:
+        return hosts, remote_path, 0, "missing content length"
+    if length < 0:
+        return hosts, remote_path, 0, "invalid content length"
+    return hosts, remote_path, length, ""
+
+
+def _upload_via_ssh(host, remote_path, source, length):
     proc = subprocess.Popen(
-        cmd,
+        _upload_command(host, remote_path),
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -772,122 +2258,2179 @@ def _upload_via_ssh(host, remote_path, source, length):
         error_text = "ssh failed during upload"
     except ConnectionResetError:
         error_text = "client disconnected"
-    finally:
-        if proc.stdin:
-            try:
-                proc.stdin.close()
-            except Exception:
-                pass
+    except TimeoutError:
+        error_text = "client timed out"
 
+    # communicate() flushes and closes stdin itself; closing it first makes
+    # the flush fail on a closed file.
     try:
         stdout, stderr = proc.communicate(timeout=300)
     except subprocess.TimeoutExpired:
         proc.kill()
         return {"ok": False, "error": "upload timed out"}
+    return _upload_result(proc.returncode, stdout, stderr, remaining, error_text)
 
-    if remaining > 0 and not error_text:
-        error_text = "upload interrupted"
-    if proc.returncode != 0 and not error_text:
-        error_text = (stderr or stdout or b"").decode("utf-8", errors="ignore").strip()
-        if not error_text:
-            error_text = f"ssh exited with {proc.returncode}"
 
-    if error_text:
-        return {"ok": False, "error": error_text}
-    return {"ok": True}
+class FanoutUpload:
+    """One request body delivered to many hosts.
 
+    The body is spooled to a temp file as it arrives, and every host's
+    writer follows the spool at its own pace into its own `ssh cat` pipe,
+    so memory stays at one chunk per host and a slow host holds up neither
+    the client nor the other hosts.
+    """
 
-def _download_via_sftp(host, remote_path):
-    temp_dir = tempfile.mkdtemp(prefix="gpu_monitor_")
-    tmp_path = os.path.join(temp_dir, f"download_{uuid.uuid4().hex}")
-    local_path = _sftp_local_path(tmp_path)
-    cmd = _sftp_base_cmd(host)
-    cmd.extend(["-b", "-", host])
-    script = f"get {_quote_sftp_path(remote_path)} {_quote_sftp_path(local_path)}\n"
-    try:
-        result = subprocess.run(
-            cmd,
-            input=script.encode("utf-8"),
-            capture_output=True,
-            timeout=SSH_FILE_TIMEOUT,
-            check=False,
-        )
-    except subprocess.TimeoutExpired:
-        try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
+    def __init__(self, hosts, remote_path, length, verify=False):
+        fd, self.spool_path = tempfile.mkstemp(prefix="gpu_monitor_fanout_")
+        self.spool = os.fdopen(fd, "wb")
+        self.hosts = hosts
+        self.remote_path = remote_path
+        self.length = length
+        self.verify = verify
+        self.received = 0
+        self.done = False
+        self.aborted = False
+        self.digest = hashlib.sha256()
+        self.cond = threading.Condition()
+        self.progress = {
+            host: {"host": host, "state": "queued", "bytes": 0} for host in hosts
+        }
+
+    def receive(self, source):
+        remaining = self.length
         try:
-            os.rmdir(temp_dir)
+            while remaining > 0:
+                chunk = source.read(min(65536, remaining))
+                if not chunk:
+                    break
+                self.spool.write(chunk)
+                self.spool.flush()
+                self.digest.update(chunk)
+                remaining -= len(chunk)
+                with self.cond:
+                    self.received += len(chunk)
+                    self.cond.notify_all()
         except OSError:
             pass
-        return None, None, "ssh timed out"
-    if result.returncode != 0:
-        error_text = _ssh_error_text(result)
-        if not error_text:
-            error_text = f"sftp exited with {result.returncode}"
+        finally:
+            self.spool.close()
+            with self.cond:
+                self.done = True
+                self.aborted = remaining > 0
+                self.cond.notify_all()
+        return not self.aborted
+
+    def _remote_command(self):
+        quoted = _quote_sh(self.remote_path)
+        remote_cmd = f"cat > {quoted}"
+        if self.verify:
+            # Hashing stdin keeps the file name out of the output; sha256sum
+            # escapes names containing a backslash or newline with a leading
+            # backslash on the digest.
+            remote_cmd += (
+                f" && {{ sha256sum < {quoted} 2>/dev/null "
+                f"|| shasum -a 256 < {quoted} 2>/dev/null || true; }}"
+            )
+        return remote_cmd
+
+    def _ssh_command(self, host):
+        cmd = _ssh_base_cmd(host)
+        cmd.extend([host, "sh", "-c", _quote_sh(self._remote_command())])
+        return cmd
+
+    def deliver(self, host):
+        entry = self.progress[host]
+        entry["state"] = "sending"
+        proc = subprocess.Popen(
+            self._ssh_command(host),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        error_text = ""
+        sent = 0
         try:
-            os.remove(tmp_path)
+            with open(self.spool_path, "rb") as spool:
+                while True:
+                    with self.cond:
+                        while self.received <= sent and not self.done:
+                            self.cond.wait(1)
+                        if self.aborted:
+                            error_text = "upload interrupted"
+                            break
+                        available = self.received - sent
+                    if available <= 0:
+                        break
+                    chunk = spool.read(min(65536, available))
+                    if not chunk:
+                        error_text = "spool read failed"
+                        break
+                    proc.stdin.write(chunk)
+                    sent += len(chunk)
+                    entry["bytes"] = sent
         except OSError:
-            pass
+            # The remote side went away; its stderr below says why.
+            error_text = "ssh failed during upload"
+        else:
+            if error_text and proc.poll() is None:
+                proc.kill()
         try:
-            os.rmdir(temp_dir)
-        except OSError:
-            pass
-        return None, None, error_text
-    return tmp_path, temp_dir, ""
+            stdout, stderr = proc.communicate(timeout=300)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            stdout, stderr = proc.communicate()
+            error_text = error_text or "upload timed out"
+        return self._delivered(host, proc.returncode, stdout, stderr, sent, error_text)
 
-def fetch_gpu_processes(host, index):
-    result = _run_ssh_processes(host)
-    if not result.get("ok"):
-        result["index"] = index
+    def _delivered(self, host, returncode, stdout, stderr, sent, error_text):
+        entry = self.progress[host]
+        if returncode != 0 and error_text in ("", "ssh failed during upload"):
+            remote_error = (stderr or stdout or b"").decode("utf-8", errors="ignore").strip()
+            error_text = remote_error or error_text or f"ssh exited with {returncode}"
+        result = {"host": host, "ok": not error_text, "bytes": sent, "error": error_text}
+        if self.verify and not error_text:
+            remote_digest = (stdout or b"").decode("ascii", errors="ignore").split()[:1]
+            if not remote_digest:
+                result["verified"] = None
+            else:
+                result["verified"] = remote_digest[0] == self.digest.hexdigest()
+                if not result["verified"]:
+                    result.update(ok=False, error="checksum mismatch")
+        entry.update(state="done" if result["ok"] else "failed", error=result["error"])
+        return result
+
+    def run(self, source, parallel):
+        workers = max(1, min(parallel, SSH_BROADCAST_MAX_PARALLEL, len(self.hosts)))
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = {executor.submit(self.deliver, host): host for host in self.hosts}
+            received = self.receive(source)
+            results = []
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as exc:
+                    host = futures[future]
+                    results.append({"host": host, "ok": False, "bytes": 0, "error": f"error: {exc}"})
+        finally:
+            executor.shutdown(wait=True)
+            try:
+                os.remove(self.spool_path)
+            except OSError:
+                pass
+        return self._summary(results, received)
+
+    def _summary(self, results, received):
+        order = {host: position for position, host in enumerate(self.hosts)}
+        results.sort(key=lambda result: order[result["host"]])
+        ok_count = sum(1 for result in results if result["ok"])
+        return {
+            "ok": received and ok_count == len(results),
+            "path": self.remote_path,
+            "size": self.received,
+            "sha256": self.digest.hexdigest() if received else None,
+            "error": "" if received else "upload interrupted",
+            "hosts": len(results),
+            "succeeded": ok_count,
+            "failed": len(results) - ok_count,
+            "results": results,
+        }
+
+    # The same transfer for the asyncio server: the client body and every
+    # host's ssh pipe are loop streams, and an asyncio.Condition stands in
+    # for self.cond.
+
+    async def receive_async(self, reader, cond):
+        remaining = self.length
+        try:
+            while remaining > 0:
+                chunk = await asyncio.wait_for(
+                    reader.read(min(65536, remaining)), HTTP_READ_TIMEOUT
+                )
+                if not chunk:
+                    break
+                self.spool.write(chunk)
+                self.spool.flush()
+                self.digest.update(chunk)
+                remaining -= len(chunk)
+                async with cond:
+                    self.received += len(chunk)
+                    cond.notify_all()
+        except (OSError, asyncio.TimeoutError):
+            pass
+        finally:
+            self.spool.close()
+            async with cond:
+                self.done = True
+                self.aborted = remaining > 0
+                cond.notify_all()
+        return not self.aborted
+
+    async def deliver_async(self, host, cond):
+        entry = self.progress[host]
+        entry["state"] = "sending"
+        proc = await asyncio.create_subprocess_exec(
+            *self._ssh_command(host),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        error_text = ""
+        sent = 0
+        try:
+            with open(self.spool_path, "rb") as spool:
+                while True:
+                    async with cond:
+                        await cond.wait_for(lambda: self.received > sent or self.done)
+                    if self.aborted:
+                        error_text = "upload interrupted"
+                        break
+                    available = self.received - sent
+                    if available <= 0:
+                        break
+                    chunk = spool.read(min(65536, available))
+                    if not chunk:
+                        error_text = "spool read failed"
+                        break
+                    proc.stdin.write(chunk)
+                    await proc.stdin.drain()
+                    sent += len(chunk)
+                    entry["bytes"] = sent
+        except OSError:
+            error_text = "ssh failed during upload"
+        else:
+            if error_text and proc.returncode is None:
+                proc.kill()
+        proc.stdin.close()
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), 300)
+        except asyncio.TimeoutError:
+            proc.kill()
+            stdout, stderr = await proc.communicate()
+            error_text = error_text or "upload timed out"
+        finally:
+            if proc.returncode is None:
+                proc.kill()
+                await proc.wait()
+        return self._delivered(host, proc.returncode, stdout, stderr, sent, error_text)
+
+    async def run_async(self, reader, parallel):
+        cond = asyncio.Condition()
+        workers = max(1, min(parallel, SSH_BROADCAST_MAX_PARALLEL, len(self.hosts)))
+        limit = asyncio.Semaphore(workers)
+
+        async def deliver(host):
+            async with limit:
+                try:
+                    return await self.deliver_async(host, cond)
+                except Exception as exc:
+                    return {"host": host, "ok": False, "bytes": 0, "error": f"error: {exc}"}
+
+        tasks = [asyncio.ensure_future(deliver(host)) for host in self.hosts]
+        try:
+            received = await self.receive_async(reader, cond)
+            results = list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+            try:
+                os.remove(self.spool_path)
+            except OSError:
+                pass
+        return self._summary(results, received)
+
+
+FANOUT_UPLOADS = {}
+FANOUT_UPLOADS_LOCK = threading.Lock()
+
+
+def _start_fanout(query, hosts, remote_path, length):
+    """(upload id, FanoutUpload registered for progress); None if the id is taken."""
+    verify = (query.get("verify") or ["0"])[0] not in ("", "0")
+    upload_id = (query.get("id") or [uuid.uuid4().hex])[0][:64]
+    with FANOUT_UPLOADS_LOCK:
+        if upload_id in FANOUT_UPLOADS:
+            return upload_id, None
+        upload = FANOUT_UPLOADS[upload_id] = FanoutUpload(
+            hosts, remote_path, length, verify=verify
+        )
+    return upload_id, upload
+
+
+def _fanout_parallel(query):
+    try:
+        return int((query.get("parallel") or [SSH_BROADCAST_PARALLEL])[0])
+    except ValueError:
+        return SSH_BROADCAST_PARALLEL
+
+
+def fanout_progress(upload_id):
+    with FANOUT_UPLOADS_LOCK:
+        upload = FANOUT_UPLOADS.get(upload_id)
+    if upload is None:
+        return None
+    return {
+        "ok": True,
+        "id": upload_id,
+        "size": upload.length,
+        "received": upload.received,
+        "hosts": [dict(entry) for entry in upload.progress.values()],
+    }
+
+
+def _download_via_sftp(host, remote_path):
+    temp_dir = tempfile.mkdtemp(prefix="gpu_monitor_")
+    tmp_path = os.path.join(temp_dir, f"download_{uuid.uuid4().hex}")
+    local_path = _sftp_local_path(tmp_path)
+    cmd = _sftp_base_cmd(host)
+    cmd.extend(["-b", "-", host])
+    script = f"get {_quote_sftp_path(remote_path)} {_quote_sftp_path(local_path)}\n"
+    try:
+        result = subprocess.run(
+            cmd,
+            input=script.encode("utf-8"),
+            capture_output=True,
+            timeout=SSH_FILE_TIMEOUT,
+            check=False,
+        )
+    except subprocess.TimeoutExpired:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        try:
+            os.rmdir(temp_dir)
+        except OSError:
+            pass
+        return None, None, "ssh timed out"
+    if result.returncode != 0:
+        error_text = _ssh_error_text(result)
+        if not error_text:
+            error_text = f"sftp exited with {result.returncode}"
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        try:
+            os.rmdir(temp_dir)
+        except OSError:
+            pass
+        return None, None, error_text
+    return tmp_path, temp_dir, ""
+
+class ProbeStream:
+    """Long-running GPU_PROCESS_SCRIPT on one host that answers in deltas.
+
+    Each sample request gets back either a full keyframe or a delta against
+    the previous frame; deltas are applied to the cached host state here.
+    A delta whose base is not the last applied sequence number means a
+    frame was lost, and a full resync is requested instead.
+    """
+
+    BOOTSTRAP = (
+        "import sys; STREAM = getattr(sys.stdin, 'buffer', sys.stdin); "
+        "exec(STREAM.read(int(STREAM.readline())))"
+    )
+
+    def __init__(self, host):
+        self.host = host
+        self.lock = threading.Lock()
+        self.proc = None
+        self.lines = None
+        self.seq = 0
+        self.state = None
+        self.resyncs = 0
+        self.last_used = time.monotonic()
+
+    def _start(self):
+        bootstrap = _quote_sh(self.BOOTSTRAP)
+        remote_cmd = (
+            f"command -v python3 >/dev/null 2>&1 && exec python3 -c {bootstrap} "
+            f"|| exec python -c {bootstrap}"
+        )
+        cmd = _ssh_base_cmd(self.host)
+        cmd.extend([self.host, "sh", "-c", _quote_sh(remote_cmd)])
+        self.proc = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self.lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self.proc, self.lines), daemon=True).start()
+        script = GPU_PROCESS_SCRIPT.encode("utf-8")
+        self.proc.stdin.write(f"{len(script)}\n".encode("ascii") + script)
+        self.proc.stdin.flush()
+        self.seq = 0
+        self.state = None
+
+    @staticmethod
+    def _pump(proc, lines):
+        for line in iter(proc.stdout.readline, b""):
+            lines.put(line)
+        lines.put(None)
+
+    def _request(self, payload, timeout):
+        self.proc.stdin.write((json.dumps(payload) + "\n").encode("utf-8"))
+        self.proc.stdin.flush()
+        line = self.lines.get(timeout=timeout)
+        if line is None:
+            raise OSError("probe stream closed")
+        return json.loads(line)
+
+    def _apply(self, frame):
+        if frame["type"] == "full":
+            self.state = {key: frame.get(key) for key in PROBE_STATE_KEYS}
+            self.state["processes"] = dict(frame.get("processes") or {})
+            return
+        for key in PROBE_STATE_KEYS:
+            if key in frame:
+                self.state[key] = frame[key]
+        for position, row in (frame.get("gpu_rows") or {}).items():
+            self.state["gpus"][int(position)] = row
+        processes = self.state["processes"]
+        for key, fields in (frame.get("upsert") or {}).items():
+            processes[key] = dict(processes.get(key) or {}, **fields)
+        for key, names in (frame.get("unset") or {}).items():
+            for name in names:
+                processes.get(key, {}).pop(name, None)
+        for key in frame.get("remove") or []:
+            processes.pop(key, None)
+
+    def sample(self, query, timeout=30):
+        self.last_used = time.monotonic()
+        error_text = "probe stream failed"
+        for _ in range(2):
+            if self.proc is None or self.proc.poll() is not None:
+                self._start()
+            request = {"query": query, "full": self.state is None, "keyframe": SSH_PROBE_KEYFRAME}
+            try:
+                frame = self._request(request, timeout)
+                if frame.get("type") == "delta" and frame.get("base") != self.seq:
+                    self.resyncs += 1
+                    frame = self._request(dict(request, full=True), timeout)
+            except queue.Empty:
+                error_text = "probe stream timed out"
+                self.close()
+                continue
+            except (OSError, ValueError) as exc:
+                error_text = str(exc) or error_text
+                self.close()
+                continue
+            if frame.get("type") == "error":
+                return None, frame.get("error") or "probe failed"
+            self._apply(frame)
+            self.seq = frame["seq"]
+            return self.state, ""
+        return None, error_text
+
+    def close(self):
+        proc, self.proc = self.proc, None
+        self.state = None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+PROBE_STATE_KEYS = ("gpus", "mig", "clk_tck", "uptime", "boot_time")
+PROBE_STREAMS = {}
+PROBE_STREAMS_LOCK = threading.Lock()
+
+
+def _reap_probe_streams():
+    now = time.monotonic()
+    with PROBE_STREAMS_LOCK:
+        for host, stream in list(PROBE_STREAMS.items()):
+            if now - stream.last_used < SSH_SHELL_IDLE_TIMEOUT:
+                continue
+            if not stream.lock.acquire(blocking=False):
+                continue
+            del PROBE_STREAMS[host]
+            try:
+                stream.close()
+            finally:
+                stream.lock.release()
+
+
+def close_probe_streams():
+    with PROBE_STREAMS_LOCK:
+        streams = list(PROBE_STREAMS.values())
+        PROBE_STREAMS.clear()
+    for stream in streams:
+        stream.close()
+
+
+def _store_processes(host, result):
+    result["sampled_at"] = time.time()
+    if result.get("ok"):
+        with PROCESS_STATE_LOCK:
+            PROCESS_SNAPSHOTS[host] = result
+        if RECORD_HISTORY:
+            record_usage(host, result["processes"], result["sampled_at"])
+            record_waste(host, result["processes"], result["sampled_at"])
+    return result
+
+
+def sample_host_stream(host):
+    with PROBE_STREAMS_LOCK:
+        stream = PROBE_STREAMS.get(host)
+        if stream is None:
+            stream = PROBE_STREAMS[host] = ProbeStream(host)
+    plan = _gpu_query_plan(host)
+    with stream.lock:
+        state, error_text = stream.sample(plan["query"])
+        if state is None:
+            status = {"host": host, "ok": False, "error": error_text, "gpus": []}
+            processes = {"host": host, "ok": False, "error": error_text, "processes": []}
+        else:
+            status = _status_result(host, state.get("gpus") or [], plan, state.get("mig"))
+            items = [dict(item) for item in state["processes"].values()]
+            _apply_cpu_deltas(host, items, state.get("clk_tck"), state.get("uptime"))
+            processes = {"host": host, "ok": True, "processes": items}
+    _store_status(host, status)
+    _store_processes(host, processes)
+    return status, processes
+
+
+def fetch_host_processes(host, max_age=SSH_PROCESS_CACHE_TTL):
+    with PROCESS_STATE_LOCK:
+        snapshot = PROCESS_SNAPSHOTS.get(host)
+    if snapshot and time.time() - snapshot["sampled_at"] <= max_age:
+        return snapshot
+    if SSH_PROBE_STREAM:
+        return sample_host_stream(host)[1]
+    return _store_processes(host, _run_ssh_processes(host))
+
+
+async def fetch_host_processes_async(host, max_age=SSH_PROCESS_CACHE_TTL):
+    with PROCESS_STATE_LOCK:
+        snapshot = PROCESS_SNAPSHOTS.get(host)
+    if snapshot and time.time() - snapshot["sampled_at"] <= max_age:
+        return snapshot
+    if SSH_PROBE_STREAM:
+        # The stream's reader blocks on its own pipe, so it keeps a thread.
+        loop = asyncio.get_running_loop()
+        return (await loop.run_in_executor(None, sample_host_stream, host))[1]
+    return _store_processes(host, await run_ssh_steps_async(_process_steps(host)))
+
+
+def fetch_gpu_processes(host, index, max_age=SSH_PROCESS_CACHE_TTL):
+    return _gpu_processes(host, index, fetch_host_processes(host, max_age=max_age))
+
+
+async def fetch_gpu_processes_async(host, index, max_age=SSH_PROCESS_CACHE_TTL):
+    return _gpu_processes(host, index, await fetch_host_processes_async(host, max_age))
+
+
+def _gpu_processes(host, index, result):
+    result = dict(result)
+    if not result.get("ok"):
+        result["index"] = index
         return result
     processes = result.get("processes", [])
     filtered = [item for item in processes if item.get("gpu_index") == index]
-    return {"host": host, "ok": True, "index": index, "processes": filtered}
+    return {
+        "host": host,
+        "ok": True,
+        "index": index,
+        "processes": filtered,
+        "sampled_at": result.get("sampled_at"),
+    }
+
+
+STATUS_SNAPSHOTS = {}
+STATUS_SNAPSHOTS_LOCK = threading.Lock()
+# Usage, waste and percentile history and alert evaluation only make sense
+# for the long-running server; the --top/--json modes turn them off.
+RECORD_HISTORY = True
+
+
+def _store_status(host, result):
+    result["sampled_at"] = time.time()
+    with STATUS_SNAPSHOTS_LOCK:
+        STATUS_SNAPSHOTS[host] = result
+    if RECORD_HISTORY:
+        record_percentiles(result)
+        evaluate_alerts(result)
+    return result
+
+
+def fetch_host_status(host):
+    if SSH_PROBE_STREAM:
+        return sample_host_stream(host)[0]
+    return _store_status(host, _run_ssh(host))
+
+
+def fetch_statuses(hosts):
+    if not hosts:
+        return []
+
+    max_workers = max(1, min(COLLECT_PARALLEL, len(hosts)))
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_map = {executor.submit(fetch_host_status, host): host for host in hosts}
+        for future in as_completed(future_map):
+            host = future_map[future]
+            try:
+                results[host] = future.result()
+            except Exception as exc:
+                results[host] = {
+                    "host": host,
+                    "ok": False,
+                    "error": f"error: {exc}",
+                    "gpus": [],
+                }
+
+    ordered = []
+    for host in hosts:
+        ordered.append(results.get(host, {"host": host, "ok": False, "error": "missing"}))
+    return ordered
+
+
+async def fetch_statuses_async(hosts):
+    """fetch_statuses for the asyncio server, in host order."""
+    loop = asyncio.get_running_loop()
+    limit = asyncio.Semaphore(max(1, COLLECT_PARALLEL))
+
+    async def fetch(host):
+        async with limit:
+            try:
+                if SSH_PROBE_STREAM:
+                    return await loop.run_in_executor(None, fetch_host_status, host)
+                return _store_status(host, await run_ssh_steps_async(_status_steps(host)))
+            except Exception as exc:
+                return {"host": host, "ok": False, "error": f"error: {exc}", "gpus": []}
+
+    return list(await asyncio.gather(*(fetch(host) for host in hosts)))
+
+
+def resolve_hosts(hosts=None, group=None):
+    if isinstance(hosts, list) and hosts and all(isinstance(h, str) for h in hosts):
+        return list(dict.fromkeys(hosts))
+    if isinstance(group, str):
+        group = group.replace(",", " ").split()
+    if isinstance(group, list) and group:
+        patterns = [item for item in group if isinstance(item, str) and item]
+        return [
+            host
+            for host in parse_ssh_config(SSH_CONFIG_PATH)
+            if any(fnmatch.fnmatchcase(host, pattern) for pattern in patterns)
+        ]
+    return []
+
+
+def broadcast_command(hosts, command, cwd=None, parallel=SSH_BROADCAST_PARALLEL):
+    if not hosts:
+        return
+    max_workers = max(1, min(parallel, SSH_BROADCAST_MAX_PARALLEL, len(hosts)))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        future_map = {
+            executor.submit(_run_ssh_command, host, command, cwd): host for host in hosts
+        }
+        for future in as_completed(future_map):
+            host = future_map[future]
+            try:
+                result = future.result()
+            except Exception as exc:
+                result = _broadcast_failure(exc)
+            result["host"] = host
+            yield result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def broadcast_command_async(hosts, command, cwd=None, parallel=SSH_BROADCAST_PARALLEL):
+    """broadcast_command for the asyncio server; results arrive as hosts finish."""
+    if not hosts:
+        return
+    limit = asyncio.Semaphore(max(1, min(parallel, SSH_BROADCAST_MAX_PARALLEL, len(hosts))))
+
+    async def run(host):
+        async with limit:
+            try:
+                result = await run_ssh_steps_async(_command_steps(host, command, cwd))
+            except Exception as exc:
+                result = _broadcast_failure(exc)
+        result["host"] = host
+        return result
+
+    tasks = [asyncio.ensure_future(run(host)) for host in hosts]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        # A client that hangs up stops the hosts that have not finished.
+        for task in tasks:
+            task.cancel()
+
+
+def _broadcast_failure(exc):
+    return {
+        "ok": False,
+        "error": f"error: {exc}",
+        "exit_code": None,
+        "stdout": "",
+        "stderr": "",
+    }
+
+
+def summarize_broadcast(results):
+    groups = {}
+    for result in results:
+        exit_code = result.get("exit_code")
+        key = (
+            exit_code,
+            result.get("stdout", ""),
+            result.get("stderr", ""),
+            result.get("error", "") if exit_code is None else "",
+        )
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "ok": bool(result.get("ok")),
+                "exit_code": exit_code,
+                "stdout": result.get("stdout", ""),
+                "stderr": result.get("stderr", ""),
+                "error": result.get("error", ""),
+                "hosts": [],
+            }
+        group["hosts"].append(result.get("host"))
+    ordered = sorted(groups.values(), key=lambda group: -len(group["hosts"]))
+    ok_count = sum(len(group["hosts"]) for group in ordered if group["ok"])
+    return {
+        "total": len(results),
+        "ok": ok_count,
+        "failed": len(results) - ok_count,
+        "groups": ordered,
+    }
+
+
+USAGE_DIMENSIONS = ("user", "project", "host")
+USAGE_BUCKETS = {dimension: {} for dimension in USAGE_DIMENSIONS}
+USAGE_LAST_SAMPLE = {}
+USAGE_PRUNED_HOUR = 0
+USAGE_LOCK = threading.Lock()
+
+
+def _gpu_slot(item):
+    return (item.get("gpu_index"), item.get("mig_device"))
+
+
+def record_usage(host, processes, sampled_at):
+    # Each sample charges the time since the host's previous sample to the
+    # users holding its GPUs (or MIG slices); a GPU shared by several users
+    # is split evenly, and a user's share is split across their processes.
+    with USAGE_LOCK:
+        last = USAGE_LAST_SAMPLE.get(host)
+        USAGE_LAST_SAMPLE[host] = sampled_at
+        if last is None or sampled_at <= last:
+            return
+        elapsed = min(sampled_at - last, USAGE_MAX_GAP)
+        holders = {}
+        for item in processes:
+            key = (_gpu_slot(item), item.get("user") or "unknown")
+            holders[key] = holders.get(key, 0) + 1
+        users_per_slot = {}
+        for slot, _ in holders:
+            users_per_slot[slot] = users_per_slot.get(slot, 0) + 1
+        hour = int(sampled_at // 3600) * 3600
+        for item in processes:
+            user = item.get("user") or "unknown"
+            slot = _gpu_slot(item)
+            share = 1 / (users_per_slot[slot] * holders[(slot, user)])
+            mem_used = item.get("mem_used") or 0
+            for dimension, key in (
+                ("user", user),
+                ("project", item.get("cwd") or "unknown"),
+                ("host", host),
+            ):
+                series = USAGE_BUCKETS[dimension].setdefault(key, {})
+                counters = series.get(hour)
+                if counters is None:
+                    counters = series[hour] = [0.0, 0.0]
+                counters[0] += elapsed * share
+                counters[1] += elapsed * mem_used
+        _prune_usage(hour)
+
+
+def _prune_usage(now_hour):
+    global USAGE_PRUNED_HOUR
+    if USAGE_PRUNED_HOUR == now_hour:
+        return
+    USAGE_PRUNED_HOUR = now_hour
+    cutoff = now_hour - USAGE_RETENTION_DAYS * 86400
+    for buckets in USAGE_BUCKETS.values():
+        for key in list(buckets):
+            series = buckets[key]
+            for hour in [hour for hour in series if hour < cutoff]:
+                del series[hour]
+            if not series:
+                del buckets[key]
+
+
+def _parse_range(text, default, limit=None):
+    text = (text or "").strip().lower()
+    if not text:
+        return default
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+    unit = units.get(text[-1])
+    number = text[:-1] if unit else text
+    try:
+        value = float(number) * (unit or 1)
+    except ValueError:
+        return default
+    if not math.isfinite(value) or value <= 0:
+        return default
+    return min(value, limit) if limit else value
+
+
+def usage_report(by="user", seconds=7 * 86400, series=False):
+    now = time.time()
+    start_hour = int((now - seconds) // 3600) * 3600
+    rows = []
+    with USAGE_LOCK:
+        for key, buckets in USAGE_BUCKETS[by].items():
+            hours = sorted(hour for hour in buckets if hour >= start_hour)
+            if not hours:
+                continue
+            gpu_seconds = sum(buckets[hour][0] for hour in hours)
+            mem_seconds = sum(buckets[hour][1] for hour in hours)
+            row = {
+                "key": key,
+                "gpu_hours": round(gpu_seconds / 3600, 3),
+                "gpu_mem_gib_hours": round(mem_seconds / 1024 / 3600, 3),
+            }
+            if series:
+                row["series"] = [
+                    [hour, round(buckets[hour][0], 1), round(buckets[hour][1], 1)]
+                    for hour in hours
+                ]
+            rows.append(row)
+    rows.sort(key=lambda row: (-row["gpu_hours"], row["key"]))
+    report = {
+        "ok": True,
+        "by": by,
+        "range_seconds": int(seconds),
+        "since": start_hour,
+        "collector": COLLECT_INTERVAL > 0,
+        "rows": rows,
+    }
+    if COLLECT_INTERVAL <= 0:
+        report["warning"] = (
+            "collector disabled: only hosts whose processes were viewed are counted; "
+            "set COLLECT_INTERVAL to account for the whole fleet"
+        )
+    return report
+
+
+# Utilization and memory are whole percentages, so a 101-bin count histogram
+# is an exact quantile sketch: fixed size, and merging is element-wise add.
+SKETCH_BINS = 101
+PERCENTILE_METRICS = ("util", "mem")
+PERCENTILE_SERIES = {}
+PERCENTILE_COMPACTED_HOUR = 0
+PERCENTILE_LOCK = threading.Lock()
+
+
+def _new_sketch(typecode):
+    return array(typecode, [0]) * (SKETCH_BINS * len(PERCENTILE_METRICS))
+
+
+def record_percentiles(status):
+    # One sketch per (host, GPU) per hour; hours older than PERCENTILE_HOURS
+    # are folded into per-day sketches kept for PERCENTILE_DAYS, which bounds
+    # each series at PERCENTILE_HOURS + PERCENTILE_DAYS sketches. Bins hold
+    # tenths of a second: each sample covers the time since that GPU's
+    # previous one (capped at USAGE_MAX_GAP), so bursts of dashboard polls
+    # don't outweigh quiet hours.
+    if not status.get("ok"):
+        return
+    sampled_at = status.get("sampled_at") or time.time()
+    hour = int(sampled_at // 3600) * 3600
+    with PERCENTILE_LOCK:
+        for gpu in status.get("gpus") or []:
+            series = PERCENTILE_SERIES.setdefault(
+                (status["host"], gpu.get("index")), {"hours": {}, "days": {}, "last": None}
+            )
+            last, series["last"] = series["last"], max(series["last"] or 0, sampled_at)
+            if last is None or sampled_at <= last:
+                continue
+            weight = round(min(sampled_at - last, USAGE_MAX_GAP) * 10)
+            if not weight:
+                continue
+            sketch = series["hours"].get(hour)
+            if sketch is None:
+                sketch = series["hours"][hour] = _new_sketch("H")
+            mem_total = gpu.get("mem_total")
+            values = (
+                gpu.get("util"),
+                gpu["mem_used"] / mem_total * 100 if mem_total else None,
+            )
+            for position, value in enumerate(values):
+                if value is None:
+                    continue
+                slot = position * SKETCH_BINS + min(max(round(value), 0), SKETCH_BINS - 1)
+                sketch[slot] = min(sketch[slot] + weight, 0xFFFF)
+        _compact_percentiles(hour)
+
+
+def _compact_percentiles(now_hour):
+    global PERCENTILE_COMPACTED_HOUR
+    if PERCENTILE_COMPACTED_HOUR == now_hour:
+        return
+    PERCENTILE_COMPACTED_HOUR = now_hour
+    hour_cutoff = now_hour - PERCENTILE_HOURS * 3600
+    day_cutoff = now_hour - PERCENTILE_DAYS * 86400
+    for key in list(PERCENTILE_SERIES):
+        series = PERCENTILE_SERIES[key]
+        for hour in [hour for hour in series["hours"] if hour < hour_cutoff]:
+            sketch = series["hours"].pop(hour)
+            day = hour // 86400 * 86400
+            target = series["days"].get(day)
+            if target is None:
+                target = series["days"][day] = _new_sketch("I")
+            for slot, count in enumerate(sketch):
+                if count:
+                    target[slot] += count
+        for day in [day for day in series["days"] if day + 86400 <= day_cutoff]:
+            del series["days"][day]
+        if not series["hours"] and not series["days"] and series["last"] < hour_cutoff:
+            del PERCENTILE_SERIES[key]
+
+
+def _series_sketches(series, since):
+    return [
+        sketch[:]
+        for span, sketches in ((3600, series["hours"]), (86400, series["days"]))
+        for start, sketch in sketches.items()
+        if start + span > since
+    ]
+
+
+def _merge_sketches(sketches, total=None):
+    if total is None:
+        total = [0] * (SKETCH_BINS * len(PERCENTILE_METRICS))
+    for sketch in sketches:
+        total = [left + right for left, right in zip(total, sketch)]
+    return total
+
+
+def _sketch_quantiles(counts, quantiles):
+    result = {}
+    for position, metric in enumerate(PERCENTILE_METRICS):
+        bins = counts[position * SKETCH_BINS:(position + 1) * SKETCH_BINS]
+        weight = sum(bins)
+        values = {}
+        for quantile in quantiles:
+            label = f"p{quantile:g}"
+            if not weight:
+                values[label] = None
+                continue
+            rank = max(1, math.ceil(quantile / 100 * weight))
+            seen = 0
+            for value, count in enumerate(bins):
+                seen += count
+                if seen >= rank:
+                    values[label] = value
+                    break
+        result[metric] = {"seconds": round(weight / 10, 1), **values}
+    return result
+
+
+def _parse_quantiles(text):
+    quantiles = []
+    for item in (text or "50,95,99").split(","):
+        try:
+            value = float(item)
+        except ValueError:
+            continue
+        if 0 < value <= 100 and value not in quantiles:
+            quantiles.append(value)
+    return quantiles or [50.0, 95.0, 99.0]
+
+
+def percentiles_report(by="host", seconds=7 * 86400, quantiles=None, hosts=None):
+    # Ranges are resolved to whole buckets: hourly within PERCENTILE_HOURS,
+    # whole days beyond it.
+    quantiles = quantiles or [50.0, 95.0, 99.0]
+    since = time.time() - seconds
+    # Only the copies are taken under the lock; summing a month of fleet
+    # sketches would otherwise stall every status sample meanwhile.
+    grouped = {}
+    with PERCENTILE_LOCK:
+        for (host, index), series in PERCENTILE_SERIES.items():
+            if hosts is not None and host not in hosts:
+                continue
+            key = {"gpu": (host, index), "host": (host,), "fleet": ()}[by]
+            grouped.setdefault(key, []).extend(_series_sketches(series, since))
+    merged = {key: _merge_sketches(sketches) for key, sketches in grouped.items()}
+    rows = []
+    for key, counts in merged.items():
+        row = dict(zip(("host", "gpu"), key))
+        row.update(_sketch_quantiles(counts, quantiles))
+        if row["util"]["seconds"] or row["mem"]["seconds"]:
+            rows.append(row)
+    rows.sort(key=lambda row: (row.get("host") or "", row.get("gpu") or 0))
+    return {
+        "ok": True,
+        "by": by,
+        "range_seconds": int(seconds),
+        "quantiles": quantiles,
+        "rows": rows,
+    }
+
+
+WASTE_TRACKS = {}
+WASTE_LAST_SAMPLE = {}
+WASTE_LOCK = threading.Lock()
+
+
+def record_waste(host, processes, sampled_at):
+    # Every process sample appends one interval to a per-(host, pid, GPU)
+    # sliding window and adds it to running sums; intervals older than
+    # WASTE_WINDOW are subtracted as they fall out, so reports never rescan.
+    # An interval counts as idle when the GPU's utilization from the status
+    # sample taken alongside it is at or below WASTE_IDLE_UTIL.
+    with STATUS_SNAPSHOTS_LOCK:
+        status = STATUS_SNAPSHOTS.get(host)
+    utils = {}
+    if status and status.get("ok") and abs(sampled_at - status["sampled_at"]) <= USAGE_MAX_GAP:
+        utils = {gpu["index"]: gpu["util"] for gpu in status.get("gpus", [])}
+    with WASTE_LOCK:
+        last = WASTE_LAST_SAMPLE.get(host)
+        WASTE_LAST_SAMPLE[host] = sampled_at
+        tracks = WASTE_TRACKS.setdefault(host, {})
+        if last is not None and sampled_at > last:
+            elapsed = min(sampled_at - last, USAGE_MAX_GAP)
+            per_slot = {}
+            for item in processes:
+                per_slot[_gpu_slot(item)] = per_slot.get(_gpu_slot(item), 0) + 1
+            for item in processes:
+                gpu_index = item.get("gpu_index")
+                key = (item.get("pid"), item.get("start_ticks"), _gpu_slot(item))
+                track = tracks.get(key)
+                if track is None:
+                    track = tracks[key] = {
+                        "samples": deque(),
+                        "sums": [0.0, 0.0, 0.0, 0.0, 0.0],
+                        "idle_since": None,
+                    }
+                mem_used = item.get("mem_used") or 0
+                util = utils.get(gpu_index)
+                idle = util is not None and util <= WASTE_IDLE_UTIL and mem_used > 0
+                sample = (
+                    sampled_at,
+                    elapsed,
+                    elapsed if util is not None else 0.0,
+                    elapsed if idle else 0.0,
+                    elapsed / per_slot[_gpu_slot(item)] if idle else 0.0,
+                    elapsed * mem_used / 1024 if idle else 0.0,
+                )
+                track["samples"].append(sample)
+                for position, value in enumerate(sample[1:]):
+                    track["sums"][position] += value
+                if not idle:
+                    track["idle_since"] = None
+                elif track["idle_since"] is None:
+                    track["idle_since"] = sampled_at - elapsed
+                track.update(
+                    host=host,
+                    pid=item.get("pid"),
+                    gpu_index=gpu_index,
+                    mig_device=item.get("mig_device"),
+                    mig_profile=item.get("mig_profile"),
+                    user=item.get("user") or "unknown",
+                    name=item.get("name") or "",
+                    cmdline=item.get("cmdline") or "",
+                    job=item.get("job"),
+                    mem_used=mem_used,
+                    util=util,
+                    orphan=item.get("start_ticks") is None,
+                    last_seen=sampled_at,
+                )
+        _expire_waste(sampled_at - WASTE_WINDOW, [host])
+
+
+def _expire_waste(cutoff, hosts=None):
+    # Called with WASTE_LOCK held. The report expires every host by the
+    # clock, so hosts that stopped being sampled age out as well.
+    for host in list(WASTE_TRACKS) if hosts is None else hosts:
+        tracks = WASTE_TRACKS[host]
+        for key in list(tracks):
+            track = tracks[key]
+            samples = track["samples"]
+            while samples and samples[0][0] < cutoff:
+                for position, value in enumerate(samples.popleft()[1:]):
+                    track["sums"][position] -= value
+            if not samples:
+                del tracks[key]
+        if not tracks and WASTE_LAST_SAMPLE.get(host, 0) < cutoff:
+            del WASTE_TRACKS[host]
+            WASTE_LAST_SAMPLE.pop(host, None)
+
+
+def waste_report(host=None, limit=50):
+    rows = []
+    total = 0.0
+    with WASTE_LOCK:
+        _expire_waste(time.time() - WASTE_WINDOW)
+        for track_host, tracks in WASTE_TRACKS.items():
+            if host and track_host != host:
+                continue
+            latest = WASTE_LAST_SAMPLE.get(track_host)
+            for track in tracks.values():
+                held, observed, idle, idle_gpu, idle_mem = track["sums"]
+                if idle_gpu <= 0:
+                    continue
+                total += idle_gpu
+                rows.append(
+                    {
+                        "host": track["host"],
+                        "pid": track["pid"],
+                        "gpu_index": track["gpu_index"],
+                        "mig_device": track["mig_device"],
+                        "mig_profile": track["mig_profile"],
+                        "user": track["user"],
+                        "name": track["name"],
+                        "cmdline": track["cmdline"],
+                        "job": track["job"],
+                        "mem_used": track["mem_used"],
+                        "util": track["util"],
+                        "orphan": track["orphan"],
+                        "alive": track["last_seen"] == latest,
+                        "idle_since": track["idle_since"],
+                        "held_hours": round(held / 3600, 3),
+                        "idle_pct": round(idle / observed * 100) if observed else None,
+                        "idle_gpu_hours": round(idle_gpu / 3600, 3),
+                        "idle_mem_gib_hours": round(idle_mem / 3600, 3),
+                    }
+                )
+    rows.sort(key=lambda row: (-row["idle_gpu_hours"], row["host"], row["pid"] or 0))
+    return {
+        "ok": True,
+        "window_seconds": WASTE_WINDOW,
+        "idle_util": WASTE_IDLE_UTIL,
+        "total_idle_gpu_hours": round(total / 3600, 3),
+        "count": len(rows),
+        "rows": rows[:limit],
+    }
+
+
+DEFAULT_ALERT_RULES = [
+    {"name": "gpu-hot", "metric": "temp", "op": ">", "threshold": 85, "clear": 80, "for": 120},
+    {"name": "gpu-memory-full", "metric": "mem_pct", "op": ">", "threshold": 95, "clear": 90},
+    {"name": "host-unreachable", "metric": "unreachable", "op": ">=", "threshold": 1, "polls": 3},
+    {
+        "name": "gpu-idle-allocated",
+        "metric": "idle_allocated",
+        "op": ">=",
+        "threshold": 1,
+        "for": 3600,
+        "severity": "info",
+    },
+]
+ALERT_OPS = {
+    ">": lambda value, limit: value > limit,
+    ">=": lambda value, limit: value >= limit,
+    "<": lambda value, limit: value < limit,
+    "<=": lambda value, limit: value <= limit,
+}
+ALERT_GPU_METRICS = ("temp", "util", "mem_used", "mem_pct", "idle_allocated")
+ALERT_HOST_METRICS = ("unreachable",)
+ALERT_STATES = {}
+ALERT_HISTORY = deque(maxlen=max(ALERT_HISTORY_LIMIT, 1))
+ALERT_QUEUE = queue.Queue(maxsize=1000)
+ALERT_LOCK = threading.Lock()
+
+
+def _normalize_alert_rule(raw):
+    if not isinstance(raw, dict) or not isinstance(raw.get("name"), str):
+        raise ValueError("rule needs a name")
+    metric = raw.get("metric")
+    if metric not in ALERT_GPU_METRICS + ALERT_HOST_METRICS:
+        raise ValueError(f"{raw['name']}: unknown metric {metric!r}")
+    op = raw.get("op", ">")
+    if op not in ALERT_OPS:
+        raise ValueError(f"{raw['name']}: unknown op {op!r}")
+    threshold = raw.get("threshold")
+    if not isinstance(threshold, (int, float)):
+        raise ValueError(f"{raw['name']}: threshold must be a number")
+    return {
+        "name": raw["name"],
+        "metric": metric,
+        "op": op,
+        "threshold": threshold,
+        "clear": raw.get("clear", threshold),
+        "for": max(float(raw.get("for", 0)), 0),
+        "polls": max(int(raw.get("polls", 1)), 1),
+        "repeat": max(float(raw.get("repeat", 0)), 0),
+        "severity": str(raw.get("severity", "warning")),
+        "min_mem": int(raw.get("min_mem", 256)),
+    }
+
+
+def load_alert_rules(path=ALERT_RULES_PATH):
+    rules = DEFAULT_ALERT_RULES
+    if path:
+        try:
+            with open(os.path.expanduser(path), "r", encoding="utf-8") as handle:
+                rules = json.load(handle)
+        except (OSError, ValueError) as exc:
+            print(f"alert rules {path}: {exc}; using defaults", file=sys.stderr)
+    try:
+        return [_normalize_alert_rule(rule) for rule in rules]
+    except (TypeError, ValueError) as exc:
+        print(f"alert rules {path}: {exc}; using defaults", file=sys.stderr)
+        return [_normalize_alert_rule(rule) for rule in DEFAULT_ALERT_RULES]
+
+
+ALERT_RULES = load_alert_rules()
+
+
+def _gpu_metric(rule, gpu):
+    metric = rule["metric"]
+    if metric == "mem_pct":
+        return round(gpu["mem_used"] / gpu["mem_total"] * 100, 1) if gpu["mem_total"] else 0
+    if metric == "idle_allocated":
+        return int(gpu["util"] == 0 and gpu["mem_used"] >= rule["min_mem"])
+    return gpu.get(metric)
+
+
+def _alert_event(kind, state, rule, now, reason=""):
+    where = state["host"] if state["gpu"] is None else f"{state['host']} GPU {state['gpu']}"
+    message = (
+        f"{rule['name']} {kind} on {where}: "
+        f"{rule['metric']}={state['value']} ({rule['op']} {rule['threshold']})"
+    )
+    if reason:
+        message = f"{rule['name']} {kind} on {where}: {reason}"
+    return {
+        "event": kind,
+        "rule": rule["name"],
+        "severity": rule["severity"],
+        "host": state["host"],
+        "gpu": state["gpu"],
+        "metric": rule["metric"],
+        "value": state["value"],
+        "threshold": rule["threshold"],
+        "since": state["since"],
+        "at": now,
+        "message": message,
+    }
+
+
+def _step_alert(rule, host, gpu, value, now, events):
+    # Per-(rule, host, GPU) state machine: ok -> pending while the condition
+    # holds but "for"/"polls" are not yet met -> firing; a firing alert only
+    # resolves once the value crosses the "clear" level, so values hovering
+    # at the threshold do not flap. Dashboards and the collector all feed
+    # samples in, so only samples ALERT_POLL_SPACING apart count as polls.
+    if value is None:
+        return
+    key = (rule["name"], host, gpu)
+    test = ALERT_OPS[rule["op"]]
+    state = ALERT_STATES.get(key)
+    if state is None:
+        if not test(value, rule["threshold"]):
+            return
+        state = ALERT_STATES[key] = {
+            "rule": rule["name"],
+            "host": host,
+            "gpu": gpu,
+            "state": "pending",
+            "since": now,
+            "polls": 0,
+            "polled_at": None,
+        }
+    state["value"] = value
+    state["updated_at"] = now
+    if state["state"] == "firing":
+        if not test(value, rule["clear"]):
+            del ALERT_STATES[key]
+            events.append(_alert_event("resolved", state, rule, now))
+        elif rule["repeat"] and now - state["notified_at"] >= rule["repeat"]:
+            state["notified_at"] = now
+            events.append(_alert_event("firing", state, rule, now))
+        return
+    if not test(value, rule["threshold"]):
+        del ALERT_STATES[key]
+        return
+    if state["polled_at"] is None or now - state["polled_at"] >= ALERT_POLL_SPACING:
+        state["polls"] += 1
+        state["polled_at"] = now
+    if state["polls"] >= rule["polls"] and now - state["since"] >= rule["for"]:
+        state["state"] = "firing"
+        state["fired_at"] = state["notified_at"] = now
+        events.append(_alert_event("firing", state, rule, now))
+
+
+def _drop_alerts(keys, now, events, reason):
+    # States whose GPU or host stopped reporting: a firing alert resolves
+    # instead of staying active forever, a pending one just goes away.
+    rules = {rule["name"]: rule for rule in ALERT_RULES}
+    for key in keys:
+        state = ALERT_STATES.pop(key)
+        rule = rules.get(state["rule"])
+        if state["state"] == "firing" and rule is not None:
+            events.append(_alert_event("resolved", state, rule, now, reason))
+
 
+def evaluate_alerts(status):
+    host = status["host"]
+    now = status.get("sampled_at") or time.time()
+    events = []
+    with ALERT_LOCK:
+        for rule in ALERT_RULES:
+            if rule["metric"] == "unreachable":
+                _step_alert(rule, host, None, 0 if status.get("ok") else 1, now, events)
+            elif status.get("ok"):
+                for gpu in status.get("gpus") or []:
+                    _step_alert(rule, host, gpu["index"], _gpu_metric(rule, gpu), now, events)
+        if status.get("ok"):
+            present = {gpu["index"] for gpu in status.get("gpus") or []}
+            missing = [
+                key
+                for key in ALERT_STATES
+                if key[1] == host and key[2] is not None and key[2] not in present
+            ]
+            _drop_alerts(missing, now, events, "GPU no longer reported")
+        stale = [
+            key
+            for key, state in ALERT_STATES.items()
+            if now - state["updated_at"] > ALERT_STALE_SECONDS
+        ]
+        _drop_alerts(stale, now, events, f"no samples for {ALERT_STALE_SECONDS:g}s")
+        ALERT_HISTORY.extend(events)
+    if ALERT_WEBHOOK or ALERT_COMMAND:
+        for event in events:
+            try:
+                ALERT_QUEUE.put_nowait(event)
+            except queue.Full:
+                print(f"alert dropped: {event['message']}", file=sys.stderr)
+    return events
 
-def fetch_statuses(hosts):
-    if not hosts:
+
+def _deliver_alert(event):
+    body = json.dumps(event).encode("utf-8")
+    if ALERT_WEBHOOK:
+        request = urllib.request.Request(
+            ALERT_WEBHOOK,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                response.read()
+        except (OSError, ValueError) as exc:
+            print(f"alert webhook failed: {exc}", file=sys.stderr)
+    if ALERT_COMMAND:
+        env = dict(
+            os.environ,
+            ALERT_EVENT=event["event"],
+            ALERT_RULE=event["rule"],
+            ALERT_HOST=event["host"],
+            ALERT_GPU="" if event["gpu"] is None else str(event["gpu"]),
+            ALERT_MESSAGE=event["message"],
+        )
+        try:
+            subprocess.run(
+                ALERT_COMMAND,
+                shell=True,
+                input=body,
+                env=env,
+                capture_output=True,
+                timeout=30,
+                check=False,
+            )
+        except (OSError, subprocess.TimeoutExpired) as exc:
+            print(f"alert command failed: {exc}", file=sys.stderr)
+
+
+def _alert_delivery_loop():
+    while True:
+        _deliver_alert(ALERT_QUEUE.get())
+
+
+def alerts_report(host=None):
+    with ALERT_LOCK:
+        active = [dict(state) for state in ALERT_STATES.values()]
+        history = list(ALERT_HISTORY)
+    if host:
+        active = [item for item in active if item["host"] == host]
+        history = [item for item in history if item["host"] == host]
+    active.sort(key=lambda item: (item["state"] != "firing", item["host"], item["rule"]))
+    history.reverse()
+    return {"ok": True, "rules": ALERT_RULES, "active": active, "history": history}
+
+
+FLEET_REFRESH_POOL = ThreadPoolExecutor(
+    max_workers=max(1, COLLECT_PARALLEL), thread_name_prefix="fleet-refresh"
+)
+FLEET_REFRESHING = {}
+FLEET_REFRESH_LOCK = threading.Lock()
+
+
+def _refresh_host(host):
+    try:
+        fetch_host_status(host)
+    except Exception as exc:
+        print(f"fleet refresh of {host} failed: {exc}", file=sys.stderr)
+        _store_status(host, {"host": host, "ok": False, "error": f"error: {exc}", "gpus": []})
+    finally:
+        with FLEET_REFRESH_LOCK:
+            FLEET_REFRESHING.pop(host, None)
+
+
+def refresh_stale_statuses(hosts, wait=False):
+    """Re-sample hosts whose snapshot is missing or older than FLEET_MAX_AGE.
+
+    Each host has at most one refresh in flight, and all of them share one
+    pool of COLLECT_PARALLEL workers however many requests ask at once.
+    """
+    cutoff = time.time() - FLEET_MAX_AGE
+    with STATUS_SNAPSHOTS_LOCK:
+        stale = [
+            host
+            for host in hosts
+            if (STATUS_SNAPSHOTS.get(host) or {}).get("sampled_at", 0) < cutoff
+        ]
+    futures = []
+    with FLEET_REFRESH_LOCK:
+        for host in stale:
+            future = FLEET_REFRESHING.get(host)
+            if future is None:
+                future = FLEET_REFRESHING[host] = FLEET_REFRESH_POOL.submit(_refresh_host, host)
+            futures.append(future)
+    if wait and futures:
+        futures_wait(futures)
+
+
+def fleet_statuses(hosts=None, wait=False):
+    hosts = parse_ssh_config(SSH_CONFIG_PATH) if hosts is None else hosts
+    if COLLECT_INTERVAL <= 0:
+        refresh_stale_statuses(hosts, wait=wait)
+    return status_snapshots(hosts)
+
+
+def status_snapshots(hosts):
+    with STATUS_SNAPSHOTS_LOCK:
+        return [
+            STATUS_SNAPSHOTS.get(host) or {"host": host, "ok": None, "gpus": []}
+            for host in hosts
+        ]
+
+
+def fleet_snapshot(statuses):
+    states = []
+    sampled = []
+    indices = []
+    utils = []
+    mems = []
+    free = []
+    stale = []
+    for status in statuses:
+        if status.get("ok") is None:
+            states.append("pending")
+        else:
+            states.append("ok" if status["ok"] else "error")
+        sampled_at = status.get("sampled_at")
+        sampled.append(int(sampled_at) if sampled_at else None)
+        gpus = status.get("gpus") or []
+        free.append((status.get("summary") or {}).get("free", 0))
+        stale.append(bool(status.get("stale")))
+        indices.append([gpu["index"] for gpu in gpus])
+        utils.append([gpu["util"] for gpu in gpus])
+        mems.append(
+            [
+                round(gpu["mem_used"] / gpu["mem_total"] * 100) if gpu["mem_total"] else 0
+                for gpu in gpus
+            ]
+        )
+    return {
+        "ok": True,
+        "hosts": [status["host"] for status in statuses],
+        "state": states,
+        "sampled_at": sampled,
+        "index": indices,
+        "util": utils,
+        "mem": mems,
+        "free": free,
+        "stale": stale,
+    }
+
+
+def free_units(statuses):
+    units = []
+    for status in statuses:
+        if not status.get("ok"):
+            continue
+        for gpu in status.get("gpus") or []:
+            for unit in gpu_units(gpu):
+                if not _is_free(unit):
+                    continue
+                units.append(
+                    {
+                        "host": status["host"],
+                        "gpu_index": gpu["index"],
+                        "name": gpu["name"],
+                        "mig_device": unit.get("device"),
+                        "profile": unit.get("profile"),
+                        "mem_used": unit["mem_used"],
+                        "mem_total": unit["mem_total"],
+                    }
+                )
+    return {"ok": True, "count": len(units), "units": units}
+
+
+GPU_COLUMNS = ("index", "name", "temp", "util", "mem_used", "mem_total")
+
+
+def columnar_statuses(statuses):
+    # One array per field instead of one dict per GPU; host and GPU names
+    # are interned into string tables and referenced by position.
+    hosts = []
+    host_ok = []
+    host_error = []
+    host_sampled = []
+    host_free = []
+    host_stale = []
+    names = []
+    name_ids = {}
+    columns = {"host": []}
+    columns.update((field, []) for field in GPU_COLUMNS)
+    for position, status in enumerate(statuses):
+        hosts.append(status.get("host"))
+        ok = status.get("ok")
+        host_ok.append(None if ok is None else int(bool(ok)))
+        host_error.append(status.get("error", ""))
+        sampled_at = status.get("sampled_at")
+        host_sampled.append(int(sampled_at) if sampled_at else None)
+        host_free.append((status.get("summary") or {}).get("free", 0))
+        host_stale.append(bool(status.get("stale")))
+        for gpu in status.get("gpus") or []:
+            columns["host"].append(position)
+            name_id = name_ids.get(gpu["name"])
+            if name_id is None:
+                name_id = name_ids[gpu["name"]] = len(names)
+                names.append(gpu["name"])
+            for field in GPU_COLUMNS:
+                columns[field].append(name_id if field == "name" else gpu[field])
+    return {
+        "ok": True,
+        "format": "columnar",
+        "hosts": hosts,
+        "host_ok": host_ok,
+        "host_error": host_error,
+        "host_sampled_at": host_sampled,
+        "host_free": host_free,
+        "host_stale": host_stale,
+        "names": names,
+        "gpus": columns,
+    }
+
+
+def save_snapshots(path=SNAPSHOT_PATH):
+    with STATUS_SNAPSHOTS_LOCK:
+        statuses = dict(STATUS_SNAPSHOTS)
+    with PROCESS_STATE_LOCK:
+        processes = dict(PROCESS_SNAPSHOTS)
+    if not statuses and not processes:
+        return False
+    payload = {
+        "version": 1,
+        "saved_at": time.time(),
+        "status": statuses,
+        "processes": processes,
+    }
+    data = gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as handle:
+        handle.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def load_snapshots(path=SNAPSHOT_PATH):
+    # Loaded entries keep their original sampled_at and are marked stale;
+    # anything sampled since startup wins over them.
+    try:
+        with open(path, "rb") as handle:
+            payload = json.loads(gzip.decompress(handle.read()))
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, EOFError) as exc:
+        print(f"snapshot {path}: {exc}", file=sys.stderr)
         return []
+    if not isinstance(payload, dict) or payload.get("version") != 1:
+        return []
+    statuses = payload.get("status") or {}
+    processes = payload.get("processes") or {}
+    with STATUS_SNAPSHOTS_LOCK:
+        for host, result in statuses.items():
+            STATUS_SNAPSHOTS.setdefault(host, dict(result, stale=True))
+    with PROCESS_STATE_LOCK:
+        for host, result in processes.items():
+            PROCESS_SNAPSHOTS.setdefault(host, dict(result, stale=True))
+    return list(statuses)
 
-    max_workers = min(8, len(hosts))
-    results = {}
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_map = {executor.submit(_run_ssh, host): host for host in hosts}
-        for future in as_completed(future_map):
-            host = future_map[future]
+
+def cached_status(host):
+    with STATUS_SNAPSHOTS_LOCK:
+        snapshot = STATUS_SNAPSHOTS.get(host)
+    if snapshot is None:
+        return {"host": host, "ok": None, "gpus": []}
+    return dict(snapshot, age=round(time.time() - snapshot["sampled_at"]))
+
+
+def _warm_start():
+    hosts = load_snapshots()
+    if hosts:
+        print(f"Loaded snapshot for {len(hosts)} hosts from {SNAPSHOT_PATH}")
+        if COLLECT_INTERVAL <= 0:
+            collect_fleet_once(hosts)
+
+
+def _snapshot_loop():
+    while True:
+        time.sleep(SNAPSHOT_INTERVAL)
+        try:
+            save_snapshots()
+        except (OSError, TypeError, ValueError) as exc:
+            print(f"snapshot save failed: {exc}", file=sys.stderr)
+
+
+def _collect_host(host, max_age):
+    fetch_host_status(host)
+    fetch_host_processes(host, max_age)
+
+
+def collect_fleet_once(hosts=None):
+    hosts = parse_ssh_config(SSH_CONFIG_PATH) if hosts is None else hosts
+    if not hosts:
+        return
+    max_age = max(COLLECT_INTERVAL // 2, 1)
+    with ThreadPoolExecutor(max_workers=max(1, min(COLLECT_PARALLEL, len(hosts)))) as executor:
+        futures = [executor.submit(_collect_host, host, max_age) for host in hosts]
+        for future in as_completed(futures):
             try:
-                results[host] = future.result()
-            except Exception as exc:
-                results[host] = {
-                    "host": host,
-                    "ok": False,
-                    "error": f"error: {exc}",
-                    "gpus": [],
-                }
+                future.result()
+            except Exception:
+                pass
+
+
+def _collector_loop():
+    while True:
+        started = time.monotonic()
+        try:
+            collect_fleet_once()
+        except Exception as exc:
+            print(f"collector error: {exc}", file=sys.stderr)
+        time.sleep(max(COLLECT_INTERVAL - (time.monotonic() - started), 1))
+
+
+STATIC_CACHE = {}
+STATIC_CACHE_LOCK = threading.Lock()
+
+
+def _load_static_asset(path, stat):
+    data = path.read_bytes()
+    mime_type, _ = mimetypes.guess_type(str(path))
+    if not mime_type:
+        mime_type = "application/octet-stream"
+    compressed = None
+    compressible = mime_type.startswith("text/") or mime_type in (
+        "application/javascript",
+        "application/json",
+        "image/svg+xml",
+    )
+    if compressible and len(data) >= STATIC_GZIP_MIN_SIZE:
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) >= len(data):
+            compressed = None
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return {
+        "data": data,
+        "gzip": compressed,
+        "etag": f'"{digest}"',
+        "gzip_etag": f'"{digest}-gz"',
+        "mime": mime_type,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "checked": time.monotonic(),
+    }
+
+
+def static_asset(rel_path):
+    # Assets live in memory; the file is only re-stat'ed once per
+    # STATIC_CHECK_INTERVAL and re-read when its mtime or size changes.
+    # Cache keys are normalized so "/a/../app.js" and friends share one
+    # entry; only paths naming real files under WEB_DIR are ever stored.
+    rel_path = posixpath.normpath("/" + rel_path.replace("\\", "/").lstrip("/"))
+    if rel_path == "/":
+        rel_path = "/index.html"
+    now = time.monotonic()
+    with STATIC_CACHE_LOCK:
+        entry = STATIC_CACHE.get(rel_path)
+    if entry and now - entry["checked"] < STATIC_CHECK_INTERVAL:
+        return entry, ""
+    candidate = (WEB_DIR / rel_path.lstrip("/")).resolve()
+    try:
+        candidate.relative_to(WEB_DIR)
+    except ValueError:
+        return None, "invalid path"
+    try:
+        stat = candidate.stat()
+    except OSError:
+        stat = None
+    if stat is None or not candidate.is_file():
+        with STATIC_CACHE_LOCK:
+            STATIC_CACHE.pop(rel_path, None)
+        return None, "not found"
+    if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        entry["checked"] = now
+        return entry, ""
+    try:
+        entry = _load_static_asset(candidate, stat)
+    except OSError:
+        return None, "not found"
+    with STATIC_CACHE_LOCK:
+        STATIC_CACHE[rel_path] = entry
+    return entry, ""
+
+
+def preload_static_assets():
+    for path in sorted(WEB_DIR.rglob("*")):
+        if path.is_file():
+            static_asset("/" + path.relative_to(WEB_DIR).as_posix())
+
+
+def _parse_route_limits(text):
+    limits = {
+        "/api/status": 16,
+        "/api/gpu-processes": 16,
+        "/api/command": 16,
+        "/api/command-complete": 16,
+        "/api/broadcast": 2,
+        "/api/upload": 4,
+        "/api/upload-many": 2,
+        "/api/download": 4,
+        "/api/ls": 8,
+        "/api/tail": 8,
+        "/api/fleet": 8,
+        "/api/free": 4,
+    }
+    for item in (text or "").split(","):
+        route, _, value = item.partition("=")
+        if route.strip() and value.strip().isdigit():
+            limits[route.strip()] = int(value)
+    return limits
+
+
+ROUTE_LIMITS = _parse_route_limits(os.environ.get("HTTP_ROUTE_LIMITS"))
+ROUTE_SEMAPHORES = {
+    route: threading.BoundedSemaphore(limit)
+    for route, limit in ROUTE_LIMITS.items()
+    if limit > 0
+}
+SHED_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain; charset=utf-8\r\n"
+    b"Content-Length: 11\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n\r\n"
+    b"server busy"
+)
+
+
+class _PooledConnection:
+    __slots__ = ("request", "client_address", "handler", "parked_at")
+
+    def __init__(self, request, client_address):
+        self.request = request
+        self.client_address = client_address
+        self.handler = None
+        self.parked_at = 0.0
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTP server with a fixed worker pool and a bounded ready queue.
+
+    Connections wait in a selector until a request actually arrives, so
+    idle keep-alive sockets hold no worker. A worker serves whatever is
+    ready and parks the connection again; once HTTP_QUEUE ready
+    connections are waiting for a worker, new arrivals get 503.
+    """
+
+    def __init__(self, address, handler, workers=HTTP_WORKERS, queue_limit=HTTP_QUEUE):
+        super().__init__(address, handler)
+        self._pending = queue.Queue(maxsize=max(queue_limit, 1))
+        self._to_park = queue.SimpleQueue()
+        self._parked = selectors.DefaultSelector()
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self._wake_send.setblocking(False)
+        self._parked.register(self._wake_recv, selectors.EVENT_READ)
+        threading.Thread(target=self._park_loop, name="http-park", daemon=True).start()
+        for number in range(max(workers, 1)):
+            thread = threading.Thread(
+                target=self._worker, name=f"http-worker-{number}", daemon=True
+            )
+            thread.start()
+
+    def process_request(self, request, client_address):
+        self._park(_PooledConnection(request, client_address))
+
+    def _park(self, conn):
+        conn.parked_at = time.monotonic()
+        self._to_park.put(conn)
+        try:
+            self._wake_send.send(b"\0")
+        except OSError:
+            pass
+
+    def _close(self, conn):
+        if conn.handler is not None:
+            try:
+                conn.handler.finish()
+            except OSError:
+                pass
+        self.shutdown_request(conn.request)
+
+    def _park_loop(self):
+        idle = {}
+        while True:
+            for key, _ in self._parked.select(timeout=1):
+                if key.fileobj is self._wake_recv:
+                    try:
+                        while self._wake_recv.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                conn = key.data
+                self._parked.unregister(conn.request)
+                del idle[conn.request]
+                try:
+                    self._pending.put_nowait(conn)
+                except queue.Full:
+                    try:
+                        conn.request.sendall(SHED_RESPONSE)
+                    except OSError:
+                        pass
+                    self._close(conn)
+            while True:
+                try:
+                    conn = self._to_park.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    self._parked.register(conn.request, selectors.EVENT_READ, conn)
+                except (OSError, ValueError):
+                    self._close(conn)
+                    continue
+                idle[conn.request] = conn
+            expired = time.monotonic() - HTTP_KEEPALIVE_TIMEOUT
+            for conn in [conn for conn in idle.values() if conn.parked_at < expired]:
+                self._parked.unregister(conn.request)
+                del idle[conn.request]
+                self._close(conn)
+
+    def _worker(self):
+        while True:
+            conn = self._pending.get()
+            keep = False
+            try:
+                if conn.handler is None:
+                    conn.handler = self.RequestHandlerClass.__new__(self.RequestHandlerClass)
+                    conn.handler.request = conn.request
+                    conn.handler.client_address = conn.client_address
+                    conn.handler.server = self
+                    conn.handler.setup()
+                keep = conn.handler.serve_ready()
+            except (ConnectionError, TimeoutError):
+                pass
+            except Exception:
+                self.handle_error(conn.request, conn.client_address)
+            if keep:
+                self._park(conn)
+            else:
+                self._close(conn)
+
+
+# Response building and request parsing shared by GPURequestHandler and the
+# native routes of AsyncHTTPServer.
+
+
+def _etag_matches(header, tag):
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in (tag, "*"):
+            return True
+    return False
+
+
+def _json_response(
+    payload,
+    status=HTTPStatus.OK,
+    etag=False,
+    compact=False,
+    content_type=None,
+    if_none_match=None,
+):
+    """(status, headers, body) for a JSON reply, answering 304 when If-None-Match hits."""
+    data = json.dumps(payload, separators=(",", ":") if compact else None).encode("utf-8")
+    validators = []
+    if etag and status == HTTPStatus.OK:
+        tag = '"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+        validators = [("ETag", tag), ("Cache-Control", "no-cache"), ("Vary", "Accept")]
+        if _etag_matches(if_none_match, tag):
+            return HTTPStatus.NOT_MODIFIED, validators, b""
+    headers = [
+        ("Content-Type", content_type or "application/json; charset=utf-8"),
+        ("Content-Length", str(len(data))),
+    ]
+    return status, headers + validators, data
+
+
+def _statuses_response(statuses, query, accept, builder, etag=True, if_none_match=None):
+    # Multi-host payloads are the big ones, so they also get compact
+    # separators.
+    fmt = (query.get("format") or [""])[0]
+    if fmt == "columnar" or (not fmt and COLUMNAR_MIME in (accept or "")):
+        return _json_response(
+            columnar_statuses(statuses),
+            etag=etag,
+            compact=True,
+            content_type=f"{COLUMNAR_MIME}; charset=utf-8",
+            if_none_match=if_none_match,
+        )
+    return _json_response(
+        builder(statuses), etag=etag, compact=True, if_none_match=if_none_match
+    )
+
+
+def _status_hosts(query):
+    """Hosts named by hosts=/group= on GET /api/status, or None for the host= form."""
+    if not (query.get("hosts") or query.get("group")):
+        return None
+    hosts = [host.strip() for item in query.get("hosts") or [] for host in item.split(",")]
+    hosts = [host for host in hosts if host]
+    return list(dict.fromkeys(hosts + resolve_hosts(group=(query.get("group") or [""])[0])))
 
-    ordered = []
-    for host in hosts:
-        ordered.append(results.get(host, {"host": host, "ok": False, "error": "missing"}))
-    return ordered
+
+def _gpu_processes_target(query):
+    """(host, index, max age, error) for an /api/gpu-processes request."""
+    host = (query.get("host") or [None])[0]
+    index_raw = (query.get("index") or [None])[0]
+    if not host or index_raw is None:
+        return host, None, 0, "missing host or index"
+    try:
+        index = int(index_raw)
+    except ValueError:
+        return host, None, 0, "invalid index"
+    fresh = (query.get("fresh") or ["0"])[0] not in ("", "0")
+    return host, index, 0 if fresh else SSH_PROCESS_CACHE_TTL, ""
+
+
+def _command_target(payload):
+    """(host, command, cwd, session id or None, error) for an /api/command body."""
+    host = payload.get("host")
+    command = payload.get("command")
+    if not host or not isinstance(host, str):
+        return host, command, "", None, "missing host"
+    if not command or not isinstance(command, str):
+        return host, command, "", None, "missing command"
+    cwd = payload.get("cwd")
+    if not isinstance(cwd, str):
+        cwd = ""
+    session_id = payload.get("session")
+    if not isinstance(session_id, str) or not 0 < len(session_id) <= 128:
+        session_id = None
+    return host, command, cwd, session_id, ""
+
+
+def _broadcast_target(payload):
+    """(hosts, command, cwd, parallel, error) for an /api/broadcast body."""
+    command = payload.get("command")
+    if not command or not isinstance(command, str):
+        return [], command, "", 0, "missing command"
+    hosts = resolve_hosts(payload.get("hosts"), payload.get("group"))
+    if not hosts:
+        return hosts, command, "", 0, "no matching hosts"
+    cwd = payload.get("cwd")
+    if not isinstance(cwd, str):
+        cwd = ""
+    parallel = payload.get("parallel")
+    if not isinstance(parallel, int) or parallel <= 0:
+        parallel = SSH_BROADCAST_PARALLEL
+    return hosts, command, cwd, parallel, ""
 
 
 class GPURequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, every
+    # keep-alive response waits for the client's delayed ACK.
+    disable_nagle_algorithm = True
+
+    def serve_ready(self):
+        """Serve the requests already readable on this connection.
+
+        Returns True when the connection should be parked for the next
+        keep-alive request instead of closed.
+        """
+        while True:
+            self.connection.settimeout(HTTP_READ_TIMEOUT)
+            self.handle_one_request()
+            if self.close_connection:
+                return False
+            # A pipelined request may already sit in rfile's buffer, where
+            # the park selector would never see it.
+            self.connection.settimeout(0)
+            try:
+                if not self.rfile.peek(1):
+                    return True
+            except (OSError, ValueError):
+                return False
+
+    def log_error(self, format, *args):
+        if format.startswith("Request timed out"):
+            return
+        super().log_error(format, *args)
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        if code >= 400 and self.command == "POST":
+            # The request body may be partly unread; don't reuse the socket.
+            self.send_header("Connection", "close")
+
+    def _acquire_route(self, path):
+        semaphore = ROUTE_SEMAPHORES.get(path)
+        if semaphore is None:
+            return True
+        if semaphore.acquire(timeout=HTTP_ROUTE_WAIT):
+            return True
+        self.send_response(HTTPStatus.SERVICE_UNAVAILABLE)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        data = json.dumps({"ok": False, "error": "server busy"}).encode("utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Retry-After", "1")
+        self.end_headers()
+        self._safe_write(data)
+        return False
+
+    def _release_route(self, path):
+        semaphore = ROUTE_SEMAPHORES.get(path)
+        if semaphore is not None:
+            semaphore.release()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if not self._acquire_route(parsed.path):
+            return
+        try:
+            self._handle_get(parsed)
+        finally:
+            self._release_route(parsed.path)
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        if not self._acquire_route(parsed.path):
+            return
+        try:
+            self._handle_post(parsed)
+        finally:
+            self._release_route(parsed.path)
+
+    def _stream_tail(self, host, remote_path, offset, resume_file):
+        # Server-sent events for as long as the client stays connected, up
+        # to SSH_TAIL_MAX_SECONDS; after that EventSource reconnects and
+        # resumes from its last event id.
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("X-Accel-Buffering", "no")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        if not self._safe_write(b"retry: 3000\n\n"):
+            return
+        proc = _open_tail(host, remote_path, offset, resume_file)
+        deadline = time.monotonic() + SSH_TAIL_MAX_SECONDS
+        try:
+            for line in iter(proc.stdout.readline, b""):
+                payload = _tail_frame(line)
+                if payload is None:
+                    continue
+                if not self._safe_write(payload):
+                    return
+                if time.monotonic() > deadline:
+                    return
+            stderr = proc.stderr.read()
+            self._safe_write(_tail_failed_frame(stderr, proc.wait()))
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.wait()
+
     def _safe_write(self, data):
         try:
             self.wfile.write(data)
-        except (BrokenPipeError, ConnectionResetError, ConnectionAbortedError):
+        except (ConnectionError, TimeoutError):
             return False
         return True
 
-    def _send_json(self, payload, status=HTTPStatus.OK):
-        data = json.dumps(payload).encode("utf-8")
+    def _send_json(
+        self, payload, status=HTTPStatus.OK, etag=False, compact=False, content_type=None
+    ):
+        # Validators only make sense on GET: a conditional POST would have to
+        # answer 412, never 304.
+        self._send_response(
+            _json_response(
+                payload,
+                status,
+                etag=etag and self.command == "GET",
+                compact=compact,
+                content_type=content_type,
+                if_none_match=self.headers.get("If-None-Match"),
+            )
+        )
+
+    def _send_response(self, response):
+        status, headers, data = response
         self.send_response(status)
-        self.send_header("Content-Type", "application/json; charset=utf-8")
-        self.send_header("Content-Length", str(len(data)))
+        for name, value in headers:
+            self.send_header(name, value)
         self.end_headers()
-        self._safe_write(data)
+        if data:
+            self._safe_write(data)
+
+    def _send_statuses(self, statuses, query, builder):
+        self._send_response(
+            _statuses_response(
+                statuses,
+                query,
+                self.headers.get("Accept"),
+                builder,
+                etag=self.command == "GET",
+                if_none_match=self.headers.get("If-None-Match"),
+            )
+        )
 
     def _send_text(self, message, status=HTTPStatus.BAD_REQUEST):
         data = message.encode("utf-8")
@@ -897,32 +4440,56 @@ class GPURequestHandler(BaseHTTPRequestHandler):
         self.end_headers()
         self._safe_write(data)
 
-    def _serve_static(self, rel_path):
-        if rel_path == "/":
-            rel_path = "/index.html"
-        candidate = (WEB_DIR / rel_path.lstrip("/")).resolve()
-        try:
-            candidate.relative_to(WEB_DIR)
-        except ValueError:
-            self._send_text("invalid path", status=HTTPStatus.NOT_FOUND)
-            return
+    def _accepts_gzip(self):
+        for part in (self.headers.get("Accept-Encoding") or "").split(","):
+            name, _, params = part.strip().partition(";")
+            if name.strip().lower() in ("gzip", "*"):
+                return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00")
+        return False
 
-        if not candidate.is_file():
-            self._send_text("not found", status=HTTPStatus.NOT_FOUND)
+    def _serve_static(self, rel_path, head_only=False):
+        entry, error_text = static_asset(rel_path)
+        if entry is None:
+            if head_only:
+                self.send_response(HTTPStatus.NOT_FOUND)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send_text(error_text, status=HTTPStatus.NOT_FOUND)
             return
 
-        mime_type, _ = mimetypes.guess_type(str(candidate))
-        if not mime_type:
-            mime_type = "application/octet-stream"
-        data = candidate.read_bytes()
+        use_gzip = entry["gzip"] is not None and self._accepts_gzip()
+        tag = entry["gzip_etag"] if use_gzip else entry["etag"]
+        if _etag_matches(self.headers.get("If-None-Match"), tag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", tag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+        data = entry["gzip"] if use_gzip else entry["data"]
         self.send_response(HTTPStatus.OK)
-        self.send_header("Content-Type", mime_type)
+        self.send_header("Content-Type", entry["mime"])
         self.send_header("Content-Length", str(len(data)))
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("ETag", tag)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept-Encoding")
         self.end_headers()
-        self._safe_write(data)
+        if not head_only:
+            self._safe_write(data)
 
-    def do_GET(self):
+    def do_HEAD(self):
         parsed = urlparse(self.path)
+        if parsed.path.startswith("/api/"):
+            self.send_response(HTTPStatus.METHOD_NOT_ALLOWED)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._serve_static(parsed.path, head_only=True)
+
+    def _handle_get(self, parsed):
         if parsed.path == "/api/servers":
             hosts = parse_ssh_config(SSH_CONFIG_PATH)
             self._send_json({"hosts": hosts, "config": SSH_CONFIG_PATH})
@@ -930,35 +4497,129 @@ class GPURequestHandler(BaseHTTPRequestHandler):
         if parsed.path == "/api/startup":
             self._send_json(_startup_status())
             return
-        if parsed.path == "/api/status":
+        if parsed.path == "/api/status":
+            query = parse_qs(parsed.query)
+            cached = (query.get("cached") or ["0"])[0] not in ("", "0")
+            hosts = _status_hosts(query)
+            if hosts is not None:
+                results = status_snapshots(hosts) if cached else fetch_statuses(hosts)
+                self._send_statuses(results, query, lambda statuses: {"results": statuses})
+                return
+            host = (query.get("host") or [None])[0]
+            if not host:
+                self._send_text("missing host", status=HTTPStatus.BAD_REQUEST)
+                return
+            if cached:
+                self._send_json(cached_status(host))
+                return
+            status = fetch_statuses([host])[0]
+            self._send_json(status)
+            return
+        if parsed.path == "/api/fleet":
+            query = parse_qs(parsed.query)
+            self._send_statuses(fleet_statuses(), query, fleet_snapshot)
+            return
+        if parsed.path == "/api/free":
+            self._send_json(free_units(fleet_statuses(wait=True)))
+            return
+        if parsed.path == "/api/usage":
+            query = parse_qs(parsed.query)
+            by = (query.get("by") or ["user"])[0]
+            if by not in USAGE_DIMENSIONS:
+                self._send_json(
+                    {"ok": False, "error": "invalid grouping"},
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+                return
+            seconds = _parse_range(
+                (query.get("range") or [None])[0], 7 * 86400, USAGE_RETENTION_DAYS * 86400
+            )
+            series = (query.get("series") or ["0"])[0] not in ("", "0")
+            self._send_json(usage_report(by, seconds, series=series))
+            return
+        if parsed.path == "/api/percentiles":
+            query = parse_qs(parsed.query)
+            by = (query.get("by") or ["host"])[0]
+            if by not in ("gpu", "host", "fleet"):
+                self._send_json(
+                    {"ok": False, "error": "invalid grouping"},
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+                return
+            seconds = _parse_range(
+                (query.get("range") or [None])[0], 7 * 86400, PERCENTILE_DAYS * 86400
+            )
+            quantiles = _parse_quantiles((query.get("q") or [None])[0])
+            hosts = None
+            if query.get("host"):
+                hosts = set(query["host"])
+            elif query.get("group"):
+                hosts = set(resolve_hosts(group=query["group"][0]))
+            self._send_json(percentiles_report(by, seconds, quantiles, hosts))
+            return
+        if parsed.path == "/api/waste":
+            query = parse_qs(parsed.query)
+            try:
+                limit = int((query.get("limit") or ["50"])[0])
+            except ValueError:
+                limit = 50
+            host = (query.get("host") or [None])[0]
+            self._send_json(waste_report(host, max(limit, 1)))
+            return
+        if parsed.path == "/api/alerts":
+            query = parse_qs(parsed.query)
+            self._send_json(alerts_report((query.get("host") or [None])[0]))
+            return
+        if parsed.path == "/api/gpu-processes":
+            host, index, max_age, error_text = _gpu_processes_target(parse_qs(parsed.query))
+            if error_text:
+                self._send_json(
+                    {"ok": False, "error": error_text},
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+                return
+            result = fetch_gpu_processes(host, index, max_age=max_age)
+            self._send_json(result)
+            return
+        if parsed.path == "/api/upload-progress":
             query = parse_qs(parsed.query)
-            host = (query.get("host") or [None])[0]
-            if not host:
-                self._send_text("missing host", status=HTTPStatus.BAD_REQUEST)
+            progress = fanout_progress((query.get("id") or [""])[0])
+            if progress is None:
+                self._send_json(
+                    {"ok": False, "error": "unknown upload"},
+                    status=HTTPStatus.NOT_FOUND,
+                )
                 return
-            status = fetch_statuses([host])[0]
-            self._send_json(status)
+            self._send_json(progress)
             return
-        if parsed.path == "/api/gpu-processes":
+        if parsed.path == "/api/ls":
             query = parse_qs(parsed.query)
             host = (query.get("host") or [None])[0]
-            index_raw = (query.get("index") or [None])[0]
-            if not host or index_raw is None:
+            if not host:
                 self._send_json(
-                    {"ok": False, "error": "missing host or index"},
+                    {"ok": False, "error": "missing host"},
                     status=HTTPStatus.BAD_REQUEST,
                 )
                 return
-            try:
-                index = int(index_raw)
-            except ValueError:
+            path = (query.get("path") or ["~"])[0]
+            cursor = (query.get("cursor") or [""])[0]
+            refresh = (query.get("refresh") or ["0"])[0] not in ("", "0")
+            result = list_remote_dir(host, path, cursor, refresh=refresh)
+            status = HTTPStatus.OK if result.get("ok") else HTTPStatus.BAD_REQUEST
+            self._send_json(result, status=status)
+            return
+        if parsed.path == "/api/tail":
+            query = parse_qs(parsed.query)
+            host = (query.get("host") or [None])[0]
+            remote_path = (query.get("path") or [None])[0]
+            if not host or not remote_path:
                 self._send_json(
-                    {"ok": False, "error": "invalid index"},
+                    {"ok": False, "error": "missing host or path"},
                     status=HTTPStatus.BAD_REQUEST,
                 )
                 return
-            result = fetch_gpu_processes(host, index)
-            self._send_json(result)
+            offset, resume_file = _parse_tail_resume(query, self.headers.get("Last-Event-ID"))
+            self._stream_tail(host, remote_path, offset, resume_file)
             return
         if parsed.path == "/api/download":
             query = parse_qs(parsed.query)
@@ -1004,6 +4665,8 @@ class GPURequestHandler(BaseHTTPRequestHandler):
             self.send_header("Content-Type", "application/octet-stream")
             if file_size is not None:
                 self.send_header("Content-Length", str(file_size))
+            else:
+                self.send_header("Connection", "close")
             self.send_header("Content-Disposition", f'attachment; filename="{safe_name}"')
             self.end_headers()
             try:
@@ -1030,8 +4693,7 @@ class GPURequestHandler(BaseHTTPRequestHandler):
             return
         self._serve_static(parsed.path)
 
-    def do_POST(self):
-        parsed = urlparse(self.path)
+    def _handle_post(self, parsed):
         if parsed.path == "/api/startup":
             length = int(self.headers.get("Content-Length", "0") or 0)
             raw = self.rfile.read(length).decode("utf-8") if length else ""
@@ -1065,7 +4727,8 @@ class GPURequestHandler(BaseHTTPRequestHandler):
                 hosts = parse_ssh_config(SSH_CONFIG_PATH)
 
             results = fetch_statuses(hosts)
-            self._send_json({"results": results})
+            query = parse_qs(parsed.query)
+            self._send_statuses(results, query, lambda statuses: {"results": statuses})
             return
 
         if parsed.path == "/api/command":
@@ -1076,25 +4739,80 @@ class GPURequestHandler(BaseHTTPRequestHandler):
             except json.JSONDecodeError:
                 self._send_text("invalid json", status=HTTPStatus.BAD_REQUEST)
                 return
-            host = payload.get("host")
-            command = payload.get("command")
-            if not host or not isinstance(host, str):
+            host, command, cwd, session_id, error_text = _command_target(payload)
+            if error_text:
                 self._send_json(
-                    {"ok": False, "error": "missing host"},
+                    {"ok": False, "error": error_text},
                     status=HTTPStatus.BAD_REQUEST,
                 )
                 return
-            if not command or not isinstance(command, str):
+            if session_id:
+                result = _run_shell_command(session_id, host, command, cwd=cwd)
+            else:
+                result = _run_ssh_command(host, command, cwd=cwd)
+            _invalidate_completion_files(host)
+            _invalidate_listings(host)
+            self._send_json(result)
+            return
+
+        if parsed.path == "/api/broadcast":
+            length = int(self.headers.get("Content-Length", "0") or 0)
+            raw = self.rfile.read(length).decode("utf-8") if length else ""
+            try:
+                payload = json.loads(raw) if raw else {}
+            except json.JSONDecodeError:
+                self._send_text("invalid json", status=HTTPStatus.BAD_REQUEST)
+                return
+            hosts, command, cwd, parallel, error_text = _broadcast_target(payload)
+            if error_text:
                 self._send_json(
-                    {"ok": False, "error": "missing command"},
+                    {"ok": False, "error": error_text},
                     status=HTTPStatus.BAD_REQUEST,
                 )
                 return
-            cwd = payload.get("cwd")
-            if cwd is not None and not isinstance(cwd, str):
-                cwd = ""
-            result = _run_ssh_command(host, command, cwd=cwd or "")
-            self._send_json(result)
+            results_iter = broadcast_command(hosts, command, cwd=cwd, parallel=parallel)
+            if payload.get("stream") is False:
+                results = list(results_iter)
+                self._send_json(
+                    {"ok": True, "results": results, "summary": summarize_broadcast(results)}
+                )
+                return
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            results = []
+            try:
+                for result in results_iter:
+                    results.append(result)
+                    line = json.dumps({"type": "result", **result}) + "\n"
+                    if not self._safe_write(line.encode("utf-8")):
+                        return
+                summary = {"type": "summary", **summarize_broadcast(results)}
+                self._safe_write((json.dumps(summary) + "\n").encode("utf-8"))
+            finally:
+                results_iter.close()
+            return
+
+        if parsed.path == "/api/command-close":
+            length = int(self.headers.get("Content-Length", "0") or 0)
+            raw = self.rfile.read(length).decode("utf-8") if length else ""
+            try:
+                payload = json.loads(raw) if raw else {}
+            except json.JSONDecodeError:
+                self._send_text("invalid json", status=HTTPStatus.BAD_REQUEST)
+                return
+            session_id = payload.get("session")
+            if not session_id or not isinstance(session_id, str):
+                self._send_json(
+                    {"ok": False, "error": "missing session"},
+                    status=HTTPStatus.BAD_REQUEST,
+                )
+                return
+            closed = _reap_shell_sessions(force_session_id=session_id)
+            self._send_json({"ok": True, "closed": closed})
             return
 
         if parsed.path == "/api/command-complete":
@@ -1138,54 +4856,789 @@ class GPURequestHandler(BaseHTTPRequestHandler):
             return
 
         if parsed.path == "/api/upload":
-            query = parse_qs(parsed.query)
-            host = (query.get("host") or [None])[0]
-            remote_path = (query.get("path") or [None])[0]
-            filename = (query.get("name") or [None])[0]
-            if not host or not remote_path:
+            host, remote_path, length, error_text = _upload_target(
+                parse_qs(parsed.query), self.headers
+            )
+            if error_text:
                 self._send_json(
-                    {"ok": False, "error": "missing host or path"},
+                    {"ok": False, "error": error_text},
                     status=HTTPStatus.BAD_REQUEST,
                 )
                 return
-            if remote_path.endswith("/"):
-                if not filename:
-                    self._send_json(
-                        {"ok": False, "error": "missing filename"},
-                        status=HTTPStatus.BAD_REQUEST,
-                    )
-                    return
-                remote_path = remote_path + filename
+            result = _upload_via_ssh(host, remote_path, self.rfile, length)
+            _invalidate_listings(host, remote_path)
+            status = HTTPStatus.OK if result.get("ok") else HTTPStatus.BAD_REQUEST
+            self._send_json(result, status=status)
+            return
 
-            length_header = self.headers.get("Content-Length")
-            if length_header is None:
+        if parsed.path == "/api/upload-many":
+            query = parse_qs(parsed.query)
+            hosts, remote_path, length, error_text = _fanout_target(query, self.headers)
+            if error_text:
                 self._send_json(
-                    {"ok": False, "error": "missing content length"},
+                    {"ok": False, "error": error_text},
                     status=HTTPStatus.BAD_REQUEST,
                 )
                 return
-            try:
-                length = int(length_header or 0)
-            except ValueError:
+            upload_id, upload = _start_fanout(query, hosts, remote_path, length)
+            if upload is None:
                 self._send_json(
-                    {"ok": False, "error": "invalid content length"},
-                    status=HTTPStatus.BAD_REQUEST,
+                    {"ok": False, "error": "upload id already in use"},
+                    status=HTTPStatus.CONFLICT,
                 )
                 return
-            result = _upload_via_ssh(host, remote_path, self.rfile, length)
-            status = HTTPStatus.OK if result.get("ok") else HTTPStatus.BAD_REQUEST
-            self._send_json(result, status=status)
+            try:
+                result = upload.run(self.rfile, _fanout_parallel(query))
+            finally:
+                with FANOUT_UPLOADS_LOCK:
+                    FANOUT_UPLOADS.pop(upload_id, None)
+            for host in hosts:
+                _invalidate_listings(host, remote_path)
+            result["id"] = upload_id
+            self._send_json(result)
             return
 
         self._send_text("not found", status=HTTPStatus.NOT_FOUND)
 
 
+class _LoopStream:
+    """File-like view of an asyncio connection for the blocking handler.
+
+    The request head arrives already buffered; body reads and response
+    writes are handed back to the event loop and awaited from the worker.
+    """
+
+    def __init__(self, loop, head, reader, writer):
+        self._loop = loop
+        self._head = head
+        self._reader = reader
+        self._writer = writer
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def _take_head(self, size):
+        data, self._head = self._head[:size], self._head[size:]
+        return data
+
+    def readline(self, limit=-1):
+        if not self._head:
+            return self._call(self._reader.readline())
+        end = self._head.find(b"\n") + 1 or len(self._head)
+        if limit >= 0:
+            end = min(end, limit)
+        return self._take_head(end)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._take_head(len(self._head)) + self._call(self._reader.read())
+        data = self._take_head(size)
+        if len(data) < size:
+            data += self._call(self._read_exactly(size - len(data)))
+        return data
+
+    async def _read_exactly(self, size):
+        try:
+            return await self._reader.readexactly(size)
+        except asyncio.IncompleteReadError as exc:
+            return exc.partial
+
+    def write(self, data):
+        self._call(self._write(bytes(data)))
+        return len(data)
+
+    async def _write(self, data):
+        self._writer.write(data)
+        await self._writer.drain()
+
+    def flush(self):
+        pass
+
+
+class AsyncHTTPServer:
+    """Serves GPURequestHandler from a single asyncio event loop.
+
+    Accepting, keep-alive waits and request-head parsing happen on the loop,
+    so idle dashboards and slow clients cost no threads. The ssh-backed
+    routes (status, GPU processes, commands, broadcasts, log tails and
+    uploads) run natively on the loop with their ssh children as asyncio
+    subprocesses, sharing the request parsing, ssh steps and response
+    building of the threaded handler (see native_routes). Everything else
+    goes through GPURequestHandler itself on a bounded executor.
+    """
+
+    def __init__(self, address, workers=HTTP_WORKERS, queue_limit=HTTP_QUEUE):
+        self.server_address = address
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(workers, 1), thread_name_prefix="http-async"
+        )
+        self.limit = max(workers, 1) + max(queue_limit, 0)
+        self.active = 0
+        # HTTP_ROUTE_LIMITS for the native routes; executor requests take
+        # ROUTE_SEMAPHORES in GPURequestHandler as usual.
+        self.route_semaphores = {
+            route: asyncio.Semaphore(limit) for route, limit in ROUTE_LIMITS.items() if limit > 0
+        }
+
+    def _dispatch(self, stream, client_address):
+        handler = GPURequestHandler.__new__(GPURequestHandler)
+        handler.server = self
+        handler.client_address = client_address
+        handler.request = handler.connection = None
+        handler.rfile = handler.wfile = stream
+        handler.close_connection = True
+        handler.handle_one_request()
+        return handler.close_connection
+
+    def _response_head(self, status, headers):
+        status = HTTPStatus(status)
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Server: {GPURequestHandler.server_version} {GPURequestHandler.sys_version}",
+            f"Date: {email.utils.formatdate(usegmt=True)}",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    async def _send_response(self, writer, response, headers=()):
+        status, base_headers, data = response
+        writer.write(self._response_head(status, [*base_headers, *headers]) + data)
+        await writer.drain()
+
+    async def _send_json(self, writer, payload, status=HTTPStatus.OK, headers=(), **options):
+        await self._send_response(writer, _json_response(payload, status, **options), headers)
+
+    async def _send_text(self, writer, message, status=HTTPStatus.BAD_REQUEST, headers=()):
+        data = message.encode("utf-8")
+        await self._send_response(
+            writer,
+            (
+                status,
+                [("Content-Type", "text/plain; charset=utf-8"), ("Content-Length", len(data))],
+                data,
+            ),
+            headers,
+        )
+
+    async def _reject(self, writer, error_text, status=HTTPStatus.BAD_REQUEST):
+        # The request body may be partly unread; don't reuse the socket.
+        await self._send_json(
+            writer, {"ok": False, "error": error_text}, status, [("Connection", "close")]
+        )
+        return True
+
+    async def _read_json(self, reader, writer, headers):
+        """The request's JSON object, or None once a 400 has been sent."""
+        if headers.get("Expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        try:
+            length = int(headers.get("Content-Length", "0") or 0)
+            raw = b""
+            if length > 0:
+                raw = await asyncio.wait_for(reader.readexactly(length), HTTP_READ_TIMEOUT)
+            payload = json.loads(raw) if raw else {}
+        except (ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            payload = None
+        if not isinstance(payload, dict):
+            await self._send_text(writer, "invalid json", headers=[("Connection", "close")])
+            return None
+        return payload
+
+    async def _acquire_route(self, path):
+        semaphore = self.route_semaphores.get(path)
+        if semaphore is None:
+            return True
+        try:
+            await asyncio.wait_for(semaphore.acquire(), HTTP_ROUTE_WAIT)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _serve_native(self, route, reader, writer, request, headers):
+        method, parsed = request
+        if not await self._acquire_route(parsed.path):
+            close = method == "POST"
+            busy = [("Retry-After", "1")] + ([("Connection", "close")] if close else [])
+            await self._send_json(
+                writer,
+                {"ok": False, "error": "server busy"},
+                HTTPStatus.SERVICE_UNAVAILABLE,
+                busy,
+            )
+            return close
+        try:
+            return await route(self, reader, writer, parsed, headers)
+        finally:
+            semaphore = self.route_semaphores.get(parsed.path)
+            if semaphore is not None:
+                semaphore.release()
+
+    async def _serve_status(self, reader, writer, parsed, headers):
+        query = parse_qs(parsed.query)
+        cached = (query.get("cached") or ["0"])[0] not in ("", "0")
+        hosts = _status_hosts(query)
+        if hosts is not None:
+            results = status_snapshots(hosts) if cached else await fetch_statuses_async(hosts)
+            await self._send_response(
+                writer,
+                _statuses_response(
+                    results,
+                    query,
+                    headers.get("Accept"),
+                    lambda statuses: {"results": statuses},
+                    if_none_match=headers.get("If-None-Match"),
+                ),
+            )
+            return False
+        host = (query.get("host") or [None])[0]
+        if not host:
+            await self._send_text(writer, "missing host")
+        elif cached:
+            await self._send_json(writer, cached_status(host))
+        else:
+            await self._send_json(writer, (await fetch_statuses_async([host]))[0])
+        return False
+
+    async def _serve_status_post(self, reader, writer, parsed, headers):
+        payload = await self._read_json(reader, writer, headers)
+        if payload is None:
+            return True
+        hosts = payload.get("hosts")
+        if not isinstance(hosts, list) or not all(isinstance(h, str) for h in hosts):
+            hosts = parse_ssh_config(SSH_CONFIG_PATH)
+        results = await fetch_statuses_async(hosts)
+        await self._send_response(
+            writer,
+            _statuses_response(
+                results,
+                parse_qs(parsed.query),
+                headers.get("Accept"),
+                lambda statuses: {"results": statuses},
+                etag=False,
+            ),
+        )
+        return False
+
+    async def _serve_gpu_processes(self, reader, writer, parsed, headers):
+        host, index, max_age, error_text = _gpu_processes_target(parse_qs(parsed.query))
+        if error_text:
+            await self._send_json(
+                writer, {"ok": False, "error": error_text}, HTTPStatus.BAD_REQUEST
+            )
+            return False
+        await self._send_json(writer, await fetch_gpu_processes_async(host, index, max_age))
+        return False
+
+    async def _serve_command(self, reader, writer, parsed, headers):
+        payload = await self._read_json(reader, writer, headers)
+        if payload is None:
+            return True
+        host, command, cwd, session_id, error_text = _command_target(payload)
+        if error_text:
+            return await self._reject(writer, error_text)
+        if session_id:
+            # Shell sessions are driven by their own reader threads; a command
+            # in one waits on them from the executor.
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _run_shell_command, session_id, host, command, cwd
+            )
+        else:
+            result = await run_ssh_steps_async(_command_steps(host, command, cwd))
+        _invalidate_completion_files(host)
+        _invalidate_listings(host)
+        await self._send_json(writer, result)
+        return False
+
+    async def _serve_broadcast(self, reader, writer, parsed, headers):
+        payload = await self._read_json(reader, writer, headers)
+        if payload is None:
+            return True
+        hosts, command, cwd, parallel, error_text = _broadcast_target(payload)
+        if error_text:
+            return await self._reject(writer, error_text)
+        results_iter = broadcast_command_async(hosts, command, cwd=cwd, parallel=parallel)
+        results = []
+        try:
+            if payload.get("stream") is False:
+                async for result in results_iter:
+                    results.append(result)
+                await self._send_json(
+                    writer,
+                    {"ok": True, "results": results, "summary": summarize_broadcast(results)},
+                )
+                return False
+            writer.write(
+                self._response_head(
+                    HTTPStatus.OK,
+                    [
+                        ("Content-Type", "application/x-ndjson; charset=utf-8"),
+                        ("Cache-Control", "no-cache"),
+                        ("Connection", "close"),
+                    ],
+                )
+            )
+            async for result in results_iter:
+                results.append(result)
+                writer.write((json.dumps({"type": "result", **result}) + "\n").encode("utf-8"))
+                await writer.drain()
+            summary = {"type": "summary", **summarize_broadcast(results)}
+            writer.write((json.dumps(summary) + "\n").encode("utf-8"))
+            await writer.drain()
+        finally:
+            await results_iter.aclose()
+        return True
+
+    async def _serve_tail(self, reader, writer, parsed, headers):
+        query = parse_qs(parsed.query)
+        host = (query.get("host") or [None])[0]
+        remote_path = (query.get("path") or [None])[0]
+        if not host or not remote_path:
+            await self._send_json(
+                writer, {"ok": False, "error": "missing host or path"}, HTTPStatus.BAD_REQUEST
+            )
+            return False
+        offset, resume_file = _parse_tail_resume(query, headers.get("Last-Event-ID"))
+        writer.write(
+            self._response_head(
+                HTTPStatus.OK,
+                [
+                    ("Content-Type", "text/event-stream; charset=utf-8"),
+                    ("Cache-Control", "no-cache"),
+                    ("X-Accel-Buffering", "no"),
+                    ("Connection", "close"),
+                ],
+            )
+            + b"retry: 3000\n\n"
+        )
+        await writer.drain()
+        proc = await asyncio.create_subprocess_exec(
+            *_tail_command(host, remote_path, offset, resume_file),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            limit=TAIL_FRAME_LIMIT,
+        )
+        deadline = time.monotonic() + SSH_TAIL_MAX_SECONDS
+        try:
+            proc.stdin.write(TAIL_SCRIPT.encode("utf-8"))
+            proc.stdin.close()
+            while True:
+                line = await proc.stdout.readline()
+                if not line:
+                    break
+                payload = _tail_frame(line)
+                if payload is None:
+                    continue
+                writer.write(payload)
+                await writer.drain()
+                if time.monotonic() > deadline:
+                    return True
+            stderr = await proc.stderr.read()
+            writer.write(_tail_failed_frame(stderr, await proc.wait()))
+            await writer.drain()
+        finally:
+            if proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:
+                    pass
+            await proc.wait()
+        return True
+
+    async def _serve_upload(self, reader, writer, parsed, headers):
+        host, remote_path, length, error_text = _upload_target(parse_qs(parsed.query), headers)
+        if error_text:
+            return await self._reject(writer, error_text)
+        if headers.get("Expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        proc = await asyncio.create_subprocess_exec(
+            *_upload_command(host, remote_path),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        remaining = length
+        error_text = ""
+        while remaining > 0:
+            try:
+                chunk = await asyncio.wait_for(
+                    reader.read(min(65536, remaining)), HTTP_READ_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                error_text = "client timed out"
+                break
+            except ConnectionError:
+                error_text = "client disconnected"
+                break
+            if not chunk:
+                break
+            try:
+                proc.stdin.write(chunk)
+                await proc.stdin.drain()
+            except ConnectionError:
+                error_text = "ssh failed during upload"
+                break
+            remaining -= len(chunk)
+        proc.stdin.close()
+        try:
+            stdout, stderr, _ = await asyncio.wait_for(
+                asyncio.gather(proc.stdout.read(), proc.stderr.read(), proc.wait()), 300
+            )
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            result = {"ok": False, "error": "upload timed out"}
+        else:
+            result = _upload_result(proc.returncode, stdout, stderr, remaining, error_text)
+        _invalidate_listings(host, remote_path)
+        if result.get("ok"):
+            await self._send_json(writer, result)
+            return False
+        await self._send_json(
+            writer, result, HTTPStatus.BAD_REQUEST, [("Connection", "close")]
+        )
+        return True
+
+    async def _serve_upload_many(self, reader, writer, parsed, headers):
+        query = parse_qs(parsed.query)
+        hosts, remote_path, length, error_text = _fanout_target(query, headers)
+        if error_text:
+            return await self._reject(writer, error_text)
+        upload_id, upload = _start_fanout(query, hosts, remote_path, length)
+        if upload is None:
+            return await self._reject(writer, "upload id already in use", HTTPStatus.CONFLICT)
+        if headers.get("Expect", "").lower() == "100-continue":
+            writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        try:
+            result = await upload.run_async(reader, _fanout_parallel(query))
+        finally:
+            with FANOUT_UPLOADS_LOCK:
+                FANOUT_UPLOADS.pop(upload_id, None)
+        for host in hosts:
+            _invalidate_listings(host, remote_path)
+        result["id"] = upload_id
+        interrupted = result["size"] < length
+        await self._send_json(
+            writer, result, headers=[("Connection", "close")] if interrupted else ()
+        )
+        return interrupted
+
+    # Routes served on the loop itself: the ssh children and the client
+    # socket are all asyncio streams, so a probe, command or transfer in
+    # flight holds no executor thread.
+    native_routes = {
+        ("GET", "/api/status"): _serve_status,
+        ("POST", "/api/status"): _serve_status_post,
+        ("GET", "/api/gpu-processes"): _serve_gpu_processes,
+        ("POST", "/api/command"): _serve_command,
+        ("POST", "/api/broadcast"): _serve_broadcast,
+        ("GET", "/api/tail"): _serve_tail,
+        ("POST", "/api/upload"): _serve_upload,
+        ("POST", "/api/upload-many"): _serve_upload_many,
+    }
+
+    async def _serve_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        peer = writer.get_extra_info("peername") or ("", 0)
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), HTTP_KEEPALIVE_TIMEOUT
+                    )
+                except (
+                    asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError,
+                    asyncio.TimeoutError,
+                ):
+                    break
+                request_line, _, header_block = head.partition(b"\r\n")
+                words = request_line.decode("latin-1").split()
+                route = None
+                if len(words) == 3:
+                    parsed = urlparse(words[1])
+                    route = self.native_routes.get((words[0], parsed.path))
+                if route is not None:
+                    headers = http.client.parse_headers(io.BytesIO(header_block))
+                    close = await self._serve_native(
+                        route, reader, writer, (words[0], parsed), headers
+                    )
+                    if close or words[2] != "HTTP/1.1":
+                        break
+                    if headers.get("Connection", "").lower() == "close":
+                        break
+                    continue
+                if self.active >= self.limit:
+                    writer.write(SHED_RESPONSE)
+                    await writer.drain()
+                    break
+                self.active += 1
+                try:
+                    stream = _LoopStream(loop, head, reader, writer)
+                    close = await loop.run_in_executor(
+                        self.executor, self._dispatch, stream, peer[:2]
+                    )
+                finally:
+                    self.active -= 1
+                if close:
+                    break
+        except ConnectionError:
+            pass
+        except Exception as exc:
+            print(f"Error serving {peer[0]}: {exc}", file=sys.stderr)
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        if sys.version_info < (3, 12) and hasattr(os, "pidfd_open"):
+            # The default watcher before 3.12 parks a thread in waitpid()
+            # for every ssh child; pidfds are watched by the loop itself.
+            watcher = asyncio.PidfdChildWatcher()
+            watcher.attach_loop(asyncio.get_running_loop())
+            asyncio.set_child_watcher(watcher)
+        host, port = self.server_address
+        server = await asyncio.start_server(
+            self._serve_connection, host, port, backlog=max(self.limit, 128)
+        )
+        async with server:
+            await server.serve_forever()
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+
+TOP_SORTS = {
+    "util": lambda row: (-(row["util"] if row["util"] is not None else -1), row["host"]),
+    "mem": lambda row: (-row["mem"], row["host"]),
+    "free": lambda row: (-row["free"], row["host"]),
+    "host": lambda row: (row["host"],),
+}
+TOP_KEYS = {"u": "util", "m": "mem", "f": "free", "h": "host"}
+TOP_BLOCKS = " \u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+
+
+def _cli_hosts(args):
+    if args.hosts or args.group:
+        hosts = [host for host in (args.hosts or "").split(",") if host.strip()]
+        return list(dict.fromkeys(hosts + resolve_hosts(group=args.group or "")))
+    return parse_ssh_config(SSH_CONFIG_PATH)
+
+
+def _spark(values):
+    return "".join(
+        "?" if value is None else TOP_BLOCKS[min(8, max(0, round(value / 12.5)))]
+        for value in values
+    )
+
+
+def _top_error(text):
+    # ssh errors are often several stderr lines (banners, warnings first);
+    # the last one says what failed, and a row must stay on one line.
+    lines = [line for line in (text or "").splitlines() if line.strip()]
+    if not lines:
+        return ""
+    return "".join(ch for ch in " ".join(lines[-1].split()) if ch.isprintable())
+
+
+def _top_rows(statuses):
+    rows = []
+    for status in statuses:
+        summary = status.get("summary") or {}
+        gpus = status.get("gpus") or []
+        if status.get("ok") is None:
+            state = "wait"
+        elif not status["ok"]:
+            state = "down"
+        else:
+            state = "stale" if status.get("stale") else "ok"
+        rows.append(
+            {
+                "host": status["host"],
+                "state": state,
+                "error": _top_error(status.get("error")),
+                "gpus": len(gpus),
+                "free": summary.get("free", 0),
+                "util": summary.get("util_avg"),
+                "mem": summary.get("mem_pct", 0),
+                "util_cells": _spark(gpu["util"] for gpu in gpus),
+                "mem_cells": _spark(
+                    gpu["mem_used"] / gpu["mem_total"] * 100 if gpu["mem_total"] else 0
+                    for gpu in gpus
+                ),
+            }
+        )
+    return rows
+
+
+def _top_lines(statuses, sort, width, height):
+    rows = sorted(_top_rows(statuses), key=TOP_SORTS[sort])
+    total_gpus = sum(row["gpus"] for row in rows)
+    total_free = sum(row["free"] for row in rows)
+    down = sum(1 for row in rows if row["state"] == "down")
+    utils = [row["util"] for row in rows if row["util"] is not None]
+    util_text = f"{round(sum(utils) / len(utils))}%" if utils else "--"
+    lines = [
+        f"GPU Monitor  {time.strftime('%H:%M:%S')}  {len(rows)} hosts ({down} down)  "
+        f"{total_gpus} GPUs  {total_free} free  avg util {util_text}",
+        f"sort: {sort}   keys: u util  m mem  f free  h host  q quit",
+        f"{'HOST':<24} {'STATE':<5} {'GPUS':>4} {'FREE':>4} {'UTIL':>5} {'MEM':>5}  "
+        f"{'UTIL/GPU':<10} MEM/GPU",
+    ]
+    for row in rows[: max(height - len(lines), 0)]:
+        util = f"{row['util']}%" if row["util"] is not None else "--"
+        if row["state"] == "down":
+            detail = row["error"]
+        else:
+            detail = f"{row['util_cells']:<10} {row['mem_cells']}"
+        lines.append(
+            f"{row['host'][:24]:<24} {row['state']:<5} {row['gpus']:>4} {row['free']:>4} "
+            f"{util:>5} {row['mem']:>4}%  {detail}"
+        )
+    return [line[:width] for line in lines]
+
+
+def _top_key_reader(keys, stop):
+    if os.name == "nt":
+        import msvcrt
+
+        while not stop.is_set():
+            if msvcrt.kbhit():
+                keys.put(msvcrt.getwch())
+            time.sleep(0.1)
+        return
+    import select
+
+    while not stop.is_set():
+        ready, _, _ = select.select([sys.stdin], [], [], 0.2)
+        if ready:
+            keys.put(sys.stdin.read(1))
+
+
+def run_top(hosts, sort="util", interval=10):
+    # Hosts are re-sampled in the background with fetch_statuses, which
+    # stores each host as it answers; the screen is redrawn once a second,
+    # rewriting only the lines that changed since the previous frame.
+    if SNAPSHOT_PATH and SNAPSHOT_INTERVAL > 0:
+        load_snapshots()
+    stop = threading.Event()
+
+    def collect():
+        while not stop.is_set():
+            fetch_statuses(hosts)
+            stop.wait(interval)
+
+    threading.Thread(target=collect, daemon=True).start()
+    keys = queue.Queue()
+    restore = None
+    if sys.stdin.isatty():
+        if os.name == "nt":
+            os.system("")
+        else:
+            import termios
+            import tty
+
+            saved = termios.tcgetattr(sys.stdin)
+            tty.setcbreak(sys.stdin.fileno())
+
+            def restore():
+                termios.tcsetattr(sys.stdin, termios.TCSADRAIN, saved)
+
+        threading.Thread(target=_top_key_reader, args=(keys, stop), daemon=True).start()
+    out = sys.stdout
+    out.write("\x1b[?1049h\x1b[?25l\x1b[2J")
+    previous = []
+    size = None
+    try:
+        while True:
+            try:
+                key = keys.get(timeout=1)
+            except queue.Empty:
+                key = None
+            if key in ("q", "Q", "\x03"):
+                break
+            if key in TOP_KEYS:
+                sort = TOP_KEYS[key]
+            current_size = shutil.get_terminal_size()
+            if current_size != size:
+                size = current_size
+                previous = []
+                out.write("\x1b[2J")
+            with STATUS_SNAPSHOTS_LOCK:
+                statuses = [
+                    STATUS_SNAPSHOTS.get(host) or {"host": host, "ok": None, "gpus": []}
+                    for host in hosts
+                ]
+            lines = _top_lines(statuses, sort, size.columns, size.lines)
+            for number in range(max(len(lines), len(previous))):
+                line = lines[number] if number < len(lines) else ""
+                if number < len(previous) and previous[number] == line:
+                    continue
+                out.write(f"\x1b[{number + 1};1H{line}\x1b[K")
+            previous = lines
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        close_probe_streams()
+        out.write("\x1b[?25h\x1b[?1049l")
+        out.flush()
+        if restore:
+            restore()
+
+
 def main():
+    parser = argparse.ArgumentParser(
+        description="GPU Monitor: web dashboard, terminal top view, or JSON snapshot."
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--top", action="store_true", help="live fleet table in the terminal")
+    mode.add_argument("--json", action="store_true", help="print one fleet snapshot as JSON")
+    parser.add_argument("--hosts", help="comma-separated hosts (default: all SSH config hosts)")
+    parser.add_argument("--group", help="host patterns, e.g. 'node* gpu-[ab]'")
+    parser.add_argument("--sort", choices=sorted(TOP_SORTS), default="util")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between samples")
+    args = parser.parse_args()
+    if args.json or args.top:
+        global RECORD_HISTORY
+        RECORD_HISTORY = False
+        hosts = _cli_hosts(args)
+        if args.json:
+            try:
+                statuses = fetch_statuses(hosts)
+            finally:
+                close_probe_streams()
+            json.dump(
+                {"ok": True, "generated_at": int(time.time()), "hosts": statuses},
+                sys.stdout,
+                indent=2,
+            )
+            sys.stdout.write("\n")
+            return
+        run_top(hosts, sort=args.sort, interval=max(args.interval, 1))
+        return
+
     port = int(os.environ.get("PORT", "8000"))
-    server = ThreadingHTTPServer(("0.0.0.0", port), GPURequestHandler)
+    preload_static_assets()
+    if HTTP_SERVER_MODE == "asyncio":
+        server = AsyncHTTPServer(("0.0.0.0", port))
+    else:
+        server = PooledHTTPServer(("0.0.0.0", port), GPURequestHandler)
+    threading.Thread(target=_shell_reaper_loop, daemon=True).start()
+    if COLLECT_INTERVAL > 0:
+        threading.Thread(target=_collector_loop, daemon=True).start()
+    if ALERT_WEBHOOK or ALERT_COMMAND:
+        threading.Thread(target=_alert_delivery_loop, daemon=True).start()
+    if SNAPSHOT_PATH and SNAPSHOT_INTERVAL > 0:
+        threading.Thread(target=_warm_start, daemon=True).start()
+        threading.Thread(target=_snapshot_loop, daemon=True).start()
     print(f"GPU Monitor running on http://localhost:{port}")
     print(f"Using SSH config: {SSH_CONFIG_PATH}")
-    server.serve_forever()
+    try:
+        server.serve_forever()
+    finally:
+        if SNAPSHOT_PATH and SNAPSHOT_INTERVAL > 0:
+            save_snapshots()
 
 
 if __name__ == "__main__":
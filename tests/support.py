@@ -0,0 +1,73 @@
+"""Fixtures shared by the test modules.
+
+Importing this puts the repository root on sys.path, so ``import server``
+works under both unittest and pytest. It also provides fake fleet samples
+a stand-in for ssh that runs the remote command on this machine, and a
+test case base that serves the real handler on an ephemeral port.
+"""
+
+import http.client
+import pathlib
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import server  # noqa: E402
+
+# Drops the host argument and, like sshd, hands the rest joined with spaces
+# to a local shell.
+LOCAL_SSH = [
+    sys.executable,
+    "-c",
+    "import subprocess, sys; sys.exit(subprocess.call(' '.join(sys.argv[2:]), shell=True))",
+]
+
+
+def local_ssh():
+    return mock.patch.object(server, "_ssh_base_cmd", lambda host=None: list(LOCAL_SSH))
+
+
+def gpu(index, util=50, mem_used=1000, mem_total=80000, temp=50, name="NVIDIA A100", **extra):
+    return dict(
+        index=index,
+        name=name,
+        temp=temp,
+        util=util,
+        mem_used=mem_used,
+        mem_total=mem_total,
+        **extra,
+    )
+
+
+def status(host, gpus, ok=True, at=0, error=""):
+    result = {"host": host, "ok": ok, "gpus": gpus if ok else [], "sampled_at": at}
+    if not ok:
+        result["error"] = error or "ssh: connect to host port 22: Connection refused"
+    return result
+
+
+class ServerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.httpd = server.PooledHTTPServer(("127.0.0.1", 0), server.GPURequestHandler, workers=2)
+        cls.quiet = mock.patch.object(server.GPURequestHandler, "log_message", lambda *args: None)
+        cls.quiet.start()
+        threading.Thread(target=cls.httpd.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.httpd.shutdown()
+        cls.httpd.server_close()
+        cls.quiet.stop()
+
+    def get(self, path, headers=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.httpd.server_address[1], timeout=5)
+        try:
+            conn.request("GET", path, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            conn.close()
@@ -0,0 +1,95 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from support import gpu, server, status
+
+
+class _Sink(BaseHTTPRequestHandler):
+    events = []
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.events.append(json.loads(self.rfile.read(length)))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _status(host, temps, ok=True, at=0):
+    return status(host, [gpu(index, temp=temp) for index, temp in enumerate(temps)], ok, at)
+
+
+class AlertWebhookTest(unittest.TestCase):
+    def setUp(self):
+        self.sink = HTTPServer(("127.0.0.1", 0), _Sink)
+        threading.Thread(target=self.sink.serve_forever, daemon=True).start()
+        _Sink.events = []
+        self.saved = (server.ALERT_RULES, server.ALERT_WEBHOOK)
+        server.ALERT_RULES = [
+            server._normalize_alert_rule(
+                {"name": "hot", "metric": "temp", "threshold": 85, "clear": 80, "for": 60}
+            ),
+            server._normalize_alert_rule(
+                {"name": "down", "metric": "unreachable", "op": ">=", "threshold": 1, "polls": 3}
+            ),
+        ]
+        server.ALERT_WEBHOOK = f"http://127.0.0.1:{self.sink.server_address[1]}/hook"
+        server.ALERT_STATES.clear()
+        server.ALERT_HISTORY.clear()
+
+    def tearDown(self):
+        server.ALERT_RULES, server.ALERT_WEBHOOK = self.saved
+        server.ALERT_STATES.clear()
+        self.sink.shutdown()
+        self.sink.server_close()
+
+    def _deliver(self):
+        while not server.ALERT_QUEUE.empty():
+            server._deliver_alert(server.ALERT_QUEUE.get_nowait())
+        return [(event["event"], event["rule"], event["gpu"]) for event in _Sink.events]
+
+    def test_fires_after_for_and_resolves_below_clear(self):
+        server.evaluate_alerts(_status("node1", [90, 40], at=1000))
+        server.evaluate_alerts(_status("node1", [91, 40], at=1030))
+        self.assertEqual(self._deliver(), [])
+        server.evaluate_alerts(_status("node1", [92, 40], at=1061))
+        self.assertEqual(self._deliver(), [("firing", "hot", 0)])
+        # Between threshold and clear level: still firing, no new event.
+        server.evaluate_alerts(_status("node1", [83, 40], at=1090))
+        self.assertEqual(len(self._deliver()), 1)
+        server.evaluate_alerts(_status("node1", [70, 40], at=1120))
+        self.assertEqual(self._deliver(), [("firing", "hot", 0), ("resolved", "hot", 0)])
+        self.assertEqual(server.alerts_report()["active"], [])
+
+    def test_missing_gpu_resolves(self):
+        server.evaluate_alerts(_status("node1", [40, 95], at=1000))
+        server.evaluate_alerts(_status("node1", [40, 95], at=1100))
+        server.evaluate_alerts(_status("node1", [40], at=1130))
+        events = self._deliver()
+        self.assertEqual(events, [("firing", "hot", 1), ("resolved", "hot", 1)])
+        self.assertIn("no longer reported", _Sink.events[-1]["message"])
+
+    def test_host_no_longer_sampled_expires(self):
+        server.evaluate_alerts(_status("node1", [95], at=1000))
+        server.evaluate_alerts(_status("node1", [95], at=1100))
+        later = 1100 + server.ALERT_STALE_SECONDS + 1
+        server.evaluate_alerts(_status("node2", [40], at=later))
+        self.assertEqual(self._deliver(), [("firing", "hot", 0), ("resolved", "hot", 0)])
+        self.assertEqual(server.alerts_report("node1")["active"], [])
+
+    def test_polls_count_spaced_samples_only(self):
+        # Three dashboards polling a dead host at once are one poll, not three.
+        for at in (1000, 1001, 1002):
+            server.evaluate_alerts(_status("node2", [], ok=False, at=at))
+        self.assertEqual(self._deliver(), [])
+        for at in (1000 + server.ALERT_POLL_SPACING, 1000 + 2 * server.ALERT_POLL_SPACING):
+            server.evaluate_alerts(_status("node2", [], ok=False, at=at))
+        self.assertEqual(self._deliver(), [("firing", "down", None)])
+
+
+if __name__ == "__main__":
+    unittest.main()
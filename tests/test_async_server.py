@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import http.client
+import json
+import pathlib
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from support import local_ssh, server
+
+
+class AsyncServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        threading.Thread(target=cls.loop.run_forever, daemon=True).start()
+        cls.httpd = server.AsyncHTTPServer(("127.0.0.1", 0), workers=2)
+        cls.listener = cls._on_loop(
+            asyncio.start_server(cls.httpd._serve_connection, "127.0.0.1", 0)
+        )
+        cls.port = cls.listener.sockets[0].getsockname()[1]
+        cls.ssh = local_ssh()
+        cls.ssh.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ssh.stop()
+        cls.listener.close()
+        cls._on_loop(cls.listener.wait_closed())
+        cls.loop.call_soon_threadsafe(cls.loop.stop)
+
+    @classmethod
+    def _on_loop(cls, coro):
+        return asyncio.run_coroutine_threadsafe(coro, cls.loop).result(10)
+
+    def setUp(self):
+        # The ssh-backed routes must not fall back to a blocking subprocess.
+        blocking = mock.patch.object(server, "run_ssh_steps", side_effect=AssertionError)
+        blocking.start()
+        self.addCleanup(blocking.stop)
+
+    def post(self, path, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            conn.request("POST", path, body=body)
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            conn.close()
+
+    def test_command_runs_on_the_loop(self):
+        with tempfile.TemporaryDirectory() as root:
+            code, _, body = self.post(
+                "/api/command",
+                {"host": "node1", "command": "echo hi; cd /", "cwd": root},
+            )
+        result = json.loads(body)
+        self.assertEqual(code, 200)
+        self.assertEqual((result["stdout"], result["cwd"], result["exit_code"]), ("hi", "/", 0))
+
+    def test_timeout_kills_the_ssh_child(self):
+        # An "ssh" that hangs itself, rather than a shell with a hanging child.
+        hang = ["sh", "-c", "exec sleep 30"]
+        started = time.monotonic()
+        with mock.patch.object(server, "SSH_COMMAND_TIMEOUT", 0.5), mock.patch.object(
+            server, "_ssh_base_cmd", lambda host=None: list(hang)
+        ):
+            _, _, body = self.post("/api/command", {"host": "node1", "command": "true"})
+        self.assertEqual(json.loads(body)["error"], "ssh timed out")
+        self.assertLess(time.monotonic() - started, 5)
+
+    def test_invalid_body_closes_the_connection(self):
+        code, headers, body = self.post("/api/command", b"nope")
+        self.assertEqual((code, headers.get("Connection"), body), (400, "close", b"invalid json"))
+        code, headers, _ = self.post("/api/command", {"host": "node1"})
+        self.assertEqual((code, headers.get("Connection")), (400, "close"))
+
+    def test_broadcast_streams_results_and_summary(self):
+        _, headers, body = self.post(
+            "/api/broadcast", {"hosts": ["node1", "node2", "node3"], "command": "echo same"}
+        )
+        self.assertEqual(headers["Content-Type"], "application/x-ndjson; charset=utf-8")
+        lines = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+        results = [line for line in lines if line["type"] == "result"]
+        self.assertEqual(sorted(line["host"] for line in results), ["node1", "node2", "node3"])
+        summary = lines[-1]
+        self.assertEqual((summary["type"], summary["ok"]), ("summary", 3))
+        self.assertEqual(len(summary["groups"]), 1)
+
+    def test_route_limit_is_waited_for_on_the_loop(self):
+        with mock.patch.dict(
+            self.httpd.route_semaphores, {"/api/command": asyncio.Semaphore(0)}
+        ), mock.patch.object(server, "HTTP_ROUTE_WAIT", 0.2):
+            code, headers, _ = self.post("/api/command", {"host": "node1", "command": "true"})
+        self.assertEqual((code, headers["Retry-After"]), (503, "1"))
+
+    def test_upload_many_follows_the_spool(self):
+        # Both "hosts" are this machine, so they write the same file and only
+        # one of them can verify it without racing the other.
+        payload = b"weights" * 50000
+        with tempfile.TemporaryDirectory() as root:
+            target = pathlib.Path(root) / "model.bin"
+            code, _, body = self.post(
+                f"/api/upload-many?hosts=node1,node2&path={target}", payload
+            )
+            result = json.loads(body)
+            self.assertEqual(code, 200)
+            self.assertTrue(result["ok"], result)
+            self.assertEqual(result["sha256"], hashlib.sha256(payload).hexdigest())
+            self.assertEqual([item["bytes"] for item in result["results"]], [len(payload)] * 2)
+            self.assertEqual(target.read_bytes(), payload)
+            _, _, body = self.post(f"/api/upload-many?hosts=node1&path={target}&verify=1", b"v2")
+            self.assertEqual(json.loads(body)["results"][0]["verified"], True)
+        self.assertEqual(server.FANOUT_UPLOADS, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
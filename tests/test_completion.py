@@ -0,0 +1,107 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from support import server
+
+
+class PrefixMatchesTest(unittest.TestCase):
+    def test_sorted_prefix_slice(self):
+        items = sorted(["data", "data2", "dataset/", "docs", "train.py"])
+        self.assertEqual(server._prefix_matches(items, "dat", 10), ["data", "data2", "dataset/"])
+        self.assertEqual(server._prefix_matches(items, "dat", 2), ["data", "data2"])
+        self.assertEqual(server._prefix_matches(items, "x", 10), [])
+        self.assertEqual(server._prefix_matches(items, "", 10), items)
+
+
+class CompletionCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.listings = {
+            "compgen -f -- ''": ["data", "data2", "train.py"],
+            "compgen -f -- '.'": [".bashrc", ".cache"],
+            "compgen -f -- '/tmp/'": ["/tmp/a", "/tmp/b"],
+            "compgen -c": ["nvidia-smi", "nvtop", "python"],
+        }
+        server.COMPLETION_CACHE.clear()
+        server.COMPLETION_REFRESHING.clear()
+        self.fetch = mock.patch.object(server, "_fetch_ssh_completion", self._fetch)
+        self.fetch.start()
+
+    def tearDown(self):
+        self.fetch.stop()
+        server.COMPLETION_CACHE.clear()
+
+    def _fetch(self, host, complete_cmd, limit):
+        self.calls.append(complete_cmd)
+        items = self.listings.get(complete_cmd.split(" && ")[-1], [])
+        return items[:limit], "", len(items) > limit
+
+    def test_longer_prefixes_reuse_the_directory_index(self):
+        self.assertEqual(server._run_ssh_completion("node1", "d"), (["data", "data2"], ""))
+        self.assertEqual(server._run_ssh_completion("node1", "data2"), (["data2"], ""))
+        self.assertEqual(server._run_ssh_completion("node1", ".c"), ([".cache"], ""))
+        self.assertEqual(server._run_ssh_completion("node1", "/tmp/b"), (["/tmp/b"], ""))
+        self.assertEqual(
+            self.calls, ["compgen -f -- ''", "compgen -f -- '.'", "compgen -f -- '/tmp/'"]
+        )
+
+    def test_cwd_is_part_of_the_key(self):
+        server._run_ssh_completion("node1", "d", cwd="/work")
+        server._run_ssh_completion("node1", "d", cwd="/home")
+        server._run_ssh_completion("node1", "/tmp/", cwd="/work")
+        server._run_ssh_completion("node1", "/tmp/", cwd="/home")
+        self.assertEqual(len(self.calls), 3)
+        self.assertTrue(self.calls[0].startswith("cd '/work' && "))
+
+    def test_least_recently_used_key_is_evicted(self):
+        with mock.patch.object(server, "SSH_COMPLETION_CACHE_KEYS", 2):
+            server._run_ssh_completion("node1", "d")
+            server._run_ssh_completion("node2", "d")
+            server._run_ssh_completion("node1", "t")
+            server._run_ssh_completion("node3", "d")
+            hosts = [key[1] for key in server.COMPLETION_CACHE]
+            self.assertEqual(hosts, ["node1", "node3"])
+            server._run_ssh_completion("node1", "data")
+        self.assertEqual(len(self.calls), 3)
+
+    def test_truncated_index_asks_the_host(self):
+        with mock.patch.object(server, "SSH_COMPLETION_INDEX_LIMIT", 2):
+            matches, _ = server._run_ssh_completion("node1", "tr")
+        self.assertEqual(self.calls, ["compgen -f -- ''", "compgen -f -- 'tr'"])
+        self.assertEqual(matches, [])
+
+    def test_file_index_expires_and_is_invalidated(self):
+        server._run_ssh_completion("node1", "d")
+        key = ("file", "node1", "", "")
+        server.COMPLETION_CACHE[key]["loaded_at"] -= server.SSH_COMPLETION_FILE_TTL + 1
+        server._run_ssh_completion("node1", "d")
+        server._invalidate_completion_files("node1")
+        server._run_ssh_completion("node1", "d")
+        self.assertEqual(len(self.calls), 3)
+
+    def test_stale_command_index_refreshes_in_background(self):
+        server._run_ssh_completion("node1", "nv", mode="command")
+        key = ("command", "node1")
+        server.COMPLETION_CACHE[key]["loaded_at"] -= server.SSH_COMPLETION_COMMAND_TTL + 1
+        self.listings["compgen -c"] = ["nvcc", "nvidia-smi"]
+        refreshed = threading.Event()
+        real_refresh = server._refresh_completion_index
+
+        def refresh(*args):
+            real_refresh(*args)
+            refreshed.set()
+
+        with mock.patch.object(server, "_refresh_completion_index", refresh):
+            stale = server._run_ssh_completion("node1", "nv", mode="command")
+            self.assertTrue(refreshed.wait(5))
+        self.assertEqual(stale, (["nvidia-smi", "nvtop"], ""))
+        fresh = server._run_ssh_completion("node1", "nv", mode="command")
+        self.assertEqual(fresh, (["nvcc", "nvidia-smi"], ""))
+        self.assertEqual(self.calls, ["compgen -c", "compgen -c"])
+        self.assertLess(time.monotonic() - server.COMPLETION_CACHE[key]["loaded_at"], 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from support import server, status
+
+
+class FleetRefreshTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.release = threading.Event()
+        server.STATUS_SNAPSHOTS.clear()
+        self.history = mock.patch.object(server, "RECORD_HISTORY", False)
+        self.history.start()
+
+    def tearDown(self):
+        self.release.set()
+        self.history.stop()
+        server.STATUS_SNAPSHOTS.clear()
+
+    def _fetch(self, host):
+        self.calls.append(host)
+        self.release.wait(5)
+        return server._store_status(host, status(host, []))
+
+    def test_refreshes_old_and_missing_hosts_once(self):
+        now = time.time()
+        server.STATUS_SNAPSHOTS["fresh"] = status("fresh", [], at=now)
+        server.STATUS_SNAPSHOTS["old"] = status("old", [], at=now - server.FLEET_MAX_AGE - 1)
+        with mock.patch.object(server, "fetch_host_status", self._fetch):
+            statuses = server.fleet_statuses(["fresh", "old", "new"])
+            # Answered from snapshots without waiting; a second caller joins
+            # the refreshes already in flight.
+            self.assertEqual([item["ok"] for item in statuses], [True, True, None])
+            server.fleet_statuses(["old", "new"])
+            self.release.set()
+            server.fleet_statuses(["fresh", "old", "new"], wait=True)
+        self.assertEqual(sorted(self.calls), ["new", "old"])
+        self.assertEqual(server.FLEET_REFRESHING, {})
+        self.assertTrue(server.STATUS_SNAPSHOTS["new"]["ok"])
+
+    def test_failed_refresh_is_recorded(self):
+        def fail(host):
+            raise OSError("no route")
+
+        with mock.patch.object(server, "fetch_host_status", fail), mock.patch("sys.stderr"):
+            statuses = server.fleet_statuses(["down"], wait=True)
+        self.assertFalse(statuses[0]["ok"])
+        self.assertIn("no route", statuses[0]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
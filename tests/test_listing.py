@@ -0,0 +1,87 @@
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from support import local_ssh, server
+
+
+class RemoteListingTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.root.name)
+        (self.dir / "data").mkdir()
+        (self.dir / ".hidden").write_text("x")
+        (self.dir / "..dots").write_text("xy")
+        (self.dir / "tab\tand\nnewline").write_text("abc")
+        (self.dir / "model.bin").write_bytes(b"\0" * 1000)
+        (self.dir / "link").symlink_to("data")
+        (self.dir / "broken").symlink_to("missing")
+        server.LISTING_CACHE.clear()
+        self.ssh = local_ssh()
+        self.ssh.start()
+
+    def tearDown(self):
+        self.ssh.stop()
+        server.LISTING_CACHE.clear()
+        self.root.cleanup()
+
+    def _without_gnu_find(self):
+        # A find that rejects -printf, as on BSD or busybox.
+        bin_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, bin_dir)
+        fake = pathlib.Path(bin_dir) / "find"
+        fake.write_text("#!/bin/sh\nexit 1\n")
+        fake.chmod(0o755)
+        return mock.patch.dict(os.environ, PATH=f"{bin_dir}:{os.environ['PATH']}")
+
+    def test_posix_fallback_matches_find(self):
+        gnu, error = server._fetch_listing("node1", self.root.name)
+        self.assertEqual(error, "")
+        with self._without_gnu_find():
+            posix, error = server._fetch_listing("node1", self.root.name)
+        self.assertEqual(error, "")
+        self.assertEqual(posix["entries"], gnu["entries"])
+        self.assertEqual(posix["path"], str(self.dir.resolve()))
+        entries = {entry["name"]: entry for entry in gnu["entries"]}
+        self.assertEqual(
+            sorted(entries),
+            ["..dots", ".hidden", "broken", "data", "link", "model.bin", "tab\tand\nnewline"],
+        )
+        self.assertEqual((entries["link"]["type"], entries["link"]["link"]), ("dir", True))
+        self.assertEqual(entries["broken"]["type"], "link")
+        self.assertEqual(entries["model.bin"]["size"], 1000)
+        self.assertEqual([entry["name"] for entry in gnu["entries"][:2]], ["data", "link"])
+
+    def test_limit_marks_truncated(self):
+        with mock.patch.object(server, "SSH_LS_LIMIT", 3):
+            for patch in (mock.patch.dict(os.environ), self._without_gnu_find()):
+                with patch:
+                    listing, _ = server._fetch_listing("node1", self.root.name)
+                self.assertEqual(len(listing["entries"]), 3)
+                self.assertTrue(listing["truncated"])
+
+    def test_cursor_survives_refresh(self):
+        with mock.patch.object(server, "SSH_LS_PAGE", 3):
+            first = server.list_remote_dir("node1", self.root.name)
+            names = [entry["name"] for entry in first["entries"]]
+            self.assertEqual(names, ["data", "link", "..dots"])
+            self.assertEqual((first["next"], first["remaining"]), ("1/..dots", 4))
+            # Entries appear before and after the cursor, and the cursor's own
+            # entry goes away, before the next page is asked for.
+            (self.dir / "-early").write_text("")
+            (self.dir / "zzz").write_text("")
+            (self.dir / "..dots").unlink()
+            second = server.list_remote_dir("node1", self.root.name, first["next"], refresh=True)
+            names = [entry["name"] for entry in second["entries"]]
+            self.assertEqual(names, [".hidden", "broken", "model.bin"])
+            third = server.list_remote_dir("node1", self.root.name, second["next"])
+            names = [entry["name"] for entry in third["entries"]]
+            self.assertEqual(names, ["tab\tand\nnewline", "zzz"])
+            self.assertIsNone(third["next"])
+
+
+if __name__ == "__main__":
+    unittest.main()
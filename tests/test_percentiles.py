@@ -0,0 +1,74 @@
+import time
+import unittest
+
+from support import gpu, server, status
+
+
+class PercentileSketchTest(unittest.TestCase):
+    def setUp(self):
+        server.PERCENTILE_SERIES.clear()
+        server.PERCENTILE_COMPACTED_HOUR = 0
+        self.start = time.time() - 600
+
+    tearDown = setUp
+
+    def _record(self, offset, utils, host="node1"):
+        gpus = [gpu(index, util=util, mem_used=util * 800) for index, util in enumerate(utils)]
+        server.record_percentiles(status(host, gpus, at=self.start + offset))
+
+    def test_samples_are_weighted_by_time(self):
+        # One quiet minute at 90% outweighs a burst of polls at 10%.
+        self._record(0, [90])
+        self._record(60, [90])
+        for offset in range(61, 71):
+            self._record(offset, [10])
+        row = server.percentiles_report("gpu", 3600, [10, 50, 99])["rows"][0]
+        self.assertEqual(row["util"], {"seconds": 70.0, "p10": 10, "p50": 90, "p99": 90})
+        self.assertEqual(row["mem"]["p50"], 90)
+
+    def test_first_sample_only_starts_the_clock(self):
+        self._record(0, [50])
+        self.assertEqual(server.percentiles_report("gpu", 3600)["rows"], [])
+
+    def test_gaps_are_capped(self):
+        self._record(0, [30])
+        self._record(server.USAGE_MAX_GAP * 3, [30])
+        row = server.percentiles_report("host", 86400)["rows"][0]
+        self.assertEqual(row["util"]["seconds"], server.USAGE_MAX_GAP)
+
+    def test_groupings_merge_sketches(self):
+        self._record(0, [0, 100], host="node1")
+        self._record(0, [100], host="node2")
+        self._record(60, [0, 100], host="node1")
+        self._record(60, [100], host="node2")
+        report = server.percentiles_report("host", 3600, [50])
+        self.assertEqual([row["util"]["p50"] for row in report["rows"]], [0, 100])
+        fleet = server.percentiles_report("fleet", 3600, [30, 50])["rows"][0]
+        self.assertEqual(fleet["util"], {"seconds": 180.0, "p30": 0, "p50": 100})
+        only = server.percentiles_report("gpu", 3600, [50], hosts={"node2"})["rows"]
+        self.assertEqual([(row["host"], row["gpu"]) for row in only], [("node2", 0)])
+
+    def test_old_hours_fold_into_days(self):
+        self.start -= (server.PERCENTILE_HOURS + 2) * 3600
+        self._record(0, [40])
+        self._record(60, [40])
+        self.start += (server.PERCENTILE_HOURS + 2) * 3600
+        self._record(0, [40])
+        series = server.PERCENTILE_SERIES[("node1", 0)]
+        old_day = int((self.start - (server.PERCENTILE_HOURS + 2) * 3600) // 86400 * 86400)
+        self.assertEqual(list(series["hours"]), [int(self.start // 3600 * 3600)])
+        self.assertEqual(list(series["days"]), [old_day])
+        self.assertEqual(series["days"][old_day][40], 600)
+        row = server.percentiles_report("gpu", 7 * 86400)["rows"][0]
+        self.assertEqual(row["util"]["seconds"], 60 + server.USAGE_MAX_GAP)
+
+
+class ParseQuantilesTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(server._parse_quantiles("50,abc,99.9,0,150,50"), [50.0, 99.9])
+        self.assertEqual(server._parse_quantiles(""), [50.0, 95.0, 99.0])
+        self.assertEqual(server._parse_quantiles("x"), [50.0, 95.0, 99.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
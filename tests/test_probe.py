@@ -0,0 +1,93 @@
+import copy
+import io
+import unittest
+from unittest import mock
+
+from support import server
+
+
+def _probe_namespace():
+    # With an empty STREAM the script defines its helpers and serves nothing.
+    namespace = {"STREAM": io.BytesIO()}
+    exec(server.GPU_PROCESS_SCRIPT, namespace)
+    return namespace
+
+
+def _data(processes, gpus=(("0", "50"),), uptime=100.0):
+    return {
+        "gpus": [list(row) for row in gpus],
+        "mig": None,
+        "clk_tck": 100,
+        "uptime": uptime,
+        "boot_time": 1000,
+        "processes": dict((item["key"], item) for item in processes),
+    }
+
+
+class ProbeDiffTest(unittest.TestCase):
+    diff = staticmethod(_probe_namespace()["diff"])
+
+    def _round_trip(self, old, new):
+        stream = server.ProbeStream("node1")
+        stream._apply(dict(copy.deepcopy(old), type="full", seq=1))
+        frame = self.diff(old, new)
+        stream._apply(dict(copy.deepcopy(frame), type="delta", seq=2, base=1))
+        keys = (*server.PROBE_STATE_KEYS, "processes")
+        self.assertEqual(stream.state, {key: new[key] for key in keys})
+        return frame
+
+    def test_changed_and_removed_fields(self):
+        old = _data(
+            [
+                {"key": "1", "pid": 1, "mem_used": 100, "cwd_error": "denied", "job": {"id": "7"}},
+                {"key": "2", "pid": 2, "mem_used": 200},
+            ]
+        )
+        new = _data(
+            [
+                {"key": "1", "pid": 1, "mem_used": 150},
+                {"key": "3", "pid": 3, "mem_used": 300, "mig_device": 1},
+            ],
+            gpus=(("0", "75"),),
+            uptime=160.0,
+        )
+        frame = self._round_trip(old, new)
+        self.assertEqual(frame["upsert"]["1"], {"mem_used": 150})
+        self.assertEqual(sorted(frame["unset"]["1"]), ["cwd_error", "job"])
+        self.assertEqual(frame["remove"], ["2"])
+        self.assertEqual(frame["gpu_rows"], {"0": ["0", "75"]})
+
+    def test_unchanged_sample_is_an_empty_frame(self):
+        data = _data([{"key": "1", "pid": 1, "mem_used": 100}])
+        self.assertEqual(self._round_trip(data, copy.deepcopy(data)), {})
+
+
+class ProbeResyncTest(unittest.TestCase):
+    def test_delta_on_wrong_base_requests_keyframe(self):
+        stream = server.ProbeStream("node1")
+        stream.proc = mock.Mock(**{"poll.return_value": None})
+        full = dict(_data([{"key": "1", "pid": 1}]), type="full")
+        frames = [
+            dict(full, seq=1),
+            {"type": "delta", "seq": 2, "base": 1, "upsert": {"1": {"mem_used": 5}}},
+            {"type": "delta", "seq": 9, "base": 8, "remove": ["1"]},
+            dict(full, seq=9),
+        ]
+        requests = []
+
+        def answer(payload, timeout):
+            requests.append(payload["full"])
+            return copy.deepcopy(frames.pop(0))
+
+        with mock.patch.object(stream, "_request", answer):
+            for _ in range(3):
+                state, error = stream.sample("query")
+                self.assertEqual(error, "")
+        self.assertEqual(requests, [True, False, False, True])
+        self.assertEqual(stream.resyncs, 1)
+        self.assertEqual(stream.seq, 9)
+        self.assertEqual(state["processes"], {"1": {"key": "1", "pid": 1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+from support import local_ssh, server
+
+
+class ShellSessionTest(unittest.TestCase):
+    def setUp(self):
+        self.patch = local_ssh()
+        self.patch.start()
+        server.SHELL_SESSIONS.clear()
+
+    def tearDown(self):
+        for session in list(server.SHELL_SESSIONS.values()):
+            session.close()
+        server.SHELL_SESSIONS.clear()
+        self.patch.stop()
+
+    def test_keeps_cwd_between_commands(self):
+        server._run_shell_command("s1", "node1", "cd /tmp")
+        result = server._run_shell_command("s1", "node1", "pwd")
+        self.assertEqual(result["exit_code"], 0)
+        self.assertEqual(result["stdout"].strip(), "/tmp")
+
+    def test_restart_after_close(self):
+        session = server.ShellSession("s1", "node1")
+        session.start()
+        self.assertEqual(session.run("echo one", 10)["stdout"].strip(), "one")
+        session.close()
+        self.assertFalse(session.alive)
+        session.start()
+        result = session.run("echo two", 10)
+        self.assertEqual((result["exit_code"], result["stdout"].strip()), (0, "two"))
+        session.close()
+
+    def test_reaped_session_is_replaced(self):
+        # The reaper closes and drops a session a request already looked up;
+        # the request must not reuse it or evict whatever replaced it.
+        server._run_shell_command("s1", "node1", "true")
+        stale = server.SHELL_SESSIONS[("s1", "node1")]
+        server._reap_shell_sessions(force_session_id="s1")
+        self.assertNotIn(("s1", "node1"), server.SHELL_SESSIONS)
+        newer = server.ShellSession("s1", "node1")
+        newer.start()
+        server.SHELL_SESSIONS[("s1", "node1")] = newer
+        server._forget_shell_session(("s1", "node1"), stale)
+        self.assertIs(server.SHELL_SESSIONS[("s1", "node1")], newer)
+        result = server._run_shell_command("s1", "node1", "echo fresh")
+        self.assertEqual(result["stdout"].strip(), "fresh")
+        self.assertIs(server.SHELL_SESSIONS[("s1", "node1")], newer)
+        self.assertTrue(newer.alive)
+        self.assertIsNotNone(stale._proc.poll())
+
+
+if __name__ == "__main__":
+    unittest.main()
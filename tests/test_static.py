@@ -0,0 +1,67 @@
+import gzip
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from support import ServerTestCase, server
+
+
+class StaticCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.web = pathlib.Path(self.root.name).resolve()
+        (self.web / "js").mkdir()
+        (self.web / "js" / "app.js").write_text("console.log(1);\n" * 100)
+        self.patches = [
+            mock.patch.object(server, "WEB_DIR", self.web),
+            mock.patch.object(server, "STATIC_CHECK_INTERVAL", 0),
+            mock.patch.dict(server.STATIC_CACHE, clear=True),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.root.cleanup()
+
+    def test_aliases_share_one_entry(self):
+        for alias in ("/js/app.js", "js/app.js", "/js/../js/app.js", "\\js\\app.js"):
+            entry, error = server.static_asset(alias)
+            self.assertEqual(error, "")
+        self.assertEqual(list(server.STATIC_CACHE), ["/js/app.js"])
+        self.assertEqual(gzip.decompress(entry["gzip"]), entry["data"])
+
+    def test_outside_and_missing_paths_are_not_cached(self):
+        self.assertEqual(server.static_asset("/../../etc/passwd")[1], "not found")
+        self.assertEqual(server.static_asset("/nope.js")[1], "not found")
+        self.assertEqual(server.STATIC_CACHE, {})
+
+    def test_changed_file_is_reloaded(self):
+        first, _ = server.static_asset("/js/app.js")
+        path = self.web / "js" / "app.js"
+        path.write_text("console.log(2);\n")
+        os.utime(path, ns=(first["mtime_ns"] + 10**9,) * 2)
+        second, _ = server.static_asset("/js/app.js")
+        self.assertNotEqual(second["etag"], first["etag"])
+        self.assertIsNone(second["gzip"])
+
+
+class StaticHTTPTest(ServerTestCase):
+    def test_gzip_and_plain_validators_differ(self):
+        code, headers, body = self.get("/app.js", {"Accept-Encoding": "gzip"})
+        self.assertEqual((code, headers["Content-Encoding"]), (200, "gzip"))
+        self.assertEqual(gzip.decompress(body), (server.WEB_DIR / "app.js").read_bytes())
+        tag = headers["ETag"]
+        revalidate = {"Accept-Encoding": "gzip", "If-None-Match": tag}
+        self.assertEqual(self.get("/app.js", revalidate)[0], 304)
+        code, headers, _ = self.get("/app.js", {"If-None-Match": tag})
+        self.assertEqual(code, 200)
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertNotEqual(headers["ETag"], tag)
+
+
+if __name__ == "__main__":
+    unittest.main()
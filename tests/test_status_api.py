@@ -0,0 +1,70 @@
+import json
+import time
+import unittest
+
+from support import ServerTestCase, gpu, server, status
+
+
+class ColumnarTest(unittest.TestCase):
+    def test_columns_and_tables(self):
+        statuses = [
+            status("node1", [gpu(0, util=10), gpu(1, util=20, name="NVIDIA H100")], at=100.5),
+            status("node2", [], ok=False, at=101),
+            {"host": "node3", "ok": None, "gpus": []},
+        ]
+        data = server.columnar_statuses(statuses)
+        self.assertEqual(data["hosts"], ["node1", "node2", "node3"])
+        self.assertEqual(data["host_ok"], [1, 0, None])
+        self.assertEqual(data["host_sampled_at"], [100, 101, None])
+        self.assertEqual(data["names"], ["NVIDIA A100", "NVIDIA H100"])
+        self.assertEqual(data["gpus"]["host"], [0, 0])
+        self.assertEqual(data["gpus"]["name"], [0, 1])
+        self.assertEqual(data["gpus"]["util"], [10, 20])
+        self.assertIn("refused", data["host_error"][1])
+
+
+class StatusETagTest(ServerTestCase):
+    def setUp(self):
+        now = time.time()
+        server.STATUS_SNAPSHOTS.clear()
+        server.STATUS_SNAPSHOTS["node1"] = status("node1", [gpu(0)], at=now)
+        server.STATUS_SNAPSHOTS["node2"] = status("node2", [gpu(0), gpu(1)], at=now)
+
+    def tearDown(self):
+        server.STATUS_SNAPSHOTS.clear()
+
+    def _get(self, path, headers=None):
+        code, headers, body = self.get(path, headers)
+        return code, headers.get("ETag"), body
+
+    def test_cached_status_revalidates(self):
+        path = "/api/status?hosts=node1,node2&cached=1"
+        code, tag, body = self._get(path)
+        self.assertEqual(code, 200)
+        self.assertNotIn(b", ", body)
+        self.assertEqual([item["host"] for item in json.loads(body)["results"]], ["node1", "node2"])
+        self.assertEqual(self._get(path, {"If-None-Match": tag})[:2], (304, tag))
+        server.STATUS_SNAPSHOTS["node2"] = status("node2", [gpu(0)], at=time.time() + 1)
+        code, new_tag, _ = self._get(path, {"If-None-Match": tag})
+        self.assertEqual(code, 200)
+        self.assertNotEqual(new_tag, tag)
+
+    def test_columnar_has_its_own_tag(self):
+        plain = self._get("/api/status?hosts=node1&cached=1")[1]
+        code, tag, body = self._get(
+            "/api/status?hosts=node1&cached=1",
+            {"Accept": server.COLUMNAR_MIME},
+        )
+        self.assertEqual(code, 200)
+        self.assertNotEqual(tag, plain)
+        self.assertEqual(json.loads(body)["format"], "columnar")
+
+    def test_single_host_snapshot_keeps_default_encoding(self):
+        code, tag, body = self._get("/api/status?host=node1&cached=1")
+        self.assertEqual(code, 200)
+        self.assertIsNone(tag)
+        self.assertIn(b", ", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
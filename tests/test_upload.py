@@ -0,0 +1,52 @@
+import hashlib
+import io
+import pathlib
+import tempfile
+import unittest
+
+from support import local_ssh, server
+
+
+class UploadTargetTest(unittest.TestCase):
+    def test_lengths(self):
+        query = {"host": ["node1"], "path": ["/tmp/x"]}
+        self.assertEqual(
+            server._upload_target(query, {"Content-Length": "12"}), ("node1", "/tmp/x", 12, "")
+        )
+        for header, error in (
+            ({}, "missing content length"),
+            ({"Content-Length": "abc"}, "invalid content length"),
+            ({"Content-Length": "-5"}, "invalid content length"),
+        ):
+            self.assertEqual(server._upload_target(query, header)[3], error)
+
+    def test_directory_needs_name(self):
+        headers = {"Content-Length": "1"}
+        query = {"host": ["node1"], "path": ["/data/"]}
+        self.assertEqual(server._upload_target(query, headers)[3], "missing filename")
+        query["name"] = ["a.bin"]
+        self.assertEqual(server._upload_target(query, headers)[1], "/data/a.bin")
+        self.assertEqual(server._upload_target({"host": ["node1"]}, headers)[3], "missing host or path")
+
+
+class FanoutVerifyTest(unittest.TestCase):
+    def test_verify_file_name_with_backslash(self):
+        body = b"weights" * 10000
+        with tempfile.TemporaryDirectory() as root, local_ssh():
+            target = str(pathlib.Path(root) / "model\\v1.bin")
+            upload = server.FanoutUpload(["node1", "node2"], target, len(body), verify=True)
+            result = upload.run(io.BytesIO(body), 2)
+            self.assertTrue(result["ok"], result)
+            self.assertEqual(result["sha256"], hashlib.sha256(body).hexdigest())
+            self.assertEqual([item["verified"] for item in result["results"]], [True, True])
+            self.assertEqual(pathlib.Path(target).read_bytes(), body)
+
+    def test_short_body_is_not_reported_ok(self):
+        with tempfile.TemporaryDirectory() as root, local_ssh():
+            upload = server.FanoutUpload(["node1"], f"{root}/part.bin", 100)
+            result = upload.run(io.BytesIO(b"only ten b"), 1)
+            self.assertFalse(result["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import time
+import unittest
+from unittest import mock
+
+from support import server
+
+
+def _proc(user, gpu_index, mem_used=1024, cwd="/work/a", pid=1):
+    return {"pid": pid, "user": user, "gpu_index": gpu_index, "mem_used": mem_used, "cwd": cwd}
+
+
+class UsageAccountingTest(unittest.TestCase):
+    def setUp(self):
+        for buckets in server.USAGE_BUCKETS.values():
+            buckets.clear()
+        server.USAGE_LAST_SAMPLE.clear()
+        # Mid-hour, so every sample below lands in the same bucket.
+        self.now = int(time.time() // 3600) * 3600 + 1800
+
+    def _hours(self, by):
+        return {row["key"]: row["gpu_hours"] for row in server.usage_report(by, 86400)["rows"]}
+
+    def test_first_sample_only_sets_the_clock(self):
+        server.record_usage("node1", [_proc("ann", 0)], self.now - 600)
+        self.assertEqual(self._hours("user"), {})
+
+    def test_shared_gpu_is_split_between_users(self):
+        processes = [_proc("ann", 0, pid=1), _proc("ann", 0, pid=2), _proc("bob", 0, pid=3)]
+        server.record_usage("node1", processes, self.now - 180)
+        server.record_usage("node1", processes, self.now)
+        self.assertEqual(self._hours("user"), {"ann": 0.025, "bob": 0.025})
+        self.assertEqual(self._hours("host"), {"node1": 0.05})
+
+    def test_gap_is_capped(self):
+        gap = server.USAGE_MAX_GAP
+        server.record_usage("node1", [_proc("ann", 0)], self.now - 10 * gap)
+        server.record_usage("node1", [_proc("ann", 0)], self.now)
+        self.assertEqual(self._hours("user"), {"ann": round(gap / 3600, 3)})
+
+    def test_out_of_order_sample_is_ignored(self):
+        server.record_usage("node1", [_proc("ann", 0)], self.now - 60)
+        server.record_usage("node1", [_proc("ann", 0)], self.now - 120)
+        self.assertEqual(self._hours("user"), {})
+
+    def test_report_flags_disabled_collector(self):
+        with mock.patch.object(server, "COLLECT_INTERVAL", 0):
+            report = server.usage_report("user", 3600)
+        self.assertFalse(report["collector"])
+        self.assertIn("collector disabled", report["warning"])
+        with mock.patch.object(server, "COLLECT_INTERVAL", 60):
+            self.assertNotIn("warning", server.usage_report("user", 3600))
+
+
+class ParseRangeTest(unittest.TestCase):
+    def test_units_and_bad_input(self):
+        self.assertEqual(server._parse_range("2h", 5), 7200)
+        self.assertEqual(server._parse_range(" 1.5d ", 5), 129600)
+        for text in ("", "  ", "inf", "nan", "-3h", "0", "abc", "h"):
+            self.assertEqual(server._parse_range(text, 5), 5, text)
+        self.assertEqual(server._parse_range("90d", 5, limit=86400), 86400)
+
+
+if __name__ == "__main__":
+    unittest.main()
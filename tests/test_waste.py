@@ -0,0 +1,71 @@
+import time
+import unittest
+
+from support import gpu, server, status
+
+
+def _process(pid, gpu_index=0, mem_used=4000, user="ann"):
+    return {
+        "pid": pid,
+        "start_ticks": pid * 10,
+        "gpu_index": gpu_index,
+        "mem_used": mem_used,
+        "user": user,
+    }
+
+
+class WasteWindowTest(unittest.TestCase):
+    def setUp(self):
+        server.WASTE_TRACKS.clear()
+        server.WASTE_LAST_SAMPLE.clear()
+        server.STATUS_SNAPSHOTS.clear()
+
+    tearDown = setUp
+
+    def _sample(self, host, at, utils, processes):
+        gpus = [gpu(index, util=util) for index, util in enumerate(utils)]
+        server.STATUS_SNAPSHOTS[host] = status(host, gpus, at=at)
+        server.record_waste(host, processes, at)
+
+    def test_shared_idle_gpu_is_split(self):
+        now = time.time()
+        for at in (now - 120, now - 60, now):
+            processes = [_process(1), _process(2, user="bob"), _process(3, gpu_index=1)]
+            self._sample("node1", at, [0, 90], processes)
+        report = server.waste_report()
+        rows = [(row["pid"], row["idle_gpu_hours"]) for row in report["rows"]]
+        self.assertEqual(rows, [(1, 0.017), (2, 0.017)])
+        self.assertEqual(report["total_idle_gpu_hours"], 0.033)
+        self.assertEqual(report["rows"][0]["idle_pct"], 100)
+        self.assertEqual(report["rows"][0]["idle_since"], now - 120)
+
+    def test_busy_sample_resets_idle_since(self):
+        now = time.time()
+        self._sample("node1", now - 120, [0], [_process(1)])
+        self._sample("node1", now - 60, [0], [_process(1)])
+        self._sample("node1", now, [50], [_process(1)])
+        row = server.waste_report()["rows"][0]
+        self.assertIsNone(row["idle_since"])
+        self.assertEqual(row["idle_pct"], 50)
+
+    def test_host_no_longer_sampled_ages_out(self):
+        old = time.time() - server.WASTE_WINDOW - 100
+        self._sample("node1", old, [0], [_process(1)])
+        self._sample("node1", old + 60, [0], [_process(1)])
+        self.assertIn("node1", server.WASTE_TRACKS)
+        self.assertEqual(server.waste_report()["rows"], [])
+        self.assertNotIn("node1", server.WASTE_TRACKS)
+        self.assertNotIn("node1", server.WASTE_LAST_SAMPLE)
+
+    def test_old_intervals_leave_the_sums(self):
+        now = time.time()
+        start = now - server.WASTE_WINDOW - 60
+        self._sample("node1", start, [0], [_process(1)])
+        self._sample("node1", start + 60, [0], [_process(1)])
+        self._sample("node1", now, [0], [_process(1)])
+        row = server.waste_report()["rows"][0]
+        self.assertEqual(row["held_hours"], round(server.USAGE_MAX_GAP / 3600, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -59,6 +59,23 @@ const downloadProgressBar = document.getElementById("downloadProgressBar");
 const downloadPercentEl = document.getElementById("downloadPercent");
 const downloadSpeedEl = document.getElementById("downloadSpeed");
 const downloadStatusEl = document.getElementById("downloadStatus");
+const uploadHostsInput = document.getElementById("uploadHostsInput");
+const uploadVerifyInput = document.getElementById("uploadVerifyInput");
+const uploadHostListEl = document.getElementById("uploadHostList");
+const uploadTreeEl = document.getElementById("uploadTree");
+const downloadTreeEl = document.getElementById("downloadTree");
+const tailBackdropEl = document.getElementById("tailBackdrop");
+const tailModalEl = document.getElementById("tailModal");
+const tailCloseBtn = document.getElementById("tailCloseBtn");
+const tailHostLabelEl = document.getElementById("tailHostLabel");
+const tailPathInput = document.getElementById("tailPathInput");
+const tailTreeEl = document.getElementById("tailTree");
+const tailTitleEl = document.getElementById("tailTitle");
+const tailOutputEl = document.getElementById("tailOutput");
+const tailStatusEl = document.getElementById("tailStatus");
+const tailOffsetEl = document.getElementById("tailOffset");
+const tailStartBtn = document.getElementById("tailStartBtn");
+const tailStopBtn = document.getElementById("tailStopBtn");
 const processPanelEl = document.getElementById("processPanel");
 const processTitleEl = document.getElementById("processTitle");
 const processSubtitleEl = document.getElementById("processSubtitle");
@@ -70,8 +87,30 @@ const startupPanelEl = document.getElementById("startupPanel");
 const startupToggleEl = document.getElementById("startupToggle");
 const startupStatusEl = document.getElementById("startupStatus");
 const startupHintEl = document.getElementById("startupHint");
+const heatmapBtn = document.getElementById("heatmapBtn");
+const heatmapPanelEl = document.getElementById("heatmapPanel");
+const heatmapSummaryEl = document.getElementById("heatmapSummary");
+const heatmapUtilBtn = document.getElementById("heatmapUtilBtn");
+const heatmapMemBtn = document.getElementById("heatmapMemBtn");
+const heatmapScrollEl = document.getElementById("heatmapScroll");
+const heatmapCanvasEl = document.getElementById("heatmapCanvas");
+const heatmapSpacerEl = document.getElementById("heatmapSpacer");
+const heatmapHoverEl = document.getElementById("heatmapHover");
+const wasteBtn = document.getElementById("wasteBtn");
+const wastePanelEl = document.getElementById("wastePanel");
+const wasteSummaryEl = document.getElementById("wasteSummary");
+const wasteListEl = document.getElementById("wasteList");
+const wasteEmptyEl = document.getElementById("wasteEmpty");
 
 const REFRESH_MS = 30000;
+const SERVER_ROW_GAP = 10;
+const SERVER_ROW_OVERSCAN = 6;
+const HEATMAP_ROW = 14;
+const HEATMAP_LABEL = 160;
+const HEATMAP_AGE = 40;
+const HEATMAP_OLD_SECONDS = (2 * REFRESH_MS) / 1000;
+const HEATMAP_RETRY_MS = 3000;
+const HEATMAP_CELL = 22;
 let hosts = [];
 let selectedHost = null;
 let selectedGpuIndex = null;
@@ -79,18 +118,39 @@ let refreshTimer = null;
 let selectedLoadedAt = 0;
 let processLoadedAt = 0;
 const serverItems = new Map();
+const filterItems = new Map();
+const gpuItems = new Map();
+let serverListWindowEl = null;
+let serverListHosts = [];
+let serverRowHeight = 0;
+let serverWindowFrame = 0;
+let heatmapData = null;
+let heatmapMetric = "util";
+let heatmapOpen = false;
+let heatmapFrame = 0;
+let heatmapTimer = null;
+let heatmapRetryTimer = null;
+let wasteOpen = false;
+let wasteTimer = null;
 const serverStatuses = new Map();
 let detailHasData = false;
 let processHasData = false;
 let visibleHosts = new Set();
 let manualFilter = false;
 let uploadInProgress = false;
+let tailSource = null;
+let tailHost = "";
+const TAIL_OUTPUT_LIMIT = 200000;
 let downloadInProgress = false;
 let commandInProgress = false;
 const commandSessions = new Map();
+const commandShellId =
+  window.crypto && typeof window.crypto.randomUUID === "function"
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
 let startupUpdating = false;
 
-const formatPercent = (value) => `${value}%`;
+const formatPercent = (value) => (value == null ? "--" : `${value}%`);
 const formatMiB = (value) => `${value.toLocaleString("en-US")} MiB`;
 const formatOptionalMiB = (value) => (value == null ? "--" : formatMiB(value));
 
@@ -133,6 +193,33 @@ function getBaseName(path) {
   return parts[parts.length - 1] || "";
 }
 
+function escapeHtml(value) {
+  return String(value ?? "")
+    .replace(/&/g, "&amp;")
+    .replace(/</g, "&lt;")
+    .replace(/>/g, "&gt;")
+    .replace(/"/g, "&quot;");
+}
+
+function formatDuration(seconds) {
+  if (seconds == null || !Number.isFinite(seconds) || seconds < 0) {
+    return "--";
+  }
+  const minutes = Math.floor(seconds / 60);
+  const hours = Math.floor(minutes / 60);
+  const days = Math.floor(hours / 24);
+  if (days >= 1) {
+    return `${days}d ${hours % 24}h`;
+  }
+  if (hours >= 1) {
+    return `${hours}h ${minutes % 60}m`;
+  }
+  if (minutes >= 1) {
+    return `${minutes}m`;
+  }
+  return `${Math.round(seconds)}s`;
+}
+
 function formatTime(date) {
   return new Intl.DateTimeFormat("en-US", {
     hour: "2-digit",
@@ -327,6 +414,7 @@ function openTransferModal(tab) {
     transferHostLabelEl.textContent = `Server: ${selectedHost}`;
   }
   setActiveTransferTab(tab);
+  resetRemoteTrees();
   if (transferModalEl && transferBackdropEl) {
     transferModalEl.classList.add("open");
     transferModalEl.setAttribute("aria-hidden", "false");
@@ -334,6 +422,267 @@ function openTransferModal(tab) {
   }
 }
 
+function joinRemotePath(dir, name) {
+  return dir.endsWith("/") ? `${dir}${name}` : `${dir}/${name}`;
+}
+
+async function fetchRemoteListing(path, cursor = "") {
+  const params = new URLSearchParams({ host: selectedHost, path, cursor });
+  const response = await fetch(`/api/ls?${params}`);
+  const raw = await response.text();
+  const data = raw ? JSON.parse(raw) : {};
+  if (!response.ok || !data.ok) {
+    throw new Error(data.error || "Failed to list directory.");
+  }
+  return data;
+}
+
+function renderTreeNode(entry, dir, onPick) {
+  const node = document.createElement("div");
+  const path = joinRemotePath(dir, entry.name);
+  const isDir = entry.type === "dir";
+  const row = document.createElement("button");
+  row.type = "button";
+  row.className = `tree-row tree-${entry.type}`;
+  row.title = entry.mtime ? `${path}\nModified ${new Date(entry.mtime * 1000).toLocaleString()}` : path;
+  row.innerHTML = `
+    <span class="tree-toggle">${isDir ? "+" : ""}</span>
+    <span class="tree-name">${escapeHtml(entry.name)}${isDir ? "/" : entry.link ? " @" : ""}</span>
+    <span class="tree-size">${isDir ? "" : formatFileSize(entry.size)}</span>
+  `;
+  node.appendChild(row);
+  if (!isDir) {
+    row.addEventListener("click", () => onPick(path, entry));
+    return node;
+  }
+  const children = document.createElement("div");
+  children.className = "tree-children";
+  children.hidden = true;
+  node.appendChild(children);
+  let loaded = false;
+  row.addEventListener("click", () => {
+    onPick(path, entry);
+    children.hidden = !children.hidden;
+    row.querySelector(".tree-toggle").textContent = children.hidden ? "+" : "-";
+    if (!children.hidden && !loaded) {
+      loaded = true;
+      loadTreeChildren(children, path, onPick);
+    }
+  });
+  return node;
+}
+
+async function loadTreeChildren(container, path, onPick, cursor = "") {
+  const host = selectedHost;
+  const status = document.createElement("div");
+  status.className = "tree-status";
+  status.textContent = "Loading...";
+  container.appendChild(status);
+  try {
+    const data = await fetchRemoteListing(path, cursor);
+    if (host !== selectedHost) {
+      return;
+    }
+    status.remove();
+    if (!cursor && container.classList.contains("remote-tree")) {
+      const root = document.createElement("div");
+      root.className = "tree-status";
+      root.textContent = data.path;
+      container.appendChild(root);
+    }
+    data.entries.forEach((entry) => {
+      container.appendChild(renderTreeNode(entry, data.path, onPick));
+    });
+    if (data.next != null) {
+      const more = document.createElement("button");
+      more.type = "button";
+      more.className = "tree-row tree-more";
+      more.innerHTML = `<span></span><span class="tree-name">Show more (${
+        data.remaining
+      } left)</span><span></span>`;
+      more.addEventListener("click", () => {
+        more.remove();
+        loadTreeChildren(container, path, onPick, data.next);
+      });
+      container.appendChild(more);
+    } else if (!data.total) {
+      status.textContent = "Empty";
+      container.appendChild(status);
+    }
+    if (data.truncated && data.next == null) {
+      const note = document.createElement("div");
+      note.className = "tree-status";
+      note.textContent = "Listing truncated.";
+      container.appendChild(note);
+    }
+  } catch (error) {
+    status.textContent = error.message;
+  }
+}
+
+function resetRemoteTrees() {
+  if (uploadTreeEl) {
+    uploadTreeEl.replaceChildren();
+    loadTreeChildren(uploadTreeEl, "~", (path, entry) => {
+      if (uploadPathInput && !uploadInProgress) {
+        uploadPathInput.value = entry.type === "dir" ? `${path}/` : path;
+      }
+    });
+  }
+  if (downloadTreeEl) {
+    downloadTreeEl.replaceChildren();
+    loadTreeChildren(downloadTreeEl, "~", (path, entry) => {
+      if (entry.type === "dir" || downloadInProgress) {
+        return;
+      }
+      if (downloadPathInput) {
+        downloadPathInput.value = path;
+      }
+      if (downloadNameInput) {
+        downloadNameInput.value = entry.name;
+      }
+    });
+  }
+}
+
+function appendTailOutput(text) {
+  if (!tailOutputEl) {
+    return;
+  }
+  const atBottom =
+    tailOutputEl.scrollTop + tailOutputEl.clientHeight >= tailOutputEl.scrollHeight - 4;
+  let content = tailOutputEl.textContent + text;
+  if (content.length > TAIL_OUTPUT_LIMIT) {
+    content = content.slice(content.length - TAIL_OUTPUT_LIMIT);
+  }
+  tailOutputEl.textContent = content;
+  if (atBottom) {
+    tailOutputEl.scrollTop = tailOutputEl.scrollHeight;
+  }
+}
+
+function setTailStatus(text) {
+  if (tailStatusEl) {
+    tailStatusEl.textContent = text;
+  }
+}
+
+function stopTail(message = "Stopped.") {
+  if (tailSource) {
+    tailSource.close();
+    tailSource = null;
+    setTailStatus(message);
+  }
+}
+
+function startTail(path) {
+  stopTail();
+  if (!path || !tailHost) {
+    return;
+  }
+  if (tailPathInput) {
+    tailPathInput.value = path;
+  }
+  if (tailTitleEl) {
+    tailTitleEl.textContent = path;
+  }
+  if (tailOutputEl) {
+    tailOutputEl.textContent = "";
+  }
+  setTailStatus("Connecting...");
+  // EventSource reconnects on its own and sends the last event id, which
+  // the server uses to resume from the last received offset.
+  const params = new URLSearchParams({ host: tailHost, path });
+  const source = new EventSource(`/api/tail?${params}`);
+  tailSource = source;
+  const onFrame = (handler) => (event) => {
+    if (source !== tailSource) {
+      return;
+    }
+    handler(JSON.parse(event.data));
+  };
+  source.addEventListener(
+    "opened",
+    onFrame((frame) => {
+      setTailStatus("Following.");
+      if (tailOffsetEl) {
+        tailOffsetEl.textContent = `${formatFileSize(frame.size)} file`;
+      }
+    })
+  );
+  source.addEventListener(
+    "chunk",
+    onFrame((frame) => {
+      appendTailOutput(frame.text);
+      if (tailOffsetEl) {
+        tailOffsetEl.textContent = `Offset ${frame.offset}`;
+      }
+    })
+  );
+  source.addEventListener(
+    "reset",
+    onFrame((frame) => {
+      appendTailOutput(`\n--- file ${frame.reason}, reading from the start ---\n`);
+    })
+  );
+  source.addEventListener(
+    "missing",
+    onFrame((frame) => {
+      setTailStatus(`Waiting: ${frame.error}`);
+    })
+  );
+  source.addEventListener(
+    "failed",
+    onFrame((frame) => {
+      stopTail(frame.error || "Tail failed.");
+    })
+  );
+  source.onerror = () => {
+    if (source === tailSource) {
+      setTailStatus(source.readyState === EventSource.CLOSED ? "Closed." : "Reconnecting...");
+    }
+  };
+}
+
+function openTailModal(cwd) {
+  if (!selectedHost) {
+    showToast("Select a server first.");
+    return;
+  }
+  if (tailHost !== selectedHost) {
+    stopTail();
+  }
+  tailHost = selectedHost;
+  if (tailHostLabelEl) {
+    tailHostLabelEl.textContent = `Server: ${selectedHost}`;
+  }
+  if (tailPathInput && cwd && !tailSource) {
+    tailPathInput.value = cwd.endsWith("/") ? cwd : `${cwd}/`;
+  }
+  if (tailTreeEl) {
+    tailTreeEl.replaceChildren();
+    loadTreeChildren(tailTreeEl, cwd || "~", (path, entry) => {
+      if (entry.type !== "dir") {
+        startTail(path);
+      }
+    });
+  }
+  if (tailModalEl && tailBackdropEl) {
+    tailModalEl.classList.add("open");
+    tailModalEl.setAttribute("aria-hidden", "false");
+    tailBackdropEl.classList.add("open");
+  }
+}
+
+function closeTailModal() {
+  stopTail();
+  if (tailModalEl && tailBackdropEl) {
+    tailModalEl.classList.remove("open");
+    tailModalEl.setAttribute("aria-hidden", "true");
+    tailBackdropEl.classList.remove("open");
+  }
+}
+
 function closeTransferModal() {
   if (transferModalEl && transferBackdropEl) {
     transferModalEl.classList.remove("open");
@@ -424,6 +773,33 @@ function resetUploadProgress() {
   if (uploadDropText) {
     uploadDropText.textContent = "Drop a file here or click to browse";
   }
+  if (uploadHostListEl) {
+    uploadHostListEl.replaceChildren();
+  }
+}
+
+function renderFanoutHosts(hosts, size) {
+  if (!uploadHostListEl) {
+    return;
+  }
+  uploadHostListEl.replaceChildren(
+    ...hosts.map((entry) => {
+      const row = document.createElement("div");
+      const failed = entry.ok === false || entry.state === "failed";
+      row.className = `fanout-row${failed ? " failed" : ""}`;
+      let state = entry.state || (entry.ok ? "done" : "failed");
+      if (state === "sending" && size) {
+        state = `${Math.round((entry.bytes / size) * 100)}%`;
+      }
+      if (entry.verified === true) {
+        state = "verified";
+      }
+      row.innerHTML = `<strong>${escapeHtml(entry.host)}</strong><span>${escapeHtml(
+        failed ? entry.error || "failed" : state
+      )}</span>`;
+      return row;
+    })
+  );
 }
 
 function resetDownloadProgress() {
@@ -452,6 +828,9 @@ function setUploadBusy(isBusy) {
   if (uploadPathInput) {
     uploadPathInput.disabled = isBusy;
   }
+  if (uploadHostsInput) {
+    uploadHostsInput.disabled = isBusy;
+  }
 }
 
 function setDownloadBusy(isBusy) {
@@ -479,7 +858,7 @@ function setUploadFile(file) {
 }
 
 function clearServers() {
-  serverListEl.innerHTML = "";
+  serverItems.forEach((node) => node.remove());
   serverItems.clear();
 }
 
@@ -503,19 +882,33 @@ function renderFilterList(list) {
   if (!filterListEl) {
     return;
   }
-  filterListEl.innerHTML = "";
-  list.forEach((host) => {
-    const item = document.createElement("label");
-    item.className = "filter-item";
-    const checkbox = document.createElement("input");
-    checkbox.type = "checkbox";
-    checkbox.checked = visibleHosts.has(host);
-    checkbox.addEventListener("change", () => toggleHostVisibility(host, checkbox.checked));
-    const text = document.createElement("span");
-    text.textContent = host;
-    item.appendChild(checkbox);
-    item.appendChild(text);
-    filterListEl.appendChild(item);
+  const wanted = new Set(list);
+  filterItems.forEach((entry, host) => {
+    if (!wanted.has(host)) {
+      entry.item.remove();
+      filterItems.delete(host);
+    }
+  });
+  list.forEach((host, position) => {
+    let entry = filterItems.get(host);
+    if (!entry) {
+      const item = document.createElement("label");
+      item.className = "filter-item";
+      const checkbox = document.createElement("input");
+      checkbox.type = "checkbox";
+      checkbox.addEventListener("change", () => toggleHostVisibility(host, checkbox.checked));
+      const text = document.createElement("span");
+      text.textContent = host;
+      item.appendChild(checkbox);
+      item.appendChild(text);
+      entry = { item, checkbox };
+      filterItems.set(host, entry);
+    }
+    entry.checkbox.checked = visibleHosts.has(host);
+    const current = filterListEl.children[position] || null;
+    if (current !== entry.item) {
+      filterListEl.insertBefore(entry.item, current);
+    }
   });
 }
 
@@ -571,6 +964,7 @@ function resetDetailMetrics() {
   detailMetricUtilEl.textContent = "--";
   detailMetricMemEl.textContent = "--";
   detailGpuListEl.innerHTML = "";
+  gpuItems.clear();
   detailErrorEl.textContent = "";
   detailHasData = false;
 }
@@ -599,21 +993,85 @@ function buildServerItem(host) {
   return node;
 }
 
+function ensureServerListWindow() {
+  if (!serverListWindowEl) {
+    serverListWindowEl = document.createElement("div");
+    serverListWindowEl.className = "server-list-window";
+    serverListEl.appendChild(serverListWindowEl);
+    serverListEl.addEventListener("scroll", scheduleServerWindow, { passive: true });
+    window.addEventListener("resize", scheduleServerWindow);
+  }
+  return serverListWindowEl;
+}
+
+function measureServerRow() {
+  if (serverRowHeight) {
+    return serverRowHeight;
+  }
+  const probe = buildServerItem("measure");
+  serverItems.delete("measure");
+  probe.style.visibility = "hidden";
+  ensureServerListWindow().appendChild(probe);
+  const height = probe.offsetHeight;
+  probe.remove();
+  if (height) {
+    serverRowHeight = height + SERVER_ROW_GAP;
+  }
+  return serverRowHeight || 64;
+}
+
+function scheduleServerWindow() {
+  if (serverWindowFrame) {
+    return;
+  }
+  serverWindowFrame = requestAnimationFrame(() => {
+    serverWindowFrame = 0;
+    renderServerWindow();
+  });
+}
+
+function renderServerWindow() {
+  const windowEl = ensureServerListWindow();
+  const rowHeight = measureServerRow();
+  const total = serverListHosts.length;
+  windowEl.style.height = `${Math.max(total * rowHeight - SERVER_ROW_GAP, 0)}px`;
+  const viewport = serverListEl.clientHeight || window.innerHeight;
+  const scrollTop = serverListEl.scrollTop;
+  const start = Math.max(0, Math.floor(scrollTop / rowHeight) - SERVER_ROW_OVERSCAN);
+  const end = Math.min(total, Math.ceil((scrollTop + viewport) / rowHeight) + SERVER_ROW_OVERSCAN);
+  const keep = new Set(serverListHosts.slice(start, end));
+  serverItems.forEach((node, host) => {
+    if (!keep.has(host)) {
+      node.remove();
+      serverItems.delete(host);
+    }
+  });
+  for (let position = start; position < end; position += 1) {
+    const host = serverListHosts[position];
+    const node = serverItems.get(host) || buildServerItem(host);
+    node.style.top = `${position * rowHeight}px`;
+    node.classList.toggle("active", host === selectedHost);
+    if (node.parentNode !== windowEl) {
+      windowEl.appendChild(node);
+    }
+  }
+}
+
 function renderServers(list, totalCount = null) {
   clearServers();
+  serverListHosts = list;
   if (totalCount == null) {
     serverCountEl.textContent = list.length.toString();
   } else {
     serverCountEl.textContent = `${list.length}/${totalCount}`;
   }
   if (!list.length) {
+    ensureServerListWindow().style.height = "0px";
     showNoServers();
     return;
   }
   hideNoServers();
-  list.forEach((host) => {
-    serverListEl.appendChild(buildServerItem(host));
-  });
+  renderServerWindow();
   if (selectedHost && list.includes(selectedHost)) {
     setActiveServer(selectedHost);
     detailHostEl.textContent = selectedHost;
@@ -643,48 +1101,102 @@ function renderDetailError(message) {
   showToast(message);
 }
 
-function renderGpuItem(gpu) {
-  const memPct = gpu.mem_total ? Math.round((gpu.mem_used / gpu.mem_total) * 100) : 0;
+function buildGpuItem(index) {
   const item = document.createElement("div");
   item.className = "gpu-item";
-  item.dataset.index = gpu.index;
+  item.dataset.index = index;
   item.tabIndex = 0;
   item.setAttribute("role", "button");
-  item.addEventListener("click", () => selectGpu(gpu.index));
+  item.addEventListener("click", () => selectGpu(index));
   item.addEventListener("keydown", (event) => {
     if (event.key === "Enter" || event.key === " ") {
       event.preventDefault();
-      selectGpu(gpu.index);
+      selectGpu(index);
     }
   });
-  if (selectedGpuIndex === gpu.index) {
-    item.classList.add("active");
-  }
   item.innerHTML = `
     <div class="gpu-title">
-      <span>GPU ${gpu.index}</span>
-      <span class="gpu-name">${gpu.name}</span>
+      <span>GPU ${index}</span>
+      <span class="gpu-name"></span>
     </div>
     <div class="bar">
       <div class="bar-row">
         <span>Utilization</span>
-        <strong>${formatPercent(gpu.util)}</strong>
+        <strong class="gpu-util"></strong>
       </div>
-      <div class="meter"><span style="width: ${gpu.util}%;"></span></div>
+      <div class="meter"><span class="gpu-util-bar"></span></div>
     </div>
     <div class="bar">
       <div class="bar-row">
         <span>Memory</span>
-        <strong>${formatPercent(memPct)}</strong>
+        <strong class="gpu-mem"></strong>
       </div>
-      <div class="meter"><span style="width: ${memPct}%;"></span></div>
+      <div class="meter"><span class="gpu-mem-bar"></span></div>
     </div>
     <div class="gpu-meta">
-      <span>Temp ${gpu.temp} C</span>
-      <span>${formatMiB(gpu.mem_used)} / ${formatMiB(gpu.mem_total)}</span>
+      <span class="gpu-temp"></span>
+      <span class="gpu-mem-text"></span>
     </div>
+    <div class="gpu-meta gpu-extra"></div>
   `;
-  return item;
+  const entry = {
+    item,
+    name: item.querySelector(".gpu-name"),
+    util: item.querySelector(".gpu-util"),
+    utilBar: item.querySelector(".gpu-util-bar"),
+    mem: item.querySelector(".gpu-mem"),
+    memBar: item.querySelector(".gpu-mem-bar"),
+    temp: item.querySelector(".gpu-temp"),
+    memText: item.querySelector(".gpu-mem-text"),
+    extra: item.querySelector(".gpu-extra"),
+  };
+  gpuItems.set(index, entry);
+  return entry;
+}
+
+function setText(el, text) {
+  if (el.textContent !== text) {
+    el.textContent = text;
+  }
+}
+
+function describeGpuExtras(gpu) {
+  const parts = [];
+  if (gpu.power_draw != null) {
+    const limit = gpu.power_limit != null ? ` / ${Math.round(gpu.power_limit)}` : "";
+    parts.push(`${Math.round(gpu.power_draw)}${limit} W`);
+  }
+  if (gpu.clock_sm != null) {
+    parts.push(`SM ${gpu.clock_sm} MHz`);
+  }
+  if (gpu.fan != null) {
+    parts.push(`Fan ${gpu.fan}%`);
+  }
+  if (gpu.ecc_uncorrected) {
+    parts.push(`ECC ${gpu.ecc_uncorrected} uncorrected`);
+  }
+  if (gpu.mig_devices) {
+    const slices = gpu.mig_devices.map(
+      (slot) => `${slot.profile} ${formatOptionalMiB(slot.mem_used)}`
+    );
+    parts.push(`MIG ${slices.join(", ")}`);
+  }
+  return parts.join(" · ");
+}
+
+function updateGpuItem(entry, gpu) {
+  const memPct = gpu.mem_total ? Math.round((gpu.mem_used / gpu.mem_total) * 100) : 0;
+  setText(entry.name, gpu.name);
+  setText(entry.util, formatPercent(gpu.util));
+  entry.utilBar.style.width = `${gpu.util ?? 0}%`;
+  setText(entry.mem, formatPercent(memPct));
+  entry.memBar.style.width = `${memPct}%`;
+  setText(entry.temp, gpu.temp != null ? `Temp ${gpu.temp} C` : "Temp --");
+  setText(entry.memText, `${formatMiB(gpu.mem_used)} / ${formatMiB(gpu.mem_total)}`);
+  const extra = describeGpuExtras(gpu);
+  setText(entry.extra, extra);
+  entry.extra.hidden = !extra;
+  entry.item.classList.toggle("active", selectedGpuIndex === gpu.index);
 }
 
 function renderDetailOk(payload) {
@@ -700,11 +1212,21 @@ function renderDetailOk(payload) {
     detailMetricMemEl.textContent = "--";
   }
 
-  detailGpuListEl.innerHTML = "";
   const available = new Set();
-  payload.gpus.forEach((gpu) => {
+  payload.gpus.forEach((gpu, position) => {
     available.add(gpu.index);
-    detailGpuListEl.appendChild(renderGpuItem(gpu));
+    const entry = gpuItems.get(gpu.index) || buildGpuItem(gpu.index);
+    updateGpuItem(entry, gpu);
+    const current = detailGpuListEl.children[position] || null;
+    if (current !== entry.item) {
+      detailGpuListEl.insertBefore(entry.item, current);
+    }
+  });
+  gpuItems.forEach((entry, index) => {
+    if (!available.has(index)) {
+      entry.item.remove();
+      gpuItems.delete(index);
+    }
   });
   if (selectedGpuIndex != null && !available.has(selectedGpuIndex)) {
     resetProcessPanel();
@@ -726,17 +1248,55 @@ function renderProcessItem(process) {
   if (!cwdText) {
     cwdText = process.cwd_error ? `unavailable: ${process.cwd_error}` : "unavailable";
   }
+  const cpuText = process.cpu_pct != null ? `${process.cpu_pct}%` : "--";
+  const rssText =
+    process.rss_kb != null ? formatOptionalMiB(Math.round(process.rss_kb / 1024)) : "--";
+  const ageText =
+    process.start_time != null ? formatDuration(Date.now() / 1000 - process.start_time) : "--";
+  const job = process.job || {};
+  let jobText = "";
+  if (job.slurm_job) {
+    jobText = `slurm job ${job.slurm_job}${job.slurm_step ? `.${job.slurm_step}` : ""}`;
+  }
+  if (job.pid != null && job.pid !== process.pid) {
+    const launcher = `${job.name || "parent"} (PID ${job.pid})`;
+    jobText = jobText ? `${jobText}, ${launcher}` : launcher;
+  }
   item.innerHTML = `
     <div class="process-title">
-      <span class="process-name">${process.name || "unknown"}</span>
+      <span class="process-name">${escapeHtml(process.name || "unknown")}</span>
       <span class="process-mem">${memText}</span>
     </div>
     <div class="process-meta">
       <span>PID ${pidText}</span>
-      <span>GPU ${process.gpu_index ?? "--"}</span>
+      <span>GPU ${process.gpu_index ?? "--"}${
+        process.mig_device != null ? ` MIG ${process.mig_device}` : ""
+      }</span>
+      <span>${escapeHtml(process.user || "--")}</span>
+    </div>
+    ${
+      process.mig_profile
+        ? `<div class="process-meta"><span>Slice ${escapeHtml(process.mig_profile)}</span></div>`
+        : ""
+    }
+    <div class="process-meta">
+      <span>CPU ${cpuText}</span>
+      <span>RSS ${rssText}</span>
+      <span>Up ${ageText}</span>
     </div>
-    <div class="process-cwd">${cwdText}</div>
+    ${process.cmdline ? `<div class="process-cwd">${escapeHtml(process.cmdline)}</div>` : ""}
+    ${jobText ? `<div class="process-meta"><span>Job ${escapeHtml(jobText)}</span></div>` : ""}
+    <div class="process-cwd">${escapeHtml(cwdText)}</div>
+    ${
+      process.cwd
+        ? `<div class="process-actions"><button class="ghost" type="button">Follow log</button></div>`
+        : ""
+    }
   `;
+  const tailButton = item.querySelector(".process-actions button");
+  if (tailButton) {
+    tailButton.addEventListener("click", () => openTailModal(process.cwd));
+  }
   return item;
 }
 
@@ -787,9 +1347,8 @@ function renderProcessList(processes) {
 }
 
 function setActiveGpu(index) {
-  detailGpuListEl.querySelectorAll(".gpu-item").forEach((item) => {
-    const itemIndex = Number(item.dataset.index);
-    item.classList.toggle("active", itemIndex === index);
+  gpuItems.forEach((entry, itemIndex) => {
+    entry.item.classList.toggle("active", itemIndex === index);
   });
 }
 
@@ -803,8 +1362,10 @@ async function loadProcessesForSelectedGpu(options = {}) {
   }
   setProcessLoading();
   try {
+    const fresh = options.fresh ? "&fresh=1" : "";
+    const hostParam = encodeURIComponent(selectedHost);
     const response = await fetch(
-      `/api/gpu-processes?host=${encodeURIComponent(selectedHost)}&index=${selectedGpuIndex}`
+      `/api/gpu-processes?host=${hostParam}&index=${selectedGpuIndex}${fresh}`
     );
     const raw = await response.text();
     let data = null;
@@ -846,6 +1407,25 @@ function setActiveServer(host) {
   });
 }
 
+async function loadCachedStatus(host) {
+  // Saved or collector snapshots render immediately while the live query
+  // for the host is still in flight. The multi-host form carries an ETag,
+  // so revisiting a host whose snapshot has not changed costs a 304.
+  try {
+    const response = await fetch(`/api/status?hosts=${encodeURIComponent(host)}&cached=1`);
+    const result = response.ok ? (await response.json()).results[0] : null;
+    if (!result || !result.ok || host !== selectedHost || selectedLoadedAt) {
+      return;
+    }
+    renderDetailOk(result);
+    if (result.stale) {
+      detailPillEl.textContent = `stale ${formatDuration(Date.now() / 1000 - result.sampled_at)}`;
+    }
+  } catch (error) {
+    // The live query reports its own errors.
+  }
+}
+
 async function loadStatusForSelected(options = {}) {
   if (!selectedHost) {
     return false;
@@ -883,7 +1463,7 @@ async function loadStatusForSelected(options = {}) {
 function selectGpu(index) {
   if (selectedGpuIndex === index) {
     setStatus(`Refreshing GPU ${index} processes...`);
-    loadProcessesForSelectedGpu({ force: true })
+    loadProcessesForSelectedGpu({ force: true, fresh: true })
       .then((ok) => setStatus(ok ? `Loaded GPU ${index} processes` : `Failed to load GPU ${index}`));
     return;
   }
@@ -900,6 +1480,7 @@ function selectServer(host) {
   if (selectedHost === host) {
     return;
   }
+  scheduleHeatmapDraw();
   selectedHost = host;
   selectedLoadedAt = 0;
   resetDetailMetrics();
@@ -909,6 +1490,7 @@ function selectServer(host) {
   detailHostEl.textContent = host;
   showDetailBody();
   setStatus(`Loading ${host}...`);
+  loadCachedStatus(host);
   loadStatusForSelected({ force: true })
     .then((ok) => setStatus(ok ? `Loaded ${host}` : `Failed to load ${host}`));
 }
@@ -936,9 +1518,34 @@ function startUpload() {
     uploadStatusEl.textContent = "Uploading...";
   }
   setUploadBusy(true);
-  const url = `/api/upload?host=${encodeURIComponent(selectedHost)}&path=${encodeURIComponent(
+  const extraHosts = uploadHostsInput?.value?.trim() || "";
+  let url = `/api/upload?host=${encodeURIComponent(selectedHost)}&path=${encodeURIComponent(
     remotePath
   )}&name=${encodeURIComponent(file.name)}`;
+  let fanoutTimer = null;
+  if (extraHosts) {
+    const uploadId = `${Date.now().toString(36)}${Math.random().toString(36).slice(2)}`;
+    const params = new URLSearchParams({
+      hosts: selectedHost,
+      group: extraHosts,
+      path: remotePath,
+      name: file.name,
+      verify: uploadVerifyInput?.checked ? "1" : "0",
+      id: uploadId,
+    });
+    url = `/api/upload-many?${params}`;
+    fanoutTimer = setInterval(async () => {
+      try {
+        const response = await fetch(`/api/upload-progress?id=${uploadId}`);
+        if (response.ok && fanoutTimer) {
+          const data = await response.json();
+          renderFanoutHosts(data.hosts, data.size);
+        }
+      } catch (error) {
+        // Progress is best effort; the final result arrives with the upload.
+      }
+    }, 1000);
+  }
   const xhr = new XMLHttpRequest();
   const startTime = performance.now();
   xhr.open("POST", url, true);
@@ -960,7 +1567,32 @@ function startUpload() {
   };
   xhr.onload = () => {
     setUploadBusy(false);
-    const ok = xhr.status >= 200 && xhr.status < 300;
+    clearInterval(fanoutTimer);
+    fanoutTimer = null;
+    let ok = xhr.status >= 200 && xhr.status < 300;
+    if (ok && extraHosts) {
+      const result = JSON.parse(xhr.responseText);
+      renderFanoutHosts(result.results, result.size);
+      ok = result.ok;
+      if (!ok) {
+        showToast(
+          result.error || `Upload failed on ${result.failed} of ${result.hosts} hosts.`
+        );
+      }
+      if (uploadStatusEl) {
+        uploadStatusEl.textContent = `Uploaded to ${result.succeeded} of ${result.hosts} hosts.`;
+      }
+      if (ok) {
+        resetRemoteTrees();
+      }
+      if (uploadProgressBar) {
+        uploadProgressBar.style.width = "100%";
+      }
+      if (uploadPercentEl) {
+        uploadPercentEl.textContent = "100%";
+      }
+      return;
+    }
     if (uploadProgressBar) {
       uploadProgressBar.style.width = "100%";
     }
@@ -970,6 +1602,9 @@ function startUpload() {
     if (uploadStatusEl) {
       uploadStatusEl.textContent = ok ? "Upload completed." : "Upload failed.";
     }
+    if (ok) {
+      resetRemoteTrees();
+    }
     if (!ok) {
       let message = xhr.responseText;
       if (message) {
@@ -985,6 +1620,8 @@ function startUpload() {
   };
   xhr.onerror = () => {
     setUploadBusy(false);
+    clearInterval(fanoutTimer);
+    fanoutTimer = null;
     if (uploadStatusEl) {
       uploadStatusEl.textContent = "Upload failed.";
     }
@@ -1093,7 +1730,7 @@ async function fetchCommandData(host, command, cwd) {
   const response = await fetch("/api/command", {
     method: "POST",
     headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({ host, command, cwd }),
+    body: JSON.stringify({ host, command, cwd, session: commandShellId }),
   });
   const raw = await response.text();
   let data = null;
@@ -1286,6 +1923,338 @@ async function runCommand(commandOverride = null) {
   }
 }
 
+function buildHeatmapPalette() {
+  const stops = [
+    [0, [228, 238, 241]],
+    [50, [31, 111, 120]],
+    [100, [240, 164, 94]],
+  ];
+  const palette = [];
+  for (let value = 0; value <= 100; value += 1) {
+    const upper = stops.findIndex(([at]) => at >= value);
+    const [highAt, high] = stops[Math.max(upper, 1)];
+    const [lowAt, low] = stops[Math.max(upper, 1) - 1];
+    const ratio = (value - lowAt) / (highAt - lowAt);
+    const color = low.map((channel, i) => Math.round(channel + (high[i] - channel) * ratio));
+    palette.push(`rgb(${color[0]}, ${color[1]}, ${color[2]})`);
+  }
+  return palette;
+}
+
+const heatmapPalette = buildHeatmapPalette();
+
+function scheduleHeatmapDraw() {
+  if (heatmapFrame || !heatmapOpen) {
+    return;
+  }
+  heatmapFrame = requestAnimationFrame(() => {
+    heatmapFrame = 0;
+    drawHeatmap();
+  });
+}
+
+function heatmapLayout() {
+  const rows = heatmapData ? heatmapData.hosts.length : 0;
+  const maxGpus = heatmapData ? Math.max(1, ...heatmapData.util.map((row) => row.length)) : 1;
+  const width = heatmapScrollEl.clientWidth;
+  const cellWidth = Math.max(
+    2,
+    Math.min(HEATMAP_CELL, Math.floor((width - HEATMAP_LABEL - 8) / maxGpus))
+  );
+  return { rows, maxGpus, width, cellWidth };
+}
+
+function drawHeatmap() {
+  if (!heatmapCanvasEl || !heatmapScrollEl) {
+    return;
+  }
+  const { rows, width, cellWidth } = heatmapLayout();
+  const totalHeight = rows * HEATMAP_ROW;
+  const viewHeight = Math.max(
+    HEATMAP_ROW,
+    Math.min(totalHeight, Math.round(window.innerHeight * 0.5))
+  );
+  const ratio = window.devicePixelRatio || 1;
+  const pixelWidth = Math.round(width * ratio);
+  const pixelHeight = Math.round(viewHeight * ratio);
+  if (heatmapCanvasEl.width !== pixelWidth || heatmapCanvasEl.height !== pixelHeight) {
+    heatmapCanvasEl.width = pixelWidth;
+    heatmapCanvasEl.height = pixelHeight;
+    heatmapCanvasEl.style.width = `${width}px`;
+    heatmapCanvasEl.style.height = `${viewHeight}px`;
+  }
+  heatmapSpacerEl.style.height = `${Math.max(totalHeight - viewHeight, 0)}px`;
+  const ctx = heatmapCanvasEl.getContext("2d");
+  ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+  ctx.clearRect(0, 0, width, viewHeight);
+  if (!rows) {
+    return;
+  }
+  const scrollTop = heatmapScrollEl.scrollTop;
+  const values = heatmapMetric === "mem" ? heatmapData.mem : heatmapData.util;
+  ctx.font = "11px 'IBM Plex Mono', 'Courier New', monospace";
+  ctx.textBaseline = "middle";
+  const now = Date.now() / 1000;
+  const first = Math.floor(scrollTop / HEATMAP_ROW);
+  const last = Math.min(rows, Math.ceil((scrollTop + viewHeight) / HEATMAP_ROW));
+  for (let row = first; row < last; row += 1) {
+    const y = row * HEATMAP_ROW - scrollTop;
+    const host = heatmapData.hosts[row];
+    const state = heatmapData.state[row];
+    if (host === selectedHost) {
+      ctx.fillStyle = "rgba(31, 111, 120, 0.12)";
+      ctx.fillRect(0, y, width, HEATMAP_ROW);
+    }
+    ctx.fillStyle = state === "error" ? "#6a3a33" : "#51616e";
+    const label = host.length > 16 ? `${host.slice(0, 15)}…` : host;
+    ctx.fillText(label, 4, y + HEATMAP_ROW / 2, HEATMAP_LABEL - HEATMAP_AGE - 8);
+    const sampledAt = heatmapData.sampled_at[row];
+    if (sampledAt != null) {
+      const age = now - sampledAt;
+      ctx.fillStyle = age > HEATMAP_OLD_SECONDS ? "#a0522d" : "#8a98a3";
+      ctx.textAlign = "right";
+      ctx.fillText(formatDuration(age), HEATMAP_LABEL - 6, y + HEATMAP_ROW / 2, HEATMAP_AGE);
+      ctx.textAlign = "left";
+    }
+    const cells = values[row];
+    if (state !== "ok" || !cells.length) {
+      ctx.fillStyle = state === "error" ? "#e19386" : "rgba(20, 26, 33, 0.08)";
+      ctx.fillRect(HEATMAP_LABEL, y + 1, cellWidth - 1, HEATMAP_ROW - 2);
+      continue;
+    }
+    for (let col = 0; col < cells.length; col += 1) {
+      const value = Math.max(0, Math.min(100, cells[col] | 0));
+      ctx.fillStyle = cells[col] == null ? "rgba(20, 26, 33, 0.08)" : heatmapPalette[value];
+      ctx.fillRect(HEATMAP_LABEL + col * cellWidth, y + 1, cellWidth - 1, HEATMAP_ROW - 2);
+    }
+  }
+}
+
+function heatmapCellAt(event) {
+  if (!heatmapData) {
+    return null;
+  }
+  const rect = heatmapCanvasEl.getBoundingClientRect();
+  const { cellWidth } = heatmapLayout();
+  const row = Math.floor((event.clientY - rect.top + heatmapScrollEl.scrollTop) / HEATMAP_ROW);
+  const x = event.clientX - rect.left - HEATMAP_LABEL;
+  if (row < 0 || row >= heatmapData.hosts.length) {
+    return null;
+  }
+  const col = x >= 0 ? Math.floor(x / cellWidth) : null;
+  const gpuCount = heatmapData.util[row].length;
+  return { row, col: col != null && col < gpuCount ? col : null };
+}
+
+function describeHeatmapCell(cell) {
+  const host = heatmapData.hosts[cell.row];
+  const state = heatmapData.state[cell.row];
+  const sampledAt = heatmapData.sampled_at[cell.row];
+  let ageText =
+    sampledAt != null ? `, ${formatDuration(Date.now() / 1000 - sampledAt)} ago` : "";
+  if (heatmapData.stale[cell.row]) {
+    ageText += " (from saved snapshot)";
+  }
+  if (state !== "ok") {
+    return `${host}: ${state}${ageText}`;
+  }
+  if (cell.col == null) {
+    return `${host}: ${heatmapData.util[cell.row].length} GPUs${ageText}`;
+  }
+  const util = heatmapData.util[cell.row][cell.col];
+  const mem = heatmapData.mem[cell.row][cell.col];
+  return `${host} GPU ${heatmapGpuIndex(cell)}: util ${formatPercent(util)}, mem ${formatPercent(
+    mem
+  )}${ageText}`;
+}
+
+function renderHeatmapSummary() {
+  if (!heatmapSummaryEl || !heatmapData) {
+    return;
+  }
+  let gpus = 0;
+  let busy = 0;
+  let down = 0;
+  let free = 0;
+  heatmapData.util.forEach((row, index) => {
+    if (heatmapData.state[index] === "error") {
+      down += 1;
+    }
+    gpus += row.length;
+    busy += row.filter((value) => value > 0).length;
+    free += heatmapData.free[index] || 0;
+  });
+  heatmapSummaryEl.textContent =
+    `${heatmapData.hosts.length} hosts, ${gpus} GPUs, ` +
+    `${busy} busy, ${free} free (GPUs or MIG slices), ${down} unreachable`;
+}
+
+function heatmapGpuIndex(cell) {
+  // Columns are positions; MIG hosts or missing GPUs make indices sparse.
+  const indices = heatmapData.index?.[cell.row];
+  return indices && indices[cell.col] != null ? indices[cell.col] : cell.col;
+}
+
+function decodeColumnarFleet(data) {
+  const util = data.hosts.map(() => []);
+  const mem = data.hosts.map(() => []);
+  const index = data.hosts.map(() => []);
+  const gpus = data.gpus;
+  for (let i = 0; i < gpus.host.length; i += 1) {
+    const row = gpus.host[i];
+    index[row].push(gpus.index[i]);
+    util[row].push(gpus.util[i]);
+    mem[row].push(gpus.mem_total[i] ? Math.round((gpus.mem_used[i] / gpus.mem_total[i]) * 100) : 0);
+  }
+  return {
+    hosts: data.hosts,
+    state: data.host_ok.map((ok) => (ok == null ? "pending" : ok ? "ok" : "error")),
+    sampled_at: data.host_sampled_at,
+    free: data.host_free || [],
+    stale: data.host_stale || [],
+    index,
+    util,
+    mem,
+  };
+}
+
+async function loadFleetSnapshot() {
+  try {
+    const response = await fetch("/api/fleet?format=columnar");
+    if (!response.ok) {
+      throw new Error("Failed to load fleet snapshot");
+    }
+    heatmapData = decodeColumnarFleet(await response.json());
+    renderHeatmapSummary();
+    scheduleHeatmapDraw();
+    // The server answers from its snapshots and re-samples old ones in the
+    // background, so look again shortly while any are pending or old.
+    const now = Date.now() / 1000;
+    const settling = heatmapData.state.some(
+      (state, row) =>
+        state === "pending" || now - (heatmapData.sampled_at[row] || 0) > REFRESH_MS / 1000
+    );
+    clearTimeout(heatmapRetryTimer);
+    heatmapRetryTimer =
+      settling && heatmapOpen ? setTimeout(loadFleetSnapshot, HEATMAP_RETRY_MS) : null;
+  } catch (error) {
+    showToast(error.message);
+  }
+}
+
+function setHeatmapMetric(metric) {
+  heatmapMetric = metric;
+  if (heatmapUtilBtn) {
+    heatmapUtilBtn.classList.toggle("active", metric === "util");
+  }
+  if (heatmapMemBtn) {
+    heatmapMemBtn.classList.toggle("active", metric === "mem");
+  }
+  scheduleHeatmapDraw();
+}
+
+function setHeatmapOpen(open) {
+  heatmapOpen = open;
+  if (!heatmapPanelEl) {
+    return;
+  }
+  heatmapPanelEl.classList.toggle("open", open);
+  heatmapPanelEl.setAttribute("aria-hidden", open ? "false" : "true");
+  if (heatmapTimer) {
+    clearInterval(heatmapTimer);
+    heatmapTimer = null;
+  }
+  clearTimeout(heatmapRetryTimer);
+  heatmapRetryTimer = null;
+  if (open) {
+    loadFleetSnapshot();
+    heatmapTimer = setInterval(loadFleetSnapshot, REFRESH_MS);
+  }
+}
+
+function renderWasteItem(row) {
+  const item = document.createElement("div");
+  item.className = "process-item";
+  const idleFor =
+    row.idle_since != null ? formatDuration(Date.now() / 1000 - row.idle_since) : "--";
+  const flags = [];
+  if (row.orphan) {
+    flags.push("no /proc entry");
+  }
+  if (!row.alive) {
+    flags.push("gone");
+  }
+  item.innerHTML = `
+    <div class="process-title">
+      <span class="process-name">${escapeHtml(row.host)} GPU ${row.gpu_index ?? "--"}${
+        row.mig_profile ? ` (${escapeHtml(row.mig_profile)})` : ""
+      }</span>
+      <span class="waste-hours">${row.idle_gpu_hours.toFixed(2)} idle GPU-h</span>
+    </div>
+    <div class="process-meta">
+      <span>PID ${row.pid ?? "--"}</span>
+      <span>${escapeHtml(row.user)}</span>
+      <span>${formatOptionalMiB(row.mem_used)}</span>
+    </div>
+    <div class="process-meta">
+      <span>Idle ${row.idle_pct != null ? `${row.idle_pct}%` : "--"} of ${formatDuration(
+        row.held_hours * 3600
+      )}</span>
+      <span>Idle now ${row.idle_since != null ? idleFor : "no"}</span>
+      ${flags.length ? `<span>${escapeHtml(flags.join(", "))}</span>` : ""}
+    </div>
+    <div class="process-cwd">${escapeHtml(row.cmdline || row.name || "unknown")}</div>
+  `;
+  item.addEventListener("click", () => {
+    selectServer(row.host);
+    if (row.gpu_index != null) {
+      selectGpu(row.gpu_index);
+    }
+  });
+  return item;
+}
+
+async function loadWasteReport() {
+  try {
+    const response = await fetch("/api/waste?limit=100");
+    if (!response.ok) {
+      throw new Error("Failed to load idle allocations");
+    }
+    const data = await response.json();
+    const windowText = formatDuration(data.window_seconds);
+    if (wasteSummaryEl) {
+      wasteSummaryEl.textContent =
+        `${data.count} processes, ${data.total_idle_gpu_hours.toFixed(2)} GPU-hours ` +
+        `reserved at ${data.idle_util}% util over the last ${windowText}.`;
+    }
+    if (wasteListEl) {
+      wasteListEl.replaceChildren(...data.rows.map(renderWasteItem));
+    }
+    if (wasteEmptyEl) {
+      wasteEmptyEl.style.display = data.rows.length ? "none" : "";
+    }
+  } catch (error) {
+    showToast(error.message);
+  }
+}
+
+function setWasteOpen(open) {
+  wasteOpen = open;
+  if (!wastePanelEl) {
+    return;
+  }
+  wastePanelEl.classList.toggle("open", open);
+  wastePanelEl.setAttribute("aria-hidden", open ? "false" : "true");
+  if (wasteTimer) {
+    clearInterval(wasteTimer);
+    wasteTimer = null;
+  }
+  if (open) {
+    loadWasteReport();
+    wasteTimer = setInterval(loadWasteReport, REFRESH_MS);
+  }
+}
+
 async function loadServers() {
   const response = await fetch("/api/servers");
   if (!response.ok) {
@@ -1346,7 +2315,7 @@ async function refreshAll() {
       const ok = await loadStatusForSelected({ force: true });
       let processesOk = true;
       if (selectedGpuIndex != null) {
-        processesOk = await loadProcessesForSelectedGpu({ force: true });
+        processesOk = await loadProcessesForSelectedGpu({ force: true, fresh: true });
       }
       if (ok && processesOk) {
         setStatus(`Updated ${selectedHost}`);
@@ -1391,7 +2360,47 @@ function scheduleRefresh() {
   refreshTimer = setInterval(() => refreshSelected(false), REFRESH_MS);
 }
 
-refreshBtn.addEventListener("click", refreshAll);
+refreshBtn.addEventListener("click", () => {
+  refreshAll();
+  if (heatmapOpen) {
+    loadFleetSnapshot();
+  }
+  if (wasteOpen) {
+    loadWasteReport();
+  }
+});
+if (wasteBtn) {
+  wasteBtn.addEventListener("click", () => setWasteOpen(!wasteOpen));
+}
+if (heatmapBtn) {
+  heatmapBtn.addEventListener("click", () => setHeatmapOpen(!heatmapOpen));
+}
+if (heatmapUtilBtn) {
+  heatmapUtilBtn.addEventListener("click", () => setHeatmapMetric("util"));
+}
+if (heatmapMemBtn) {
+  heatmapMemBtn.addEventListener("click", () => setHeatmapMetric("mem"));
+}
+if (heatmapScrollEl && heatmapCanvasEl) {
+  heatmapScrollEl.addEventListener("scroll", scheduleHeatmapDraw, { passive: true });
+  window.addEventListener("resize", scheduleHeatmapDraw);
+  heatmapCanvasEl.addEventListener("mousemove", (event) => {
+    const cell = heatmapCellAt(event);
+    if (heatmapHoverEl) {
+      heatmapHoverEl.textContent = cell ? describeHeatmapCell(cell) : "Hover a cell for details.";
+    }
+  });
+  heatmapCanvasEl.addEventListener("click", (event) => {
+    const cell = heatmapCellAt(event);
+    if (!cell) {
+      return;
+    }
+    selectServer(heatmapData.hosts[cell.row]);
+    if (cell.col != null && heatmapData.state[cell.row] === "ok") {
+      selectGpu(heatmapGpuIndex(cell));
+    }
+  });
+}
 if (selectAllBtn) {
   selectAllBtn.addEventListener("click", () => {
     visibleHosts = new Set(hosts);
@@ -1425,6 +2434,7 @@ document.addEventListener("keydown", (event) => {
     closeFilterPopover();
     closeTransferModal();
     closeCommandModal();
+    closeTailModal();
   }
 });
 document.addEventListener("click", (event) => {
@@ -1464,6 +2474,24 @@ if (commandCloseBtn) {
 if (commandBackdropEl) {
   commandBackdropEl.addEventListener("click", closeCommandModal);
 }
+if (tailCloseBtn) {
+  tailCloseBtn.addEventListener("click", closeTailModal);
+}
+if (tailBackdropEl) {
+  tailBackdropEl.addEventListener("click", closeTailModal);
+}
+if (tailStopBtn) {
+  tailStopBtn.addEventListener("click", () => stopTail());
+}
+if (tailStartBtn && tailPathInput) {
+  tailStartBtn.addEventListener("click", () => startTail(tailPathInput.value.trim()));
+  tailPathInput.addEventListener("keydown", (event) => {
+    if (event.key === "Enter") {
+      event.preventDefault();
+      startTail(tailPathInput.value.trim());
+    }
+  });
+}
 if (uploadTabBtn) {
   uploadTabBtn.addEventListener("click", () => setActiveTransferTab("upload"));
 }
@@ -1612,6 +2640,13 @@ if (startupToggleEl) {
   });
 }
 
+window.addEventListener("pagehide", () => {
+  if (!commandSessions.size || !navigator.sendBeacon) {
+    return;
+  }
+  navigator.sendBeacon("/api/command-close", JSON.stringify({ session: commandShellId }));
+});
+
 setTransferButtonsEnabled(false);
 loadStartupStatus();
 refreshAll();